@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Asynchronous activity logger
+Request threads only enqueue entries; a background thread batches them into
+a structured JSONL file with size and time based rotation, and indexes them
+in SQLite so audit queries never scan the log files. The index holds the
+entries of the current file and the rotated files still kept. A plain text
+activity.log left by older versions is converted once into a rotated file.
+"""
+
+import atexit
+import json
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process is assumed
+    fcntl = None
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+from storage import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    user TEXT,
+    action TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_activity_ts ON activity (ts);
+CREATE INDEX IF NOT EXISTS idx_activity_user ON activity (user, ts);
+CREATE INDEX IF NOT EXISTS idx_activity_action ON activity (action, ts);
+"""
+
+BATCH_SIZE = 500
+# Line format of the plain text activity.log written by older versions
+LEGACY_LINE = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] User: (.*?) \| Action: (.*?)(?: \| Details: (.*))?$')
+
+
+def backup_order(stamp):
+    """Sort key for a rotated file's 'YYYYmmdd-HHMMSS[-N]' suffix"""
+    counter = stamp[16:]
+    return stamp[:15], int(counter) if counter.isdigit() else 1
+
+
+def format_entry(entry):
+    """One JSONL line for an entry"""
+    record = dict(entry)
+    record['time'] = datetime.fromtimestamp(entry['ts']).strftime('%Y-%m-%d %H:%M:%S')
+    return json.dumps(record) + '\n'
+
+
+class ActivityLogger:
+    """Queue plus flush thread writing activity entries to JSONL and an SQLite index"""
+
+    def __init__(self, log_path, db_path, flush_interval=1.0, rotate_bytes=10 * 1024 * 1024,
+                 rotate_interval=86400, backup_count=10, legacy_path=None):
+        self.log_path = log_path
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._opened_at = None
+        self._inode = None
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer_loop, name='activity-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def log(self, username, action, details=None):
+        """Queue one activity entry; never blocks on disk"""
+        self._ensure_thread()
+        self._queue.put({'ts': time.time(), 'user': username, 'action': action, 'details': details})
+
+    # Writer
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer_loop(self):
+        while True:
+            entry = self._queue.get()
+            # Give a burst of entries a moment to accumulate into one batch
+            time.sleep(self.flush_interval)
+            batch = self._drain(entry)
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Activity log write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        lines = [format_entry(entry) for entry in batch]
+
+        with self._lock:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            # Several server processes may share the file; serialize rotation and appends
+            with open(self.db_path + '.lock', 'w') as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                legacy = self._import_legacy() if self.legacy_path and os.path.exists(self.legacy_path) else []
+                cutoff = self._maybe_rotate()
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(lines))
+
+            conn = self._conn()
+            with transaction(conn):
+                if cutoff is not None:
+                    # Entries whose file was just deleted by rotation leave the index too
+                    conn.execute('DELETE FROM activity WHERE ts < ?', (cutoff,))
+                conn.executemany(
+                    'INSERT INTO activity (ts, user, action, details) VALUES (?, ?, ?, ?)',
+                    [(e['ts'], e['user'], e['action'], e['details']) for e in legacy + batch])
+
+    def _backup_path(self, stamp):
+        """Path for a rotated file; a counter keeps files rotated within one second in order"""
+        base, ext = os.path.splitext(self.log_path)
+        directory = os.path.dirname(self.log_path) or '.'
+        prefix = os.path.basename(base) + '-'
+        taken = [backup_order(name[len(prefix):-len(ext) or None])[1] for name in os.listdir(directory)
+                 if name.startswith(prefix + stamp) and name.endswith(ext)]
+        if not taken:
+            return f"{base}-{stamp}{ext}"
+        return f"{base}-{stamp}-{max(taken) + 1}{ext}"
+
+    def _import_legacy(self):
+        """
+        Convert the old plain text log into a rotated JSONL file named after
+        its last entry, and return its entries for the index. The old file is
+        renamed to *.imported, so this happens once.
+        """
+        entries = []
+        with open(self.legacy_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = LEGACY_LINE.match(line.rstrip('\n'))
+                if not match:
+                    continue
+                when, user, action, details = match.groups()
+                ts = datetime.strptime(when, '%Y-%m-%d %H:%M:%S').timestamp()
+                entries.append({'ts': ts, 'user': user, 'action': action, 'details': details})
+        if entries:
+            target = self._backup_path(datetime.fromtimestamp(entries[-1]['ts']).strftime('%Y%m%d-%H%M%S'))
+            with open(target + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(''.join(format_entry(entry) for entry in entries))
+            os.replace(target + '.tmp', target)
+        os.replace(self.legacy_path, self.legacy_path + '.imported')
+        return entries
+
+    def _maybe_rotate(self):
+        """
+        Rotate the file if it is due and drop backups beyond backup_count.
+        Returns the timestamp of the oldest entry still kept in a file, or None
+        if nothing was rotated.
+        """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            self._inode = None
+            return None
+        if st.st_ino != self._inode:
+            # A new file, created here or by another server process rotating it
+            self._inode = st.st_ino
+            self._opened_at = st.st_ctime
+
+        too_big = self.rotate_bytes and st.st_size >= self.rotate_bytes
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if not (too_big or too_old) or st.st_size == 0:
+            return None
+
+        os.replace(self.log_path, self._backup_path(datetime.now().strftime('%Y%m%d-%H%M%S')))
+        self._inode = None
+
+        base, ext = os.path.splitext(self.log_path)
+        directory = os.path.dirname(self.log_path) or '.'
+        prefix = os.path.basename(base) + '-'
+        backups = [name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(ext)]
+        # Oldest first; files rotated within the same second carry a -2, -3... counter
+        backups.sort(key=lambda name: backup_order(name[len(prefix):-len(ext) or None]))
+        kept = backups[max(0, len(backups) - self.backup_count):]
+        for name in backups[:len(backups) - len(kept)]:
+            os.remove(os.path.join(directory, name))
+        if not kept:
+            return time.time()
+        try:
+            with open(os.path.join(directory, kept[0]), 'r', encoding='utf-8') as f:
+                return json.loads(f.readline())['ts']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def flush(self):
+        """Block until every queued entry has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    # Queries
+
+    def query(self, user=None, action=None, since=None, until=None, page=1, per_page=100):
+        """Return (entries, total) matching the filters, newest first"""
+        clauses, args = [], []
+        if user:
+            clauses.append('user = ?')
+            args.append(user)
+        if action:
+            clauses.append('action = ?')
+            args.append(action)
+        if since is not None:
+            clauses.append('ts >= ?')
+            args.append(since)
+        if until is not None:
+            clauses.append('ts < ?')
+            args.append(until)
+        where = ' AND '.join(clauses) if clauses else '1'
+        page = max(1, page)
+        per_page = max(1, min(per_page, 1000))
+
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM activity WHERE {where}', args).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT ts, user, action, details FROM activity WHERE {where} ORDER BY ts DESC LIMIT ? OFFSET ?',
+            args + [per_page, (page - 1) * per_page]).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['time'] = datetime.fromtimestamp(entry['ts']).strftime('%Y-%m-%d %H:%M:%S')
+            entries.append(entry)
+        return entries, total
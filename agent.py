@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Remote execution agent
+Registers with the dashboard, claims queued jobs over HTTP and runs them with
+the same runner the dashboard uses, streaming the execution log, per-host
+results and exit status back while they run. Several agents can run on one
+machine as long as each has its own name.
+
+Usage: python3 agent.py --server https://dashboard:8443 --token TOKEN --name node01 [--labels pwsh,dmz] [--capacity 2]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import ssl
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from runner import SUMMARY_FILE, run_task
+
+POLL_INTERVAL = 2
+UPLOAD_INTERVAL = 1
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+RETRY_DELAY = 5
+REQUEST_TIMEOUT = 30
+
+# Labels added automatically when the command is installed on the agent
+DETECTED_LABELS = {
+    'ansible': 'ansible-playbook',
+    'pwsh': 'pwsh'
+}
+
+
+def detect_labels():
+    return [label for label, command in DETECTED_LABELS.items() if shutil.which(command)]
+
+
+class DashboardClient:
+    """JSON over HTTP to the dashboard's agent API"""
+
+    def __init__(self, server, token, name, insecure=False):
+        self.server = server.rstrip('/')
+        self.token = token
+        self.name = name
+        # The dashboard often runs with a self-signed certificate
+        self.context = ssl._create_unverified_context() if insecure else None
+
+    def request(self, method, path, payload=None, data=None, params=None):
+        """Return (status, parsed JSON body or None); network errors propagate as OSError"""
+        url = f"{self.server}{path}"
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        headers = {'Authorization': f'Bearer {self.token}'}
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(url, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT, context=self.context) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+    def _job_path(self, job_id, action):
+        return f"/api/agents/{self.name}/jobs/{job_id}/{action}"
+
+    def register(self, labels, capacity):
+        return self.request('POST', '/api/agents/register', {
+            'name': self.name,
+            'host': socket.gethostname(),
+            'labels': labels,
+            'capacity': capacity
+        })
+
+    def claim(self):
+        return self.request('POST', f"/api/agents/{self.name}/claim")
+
+    def upload_log(self, job_id, offset, data):
+        return self.request('POST', self._job_path(job_id, 'log'), data=data, params={'offset': offset})
+
+    def upload_summary(self, job_id, summary):
+        return self.request('PUT', self._job_path(job_id, 'summary'), summary)
+
+    def finish(self, job_id, return_code, error):
+        return self.request('POST', self._job_path(job_id, 'finish'), {'return_code': return_code, 'error': error})
+
+
+class LogShipper:
+    """
+    Uploads what a running job appends to its local execution.log, and its
+    result summary whenever it changes. Every upload also keeps the job alive
+    on the dashboard and reports whether someone cancelled it.
+    """
+
+    def __init__(self, client, job_id, log_dir):
+        self.client = client
+        self.job_id = job_id
+        self.log_file = os.path.join(log_dir, 'execution.log')
+        self.summary_file = os.path.join(log_dir, SUMMARY_FILE)
+        self.offset = 0
+        self.summary_mtime = None
+        self.cancelled_by = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f'ship-{job_id}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background uploads and send whatever is left"""
+        self._stop.set()
+        self._thread.join()
+        for _ in range(3):
+            try:
+                self.ship()
+                return
+            except OSError as e:
+                print(f"Final upload for job {self.job_id} failed: {e}")
+                time.sleep(RETRY_DELAY)
+
+    def _loop(self):
+        while not self._stop.wait(UPLOAD_INTERVAL):
+            try:
+                self.ship()
+            except OSError as e:
+                print(f"Log upload for job {self.job_id} failed: {e}")
+
+    def ship(self):
+        while True:
+            data = b''
+            if os.path.exists(self.log_file):
+                with open(self.log_file, 'rb') as f:
+                    f.seek(self.offset)
+                    data = f.read(UPLOAD_CHUNK_SIZE)
+            status, body = self.client.upload_log(self.job_id, self.offset, data)
+            if status == 409 and body:
+                # A retried chunk the dashboard already has, or one it lost; continue from its size
+                self.offset = body['size']
+                continue
+            if status == 404:
+                # The dashboard gave up on the job, e.g. after losing contact; stop running it
+                self.cancelled_by = self.cancelled_by or 'the dashboard'
+                return
+            if status != 200:
+                return
+            self.offset = body['size']
+            self.cancelled_by = body.get('cancel') or self.cancelled_by
+            if len(data) < UPLOAD_CHUNK_SIZE:
+                break
+        self._ship_summary()
+
+    def _ship_summary(self):
+        try:
+            mtime = os.path.getmtime(self.summary_file)
+        except OSError:
+            return
+        if mtime == self.summary_mtime:
+            return
+        with open(self.summary_file) as f:
+            summary = json.load(f)
+        status, _ = self.client.upload_summary(self.job_id, summary)
+        if status == 200:
+            self.summary_mtime = mtime
+
+
+class Agent:
+    """Claims and runs jobs on capacity worker threads"""
+
+    def __init__(self, client, labels, capacity=1, work_dir='./agent-work', playbooks_dir=None, keep=False):
+        self.client = client
+        self.labels = labels
+        self.capacity = max(1, capacity)
+        self.work_dir = work_dir
+        self.playbooks_dir = playbooks_dir
+        self.keep = keep
+        self._register_lock = threading.Lock()
+
+    def register(self):
+        """Register with the dashboard, retrying until it answers"""
+        with self._register_lock:
+            while True:
+                try:
+                    status, body = self.client.register(self.labels, self.capacity)
+                    if status == 200:
+                        print(f"Registered as {self.client.name} with labels {body['labels']}, "
+                              f"capacity {body['capacity']}")
+                        return
+                    print(f"Registration rejected ({status}): {(body or {}).get('error')}")
+                    if status in (400, 401, 404):
+                        sys.exit(1)
+                except OSError as e:
+                    print(f"Dashboard unreachable: {e}")
+                time.sleep(RETRY_DELAY)
+
+    def run(self):
+        self.register()
+        workers = [threading.Thread(target=self._worker_loop, name=f'agent-worker-{i}', daemon=True)
+                   for i in range(self.capacity)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def _worker_loop(self):
+        while True:
+            try:
+                status, body = self.client.claim()
+            except OSError as e:
+                print(f"Claim failed: {e}")
+                time.sleep(RETRY_DELAY)
+                continue
+            if status == 200:
+                self.run_job(body)
+            elif status == 404:
+                # The dashboard forgot this agent, e.g. its database was reset
+                self.register()
+            else:
+                time.sleep(POLL_INTERVAL)
+
+    def run_job(self, claim):
+        """Run one claimed job in its own work directory and report how it ended"""
+        job = claim['job']
+        params = job['params']
+        job_dir = os.path.join(self.work_dir, job['id'])
+        log_dir = os.path.join(job_dir, 'log')
+        os.makedirs(log_dir, exist_ok=True)
+        print(f"Running job {job['id']}: {job['task_type']} {job['description']}")
+
+        if self.playbooks_dir:
+            target = os.path.join(self.playbooks_dir, params['target_file'])
+        else:
+            target = os.path.join(job_dir, os.path.basename(params['target_file']))
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(claim['target'])
+        inventory = os.path.join(job_dir, 'inventory.ini')
+        with open(inventory, 'w', encoding='utf-8') as f:
+            f.write(claim['inventory'])
+
+        shipper = LogShipper(self.client, job['id'], log_dir)
+        shipper.start()
+        return_code, error = None, None
+        try:
+            return_code = run_task(
+                job['task_type'], target, inventory, log_dir,
+                forks=params['forks'],
+                verbose=params['verbose'],
+                shards=params.get('shards', 1),
+                job_id=job['id'],
+                timestamps=claim.get('timestamps', False),
+                timeout=claim.get('timeout'),
+                should_cancel=lambda: shipper.cancelled_by,
+                limits=claim.get('limits')
+            )
+        except Exception as e:
+            error = str(e)
+            with open(os.path.join(log_dir, 'execution.log'), 'a') as f:
+                f.write(f"Error executing job {job['id']} on agent {self.client.name}: {e}\n")
+        finally:
+            shipper.stop()
+
+        self.report(job['id'], return_code, error)
+        print(f"Job {job['id']} finished: return code {return_code}{f', {error}' if error else ''}")
+        if not self.keep:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def report(self, job_id, return_code, error):
+        """Send a job's result, retrying while the dashboard is unreachable"""
+        while True:
+            try:
+                status, body = self.client.finish(job_id, return_code, error)
+                if status != 200:
+                    # Typically the job was given up on after the agent went silent
+                    print(f"Result for job {job_id} rejected ({status}): {(body or {}).get('error')}")
+                return
+            except OSError as e:
+                print(f"Could not report job {job_id}: {e}")
+                time.sleep(RETRY_DELAY)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run dashboard jobs on this machine')
+    parser.add_argument('--server', required=True, help='Dashboard URL, e.g. https://dashboard:8443')
+    parser.add_argument('--token', default=os.environ.get('AGENT_TOKEN'),
+                        help='Agent token from the dashboard config (default: $AGENT_TOKEN)')
+    parser.add_argument('--name', default=socket.gethostname(), help='Unique agent name (default: hostname)')
+    parser.add_argument('--labels', default='', help='Comma-separated labels, added to the detected ones')
+    parser.add_argument('--capacity', type=int, default=1, help='Jobs to run at the same time')
+    parser.add_argument('--work-dir', help='Directory for job files and logs (default: ./agent-work/NAME)')
+    parser.add_argument('--playbooks-dir',
+                        help='Run targets from this directory instead of the copy sent with each job')
+    parser.add_argument('--keep', action='store_true', help="Keep each job's work directory after it finishes")
+    parser.add_argument('--insecure', action='store_true', help="Don't verify the dashboard's TLS certificate")
+    args = parser.parse_args(argv)
+
+    if not args.token:
+        parser.error('--token or $AGENT_TOKEN is required')
+    labels = sorted(set(detect_labels()) | {label.strip() for label in args.labels.split(',') if label.strip()})
+    client = DashboardClient(args.server, args.token, args.name, insecure=args.insecure)
+    agent = Agent(client, labels, capacity=args.capacity,
+                  work_dir=args.work_dir or os.path.join('agent-work', args.name),
+                  playbooks_dir=args.playbooks_dir, keep=args.keep)
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        print("Agent stopped")
+
+
+if __name__ == "__main__":
+    main()
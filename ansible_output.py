@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Helpers for reading ansible-playbook output
+Parses PLAY RECAP lines so the results of several ansible-playbook runs
+(e.g. the shards of one job) can be merged into a single recap, and follows
+a run's output as it streams to build per-host result summaries.
+"""
+
+import re
+
+from log_reader import open_log
+
+RECAP_HEADER = 'PLAY RECAP'
+RECAP_FIELDS = ('ok', 'changed', 'unreachable', 'failed', 'skipped', 'rescued', 'ignored')
+
+# e.g. "web01 : ok=3 changed=1 unreachable=0 failed=0 skipped=0 rescued=0 ignored=0"
+RECAP_LINE = re.compile(r'^(?:\[[^\]]*\] )*(\S+)\s+:\s+((?:\w+=\d+\s*)+)$')
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+# Shard and timestamp prefixes the runner adds, e.g. "[shard 2] [12:00:01.250] "
+LINE_PREFIX = re.compile(r'^(?:\[[^\]]*\] )+')
+PLAY_LINE = re.compile(r'^PLAY \[(.*)\]')
+TASK_LINE = re.compile(r'^(?:TASK|RUNNING HANDLER) \[(.*)\]')
+# e.g. "ok: [web01]", "fatal: [web01]: UNREACHABLE! => ...", "changed: [web01 -> localhost]"
+RESULT_LINE = re.compile(r'^(ok|changed|skipping|failed|fatal|rescued|ignored): \[([^\]]+)\](.*)')
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_recap_line(line):
+    """Return (host, counts) for a recap line, or None"""
+    match = RECAP_LINE.match(ANSI_ESCAPE.sub('', line).strip())
+    if not match:
+        return None
+    counts = {}
+    for pair in match.group(2).split():
+        key, _, value = pair.partition('=')
+        counts[key] = int(value)
+    if 'ok' not in counts:
+        return None
+    return match.group(1), counts
+
+
+def parse_recap(lines):
+    """Return {host: counts} from the PLAY RECAP sections in lines"""
+    recap = {}
+    in_recap = False
+    for line in lines:
+        if RECAP_HEADER in line:
+            in_recap = True
+            continue
+        if not in_recap:
+            continue
+        parsed = parse_recap_line(line)
+        if parsed:
+            host, counts = parsed
+            recap[host] = counts
+        elif line.strip():
+            in_recap = False
+    return recap
+
+
+def format_recap(recap, title=RECAP_HEADER):
+    """Render {host: counts} in ansible-playbook's recap layout"""
+    if not recap:
+        return f"{title}\nNo hosts reported a recap\n"
+    width = max(len(host) for host in recap)
+    lines = [f"{title} {'*' * max(3, 70 - len(title))}"]
+    for host in sorted(recap):
+        counts = recap[host]
+        fields = '  '.join(f"{key}={counts.get(key, 0):<4}" for key in RECAP_FIELDS)
+        lines.append(f"{host:<{width}} : {fields}".rstrip())
+    totals = {key: sum(counts.get(key, 0) for counts in recap.values()) for key in RECAP_FIELDS}
+    lines.append('')
+    lines.append(f"{len(recap)} hosts: " + ' '.join(f"{key}={totals[key]}" for key in RECAP_FIELDS))
+    return '\n'.join(lines) + '\n'
+
+
+class ResultParser:
+    """
+    Incremental parser for ansible-playbook output fed in arbitrary chunks.
+    Tracks plays and tasks as they start, tallies each host's task results
+    and the names of tasks that failed on it, and takes the final counts
+    from PLAY RECAP once it appears. write() and flush() make it usable as
+    an output sink.
+    """
+
+    def __init__(self):
+        self.plays = 0
+        self.tasks = 0
+        self.current_play = None
+        self.current_task = None
+        self.hosts = {}
+        self.recap = {}
+        self._in_recap = False
+        self._partial = b''
+
+    def write(self, data):
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self.feed_line(line.decode('utf-8', 'replace'))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Parse a trailing line that had no newline"""
+        if self._partial:
+            self.feed_line(self._partial.decode('utf-8', 'replace'))
+            self._partial = b''
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {'counts': dict.fromkeys(RECAP_FIELDS, 0), 'failed_tasks': []}
+        return state
+
+    def feed_line(self, line):
+        line = LINE_PREFIX.sub('', ANSI_ESCAPE.sub('', line)).rstrip()
+        if RECAP_HEADER in line:
+            self._in_recap = True
+            return
+        if self._in_recap:
+            parsed = parse_recap_line(line)
+            if parsed:
+                self.recap[parsed[0]] = parsed[1]
+                return
+            if line.strip():
+                self._in_recap = False
+
+        match = TASK_LINE.match(line)
+        if match:
+            self.tasks += 1
+            self.current_task = match.group(1)
+            return
+        match = PLAY_LINE.match(line)
+        if match:
+            self.plays += 1
+            self.current_play = match.group(1)
+            self.current_task = None
+            return
+        match = RESULT_LINE.match(line)
+        if match:
+            status, host, rest = match.groups()
+            # Delegated results name the delegate after '->'; count them for the inventory host
+            state = self._host(host.split(' -> ')[0].strip())
+            if status == 'fatal':
+                status = 'unreachable' if 'UNREACHABLE!' in rest else 'failed'
+            elif status == 'skipping':
+                status = 'skipped'
+            state['counts'][status] += 1
+            if status in ('failed', 'unreachable') and self.current_task \
+                    and self.current_task not in state['failed_tasks']:
+                state['failed_tasks'].append(self.current_task)
+
+    def summary(self):
+        """Per-host outcome and run totals; recap counts win over streamed tallies"""
+        hosts = {}
+        for host in sorted(set(self.hosts) | set(self.recap)):
+            state = self.hosts.get(host) or {'counts': dict.fromkeys(RECAP_FIELDS, 0), 'failed_tasks': []}
+            counts = self.recap.get(host, state['counts'])
+            hosts[host] = dict({key: counts.get(key, 0) for key in RECAP_FIELDS},
+                               failed_tasks=list(state['failed_tasks']))
+        totals = {key: sum(h[key] for h in hosts.values()) for key in RECAP_FIELDS}
+        totals.update({
+            'hosts': len(hosts),
+            'failed_hosts': sum(1 for h in hosts.values() if h['failed']),
+            'unreachable_hosts': sum(1 for h in hosts.values() if h['unreachable'])
+        })
+        return {
+            'complete': bool(self.recap),
+            'plays': self.plays,
+            'tasks': self.tasks,
+            'current_play': self.current_play,
+            'current_task': self.current_task,
+            'hosts': hosts,
+            'totals': totals
+        }
+
+
+def summarize_log(filepath):
+    """Parse a finished log file in chunks and return its ResultParser summary"""
+    parser = ResultParser()
+    with open_log(filepath) as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            parser.write(chunk)
+    parser.close()
+    return parser.summary()
@@ -4,20 +4,43 @@ Flask Web GUI for Python Automation Scripts
 A simple, secure, lightweight web interface to trigger existing Python automation scripts
 """
 
+import cProfile
+import gzip
+import hashlib
+import hmac
+import io
 import os
-import subprocess
-import glob
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+import pstats
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+from flask import Flask, Response, g, render_template, request, redirect, url_for, session, flash, jsonify, send_file, stream_with_context
 from functools import wraps
 
 import json
-import sys
+
+from activity_log import ActivityLogger
+from assets import AssetCache
+from batches import BatchError, expand_batch, summarize_batch
+from file_catalog import DirectoryCache
+from inventory_model import InventoryCache, InventoryError
+from inventory_store import InventoryStore, PatchError, VersionConflict, snapshot_inventory
+from job_manager import JobManager, FINISHED, QUEUED, RUNNING
+from log_catalog import LogCatalog
+from run_history import RunHistory, FILTER_COLUMNS, SORT_ORDERS
+from runner import TASK_TYPES, load_summary, run_task, write_summary
+from scheduler import CronError, Schedule, Scheduler
+from log_reader import is_compressed, read_log_chunks, read_log_page, read_log_tail, resolve_log, tail_events
+from log_retention import LogRetention
+from log_search import LogSearchIndex, SearchError
+import metrics
+from metrics import JOBS, JOBS_FINISHED, JOB_QUEUE_SECONDS, JOB_SECONDS, LOG_BYTES_SERVED, REQUEST_SECONDS, timed
 
 app = Flask(__name__)
 
-# Load configuration
-CONFIG_FILE = 'config.json'
+# Load configuration (AUTOMATION_CONFIG points server processes at another file)
+CONFIG_FILE = os.environ.get('AUTOMATION_CONFIG', 'config.json')
 CONFIG_ERROR = False
 
 def load_config():
@@ -43,6 +66,53 @@ if config:
     PORT = config.get('port', 8443)
     DEBUG = config.get('debug', False)
     USE_HTTPS = config.get('use_https', False)
+    SSL_CERT = config.get('ssl_cert')
+    SSL_KEY = config.get('ssl_key')
+    WORKERS = config.get('workers', 1)
+    THREADS = config.get('threads', 8)
+
+    # Local state (catalogs and history databases)
+    DATA_DIR = config.get('data_dir', './data')
+    LOGS_PAGE_SIZE = config.get('logs_page_size', 200)
+
+    # Job execution limits
+    MAX_CONCURRENT_JOBS = config.get('max_concurrent_jobs', 4)
+    MAX_CONCURRENT_PER_TYPE = config.get('max_concurrent_per_type', {})
+    LOG_FLUSH_INTERVAL = config.get('log_flush_interval', 0.5)
+    LOG_TIMESTAMPS = config.get('log_timestamps', False)
+    
+    # Per task type run time limits in seconds, and rlimits/nice/ionice for task processes
+    JOB_TIMEOUTS = config.get('job_timeouts', {})
+    JOB_LIMITS = config.get('job_limits', {})
+    
+    # Identical submissions within this many seconds of an active job attach to it (0 disables)
+    COALESCE_WINDOW = config.get('coalesce_window', 300)
+    
+    # Recurring jobs run by the built-in scheduler
+    SCHEDULES = config.get('schedules', [])
+    
+    # Saved versions kept per inventory file
+    INVENTORY_HISTORY = config.get('inventory_history', 50)
+    
+    # Compression and pruning of finished runs under logs/
+    LOG_RETENTION_POLICY = config.get('log_retention', {})
+    
+    # Remote agents: shared token, labels each task type needs and the labels of this server's own workers
+    AGENT_TOKEN = config.get('agent_token')
+    JOB_LABELS = config.get('job_labels', {})
+    LOCAL_LABELS = config.get('local_labels', [])
+    LOCAL_EXECUTION = config.get('local_execution', True)
+
+    # Activity log rotation
+    ACTIVITY_ROTATE_BYTES = config.get('activity_rotate_bytes', 10 * 1024 * 1024)
+    ACTIVITY_ROTATE_INTERVAL = config.get('activity_rotate_interval', 86400)
+
+    # Gzip HTML, JSON and text responses for clients that accept it
+    COMPRESS_RESPONSES = config.get('compress_responses', True)
+
+    # Monitoring: bearer token for /metrics and users allowed to profile requests
+    METRICS_TOKEN = config.get('metrics_token')
+    ADMINS = config.get('admins', [])
 else:
     CONFIG_ERROR = True
     # Default settings just to serve the error page
@@ -50,6 +120,31 @@ else:
     PORT = 8443
     DEBUG = False
     USE_HTTPS = False
+    SSL_CERT = None
+    SSL_KEY = None
+    WORKERS = 1
+    THREADS = 8
+    DATA_DIR = './data'
+    LOGS_PAGE_SIZE = 200
+    MAX_CONCURRENT_JOBS = 4
+    MAX_CONCURRENT_PER_TYPE = {}
+    LOG_FLUSH_INTERVAL = 0.5
+    LOG_TIMESTAMPS = False
+    JOB_TIMEOUTS = {}
+    JOB_LIMITS = {}
+    COALESCE_WINDOW = 300
+    SCHEDULES = []
+    INVENTORY_HISTORY = 50
+    LOG_RETENTION_POLICY = {}
+    AGENT_TOKEN = None
+    JOB_LABELS = {}
+    LOCAL_LABELS = []
+    LOCAL_EXECUTION = True
+    ACTIVITY_ROTATE_BYTES = 10 * 1024 * 1024
+    ACTIVITY_ROTATE_INTERVAL = 86400
+    COMPRESS_RESPONSES = True
+    METRICS_TOKEN = None
+    ADMINS = []
     USERS = {}
     app.secret_key = 'error-mode'
 
@@ -58,28 +153,204 @@ def check_config():
     if CONFIG_ERROR:
         return render_template('pages/config_error.html'), 503
 
+# Request metrics and on-demand profiling
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if request.args.get('profile') == '1' and session.get('username') in ADMINS:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiler.disable()
+        response.headers['X-Profile'] = save_profile(profiler)
+    
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                endpoint=request.endpoint or 'unknown',
+                                method=request.method,
+                                status=response.status_code)
+    return response
+
+# Responses smaller than this are sent as-is; compressing them saves little
+MIN_COMPRESS_BYTES = 1024
+COMPRESSIBLE_TYPES = ('text/html', 'application/json', 'text/plain')
+
+@app.after_request
+def compress_response(response):
+    """Gzip dynamic HTML, JSON and text; streams, file downloads and static assets are left alone"""
+    if (not COMPRESS_RESPONSES
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or request.endpoint == 'asset'
+            or not request.accept_encodings['gzip']):
+        return response
+    
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def save_profile(profiler):
+    """Write a request's cProfile stats (.prof) and a text summary, returning the file name"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{request.endpoint or 'unknown'}_{os.getpid()}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}.prof"))
+    
+    summary = io.StringIO()
+    summary.write(f"{request.method} {request.full_path}\n\n")
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+    with open(os.path.join(PROFILE_DIR, f"{name}.txt"), 'w') as f:
+        f.write(summary.getvalue())
+    return f"{name}.prof"
+
 # Activity Logger
 def log_activity(username, action, details=None):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] User: {username} | Action: {action}"
-    if details:
-        log_entry += f" | Details: {details}"
-    
-    log_file = os.path.join(LOGS_DIR, 'activity.log')
-    with open(log_file, 'a') as f:
-        f.write(log_entry + "\n")
+    """Queue an audit entry; the background writer persists it off the request thread"""
+    activity_logger.log(username, action, details)
 
 # Directory paths
 PLAYBOOKS_DIR = './playbooks'
 INVENTORY_DIR = './inventory'
 LOGS_DIR = './logs'
 
-# Script wrappers
-SCRIPT_WRAPPERS = {
-    'ansible': './run_ansible.py',
-    'powershell': './run_powershell_with_ansible.py',
-    'shell': './run_sh_with_ansible.py'
-}
+# cProfile output of requests made with ?profile=1
+PROFILE_DIR = os.path.join(DATA_DIR, 'profiles')
+
+# Largest log tail returned inline by /api/log; bigger files are read page by page
+MAX_INLINE_LOG_BYTES = 2 * 1024 * 1024
+
+# Index of the logs directory backing the dashboard and the log explorer
+log_catalog = LogCatalog(LOGS_DIR, os.path.join(DATA_DIR, 'catalog.db'))
+
+# Cached playbook and inventory listings
+directory_cache = DirectoryCache()
+
+# Fingerprinted, precompressed CSS and JS served from /assets
+asset_cache = AssetCache(os.path.join(app.root_path, 'static'))
+
+@app.template_global()
+def asset_url(path):
+    """URL of a static file with its content hash, so it can be cached indefinitely"""
+    return url_for('asset', path=asset_cache.url_path(path))
+
+# Parsed inventory models, rebuilt when an inventory file changes
+inventory_cache = InventoryCache()
+
+# Atomic inventory saves with a compressed version history
+inventory_store = InventoryStore(INVENTORY_DIR, os.path.join(DATA_DIR, 'inventory_history.db'),
+                                 keep_versions=INVENTORY_HISTORY)
+
+# Structured audit log (JSONL) with an indexed copy for queries
+activity_logger = ActivityLogger(
+    os.path.join(LOGS_DIR, 'activity.jsonl'),
+    os.path.join(DATA_DIR, 'activity.db'),
+    rotate_bytes=ACTIVITY_ROTATE_BYTES,
+    rotate_interval=ACTIVITY_ROTATE_INTERVAL,
+    legacy_path=os.path.join(LOGS_DIR, 'activity.log')
+)
+
+# Structured record of every execution
+run_history = RunHistory(os.path.join(DATA_DIR, 'history.db'))
+
+def execute_job(job):
+    """Run a queued job in-process on a worker thread and return its exit code"""
+    params = job.params
+    log_dir = os.path.join(LOGS_DIR, os.path.dirname(job.log_path))
+    
+    def on_start(process):
+        job_manager.set_pid(job, process.pid)
+    
+    try:
+        # The run reads its own copy, so saves made while it runs don't change its inventory
+        inventory = snapshot_inventory(os.path.join(INVENTORY_DIR, params['inventory']), log_dir)
+        return run_task(
+            job.task_type,
+            os.path.join(PLAYBOOKS_DIR, params['target_file']),
+            inventory,
+            log_dir,
+            forks=params['forks'],
+            verbose=params['verbose'],
+            shards=params.get('shards', 1),
+            on_start=on_start,
+            job_id=job.id,
+            flush_interval=LOG_FLUSH_INTERVAL,
+            timestamps=LOG_TIMESTAMPS,
+            timeout=JOB_TIMEOUTS.get(job.task_type),
+            should_cancel=lambda: job_manager.cancel_requested(job.id),
+            limits=JOB_LIMITS
+        )
+    except Exception as e:
+        # Keep the failure next to the job's output rather than in a shared log
+        with open(os.path.join(log_dir, 'execution.log'), 'a') as f:
+            f.write(f"Error executing job {job.id}: {e}\n")
+        raise
+    finally:
+        record_host_results(job, log_dir)
+
+def record_host_results(job, log_dir):
+    """Index the per-host results the runner saved for a finished job"""
+    if not TASK_TYPES[job.task_type].get('results'):
+        return
+    summary = load_summary(log_dir)
+    if summary and summary['hosts']:
+        try:
+            run_history.record_hosts(job.log_path, summary, job_id=job.id)
+        except Exception as e:
+            print(f"Could not record host results for job {job.id}: {e}")
+
+# Job queue and worker pool
+job_manager = JobManager(
+    execute_job,
+    os.path.join(DATA_DIR, 'jobs.db'),
+    max_workers=MAX_CONCURRENT_JOBS,
+    per_type_limits={k: v for k, v in MAX_CONCURRENT_PER_TYPE.items() if k in TASK_TYPES},
+    labels=LOCAL_LABELS,
+    local=LOCAL_EXECUTION
+)
+job_manager.add_listener(run_history.record)
+
+def record_job_metrics(job):
+    """Job listener feeding the queue wait and duration histograms"""
+    if job.status == FINISHED:
+        result = 'failed' if job.return_code != 0 or job.error else 'success'
+        JOBS_FINISHED.inc(task_type=job.task_type, result=result)
+        if job.started_at:
+            # Jobs cancelled while queued never ran
+            JOB_SECONDS.observe(job.duration, task_type=job.task_type, result=result)
+    elif job.started_at:
+        JOB_QUEUE_SECONDS.observe(job.started_at - job.submitted_at, task_type=job.task_type)
+
+def collect_job_counts():
+    """Refresh the job gauge from the job manager on each scrape"""
+    counts = {(state, task_type): 0 for state in (QUEUED, RUNNING, FINISHED) for task_type in TASK_TYPES}
+    for job in job_manager.list_jobs():
+        key = (job.status, job.task_type)
+        counts[key] = counts.get(key, 0) + 1
+    JOBS.replace(counts)
+
+job_manager.add_listener(record_job_metrics)
+
+def index_finished_log(job):
+    """Job listener queueing each finished run's log for the search index"""
+    if job.status == FINISHED and job.log_path:
+        log_search.enqueue(job.log_path)
+
+job_manager.add_listener(index_finished_log)
+metrics.REGISTRY.add_collector(collect_job_counts)
 
 # Templates moved to separate template files
 
@@ -92,6 +363,17 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def agent_required(f):
+    """Agent API routes need the configured agent token as a bearer token"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not AGENT_TOKEN:
+            return jsonify({'error': 'Agents are not enabled'}), 404
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {AGENT_TOKEN}'):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 # Helper functions
 # Helper functions
 def is_safe_path(basedir, path, follow_symlinks=True):
@@ -105,52 +387,117 @@ def is_safe_path(basedir, path, follow_symlinks=True):
 
 def get_files_by_extension(directory, extension):
     """Get files with specific extension from directory"""
-    if not os.path.exists(directory):
-        return []
-    pattern = os.path.join(directory, f'*.{extension}')
-    return [os.path.basename(f) for f in glob.glob(pattern)]
+    return directory_cache.files(directory, extension)
+
+def file_validators(filepath):
+    """ETag and Last-Modified for a file, derived from its stat data"""
+    st = os.stat(filepath)
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    return etag, datetime.fromtimestamp(int(st.st_mtime), timezone.utc)
 
-def get_log_files(subdir=''):
-    """Get log files and directories with metadata"""
+def is_not_modified(etag, last_modified):
+    """Check the request's conditional headers against a file's validators"""
+    if request.if_none_match:
+        # Weak comparison: compressed responses carry a weak form of the same tag
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+def with_validators(response, etag, last_modified):
+    """Attach validators so clients revalidate instead of re-downloading"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
+def not_modified_response(etag, last_modified):
+    return with_validators(Response(status=304), etag, last_modified)
+
+def get_log_files(subdir='', cursor=None):
+    """Get one page of log files and directories with metadata from the catalog"""
     target_dir = os.path.join(LOGS_DIR, subdir)
     
     # Security check
     if not is_safe_path(os.path.abspath(LOGS_DIR), os.path.abspath(target_dir)):
-        return [], []
+        return [], [], None
         
     if not os.path.exists(target_dir):
-        return [], []
-    
-    dirs = []
-    files = []
+        return [], [], None
     
     try:
-        for filename in os.listdir(target_dir):
-            filepath = os.path.join(target_dir, filename)
-            # Use forward slashes for web paths
-            relative_path = os.path.join(subdir, filename).replace('\\', '/')
-            
-            if os.path.isdir(filepath):
-                dirs.append({
-                    'name': filename,
-                    'path': relative_path,
-                    'type': 'dir'
-                })
-            elif os.path.isfile(filepath):
-                stat = os.stat(filepath)
-                files.append({
-                    'name': filename,
-                    'path': relative_path,
-                    'size': stat.st_size,
-                    'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                    'type': 'file'
-                })
-    except OSError:
-        pass
-    
-    dirs.sort(key=lambda x: x['name'])
-    files.sort(key=lambda x: x['modified'], reverse=True)
-    return dirs, files
+        return log_catalog.list_dir(subdir, cursor=cursor, limit=LOGS_PAGE_SIZE)
+    except ValueError:
+        # Malformed cursor; start from the first page
+        return log_catalog.list_dir(subdir, limit=LOGS_PAGE_SIZE)
+
+def create_run_dir(task_type):
+    """Create a unique timestamped log directory for a new run"""
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    name = f"{timestamp}_{task_type}"
+    suffix = 1
+    while True:
+        try:
+            os.makedirs(os.path.join(LOGS_DIR, name))
+            return name
+        except FileExistsError:
+            suffix += 1
+            name = f"{timestamp}_{task_type}_{suffix}"
+
+def file_digest(filepath):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def submission_key(task_type, target_path, inventory_path, options):
+    """Identity of a submission: task type, file contents and run options"""
+    parts = [task_type, file_digest(target_path), file_digest(inventory_path), json.dumps(options, sort_keys=True)]
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+def is_log_active(log_path):
+    """Check whether a queued or running job is still writing to a log"""
+    job = job_manager.find_by_log_path(log_path)
+    return job is not None and job.status != FINISHED
+
+# Full-text index of execution logs, kept up to date as runs finish
+log_search = LogSearchIndex(LOGS_DIR, os.path.join(DATA_DIR, 'log_search.db'), is_active=is_log_active)
+
+def retention_changed(compressed, deleted):
+    """Bring the catalog and search index up to date after a retention pass"""
+    for run in compressed:
+        log_catalog.rescan(run)
+    if deleted:
+        log_catalog.rescan()
+    for run in deleted:
+        log_search.forget(f"{run}/execution.log")
+
+# Compression and pruning of finished runs
+log_retention = LogRetention(
+    LOGS_DIR,
+    os.path.join(DATA_DIR, 'log_retention.json'),
+    policy=LOG_RETENTION_POLICY,
+    is_active=lambda run: is_log_active(f"{run}/execution.log"),
+    on_change=retention_changed
+)
+
+def parse_date(value, end_of_day=False):
+    """Parse a YYYY-MM-DD filter value into a timestamp"""
+    if not value:
+        return None
+    ts = datetime.strptime(value, '%Y-%m-%d').timestamp()
+    return ts + 86400 if end_of_day else ts
+
+def history_filters(args):
+    """Collect run history filters from request arguments"""
+    filters = {column: args.get(column) for column in FILTER_COLUMNS}
+    filters['result'] = args.get('result')
+    filters['since'] = parse_date(args.get('since'))
+    filters['until'] = parse_date(args.get('until'), end_of_day=True)
+    return filters
 
 def build_breadcrumbs(current_path):
     """Build breadcrumb entries for the logs explorer"""
@@ -167,6 +514,32 @@ def build_breadcrumbs(current_path):
     return breadcrumbs
 
 # Routes
+@app.route('/assets/<path:path>')
+def asset(path):
+    """Serve a static file, precompressed, with far-future caching when the URL hash is current"""
+    found, hash_matches = asset_cache.resolve(path)
+    if found is None:
+        return 'Not found', 404
+    
+    encoding, body = found.body_for(request.accept_encodings)
+    etag = f"{found.digest}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=found.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if hash_matches:
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        # Stale or unhashed URL: serve the current file but make clients revalidate
+        response.cache_control.no_cache = True
+    return response
+
 @app.route('/')
 def index():
     if 'logged_in' in session:
@@ -199,35 +572,9 @@ def logout():
 
 def get_recent_logs(hours=1):
     """Get log files modified within the last X hours"""
-    recent_logs = []
     cutoff_time = datetime.now().timestamp() - (hours * 3600)
-    
-    def scan_directory(directory, base_path=''):
-        if not os.path.exists(directory):
-            return
-        try:
-            for item in os.listdir(directory):
-                item_path = os.path.join(directory, item)
-                relative_path = os.path.join(base_path, item).replace('\\', '/')
-                
-                if os.path.isdir(item_path):
-                    scan_directory(item_path, relative_path)
-                elif os.path.isfile(item_path):
-                    stat = os.stat(item_path)
-                    if stat.st_mtime >= cutoff_time:
-                        recent_logs.append({
-                            'name': item,
-                            'path': relative_path,
-                            'size': stat.st_size,
-                            'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                            'timestamp': stat.st_mtime
-                        })
-        except OSError:
-            pass
-    
-    scan_directory(LOGS_DIR)
-    recent_logs.sort(key=lambda x: x['timestamp'], reverse=True)
-    return recent_logs[:10]  # Return max 10 recent logs
+    with timed('recent_logs'):
+        return log_catalog.recent_files(cutoff_time, limit=10)  # Return max 10 recent logs
 
 @app.route('/dashboard')
 @login_required
@@ -236,7 +583,10 @@ def dashboard():
     playbook_files = get_files_by_extension(PLAYBOOKS_DIR, 'yml')
     powershell_files = get_files_by_extension(PLAYBOOKS_DIR, 'ps1')
     shell_files = get_files_by_extension(PLAYBOOKS_DIR, 'sh')
-    inventory_files = get_files_by_extension(INVENTORY_DIR, 'ini')
+    inventory_files = [
+        {'name': name, 'hosts': inventory_cache.host_count(os.path.join(INVENTORY_DIR, name))}
+        for name in get_files_by_extension(INVENTORY_DIR, 'ini')
+    ]
     
     # Get recent logs from the last hour
     recent_logs = get_recent_logs(hours=1)
@@ -247,65 +597,162 @@ def dashboard():
                                 powershell_files=powershell_files,
                                 shell_files=shell_files,
         inventory_files=inventory_files,
-        recent_logs=recent_logs
+        recent_logs=recent_logs,
+        schedules=scheduler.status(),
+        agents=job_manager.list_agents()
     )
 
-@app.route('/execute_task', methods=['POST'])
-@login_required
-def execute_task():
-    task_type = request.form.get('task_type')
-    target_file = request.form.get('target_file')
-    inventory = request.form.get('inventory')
-    verbose = request.form.get('verbose') == 'true'
-    forks = request.form.get('forks', '1')
-    
+class SubmissionError(ValueError):
+    """A task submission with a missing file or an invalid option"""
+
+def validate_submission(task_type, target_file, inventory, forks, shards):
+    """Check a submission before it is queued; returns the inventory's host count"""
     if not all([task_type, target_file, inventory]):
-        flash('Please fill in all fields')
-        return redirect(url_for('dashboard'))
+        raise SubmissionError('Please fill in all fields')
     
-    # Validate script wrapper exists
-    script_wrapper = SCRIPT_WRAPPERS.get(task_type)
-    if not script_wrapper or not os.path.exists(script_wrapper):
-        flash(f'Script wrapper not found: {script_wrapper}')
-        return redirect(url_for('dashboard'))
+    # Validate task type and options
+    if task_type not in TASK_TYPES:
+        raise SubmissionError(f'Unknown task type: {task_type}')
+    
+    if forks != 'auto' and (not forks.isdigit() or int(forks) < 1):
+        raise SubmissionError(f"Forks must be a positive number or 'auto': {forks}")
+    
+    if shards != 'auto' and (not shards.isdigit() or int(shards) < 1):
+        raise SubmissionError(f"Shards must be a positive number or 'auto': {shards}")
+    
+    if shards != '1' and not TASK_TYPES[task_type].get('shardable'):
+        raise SubmissionError(f'{TASK_TYPES[task_type]["name"]} tasks cannot be sharded')
     
     # Validate files exist
     playbook_path = os.path.join(PLAYBOOKS_DIR, target_file)
     inventory_path = os.path.join(INVENTORY_DIR, inventory)
     
+    # Security check: the file is run, and its contents are sent to remote agents
+    if not is_safe_path(os.path.abspath(PLAYBOOKS_DIR), os.path.abspath(playbook_path)):
+        raise SubmissionError(f'Invalid target file: {target_file}')
+    
+    if not is_safe_path(os.path.abspath(INVENTORY_DIR), os.path.abspath(inventory_path)):
+        raise SubmissionError(f'Invalid inventory: {inventory}')
+    
     if not os.path.exists(playbook_path):
-        flash(f'Target file not found: {playbook_path}')
-        return redirect(url_for('dashboard'))
+        raise SubmissionError(f'Target file not found: {playbook_path}')
     
     if not os.path.exists(inventory_path):
-        flash(f'Inventory file not found: {inventory_path}')
+        raise SubmissionError(f'Inventory file not found: {inventory_path}')
+    
+    # Validate the inventory parses before queueing a run against it
+    try:
+        return inventory_cache.get(inventory_path).host_count
+    except (OSError, InventoryError) as e:
+        raise SubmissionError(f'Invalid inventory {inventory}: {e}')
+
+def job_fields(task_type, target_file, inventory, forks='1', shards='1', verbose=False):
+    """Job manager arguments for a validated submission, with a fresh run directory for its log"""
+    params = {
+        'target_file': target_file,
+        'inventory': inventory,
+        'forks': forks if forks == 'auto' else int(forks),
+        'shards': shards if shards == 'auto' else int(shards),
+        'verbose': verbose
+    }
+    options = {k: params[k] for k in ('forks', 'shards', 'verbose')}
+    key = submission_key(task_type, os.path.join(PLAYBOOKS_DIR, target_file),
+                         os.path.join(INVENTORY_DIR, inventory), options)
+    
+    # Each job writes to its own run directory so its log can be followed
+    run_dir = create_run_dir(task_type)
+    return {
+        'task_type': task_type,
+        'description': f"{target_file} on {inventory}",
+        'log_path': f"{run_dir}/execution.log",
+        'params': params,
+        'submission_key': key,
+        'labels': JOB_LABELS.get(task_type, [])
+    }
+
+def submit_task(user, task_type, target_file, inventory, forks='1', shards='1', verbose=False, force=False):
+    """
+    Queue a validated task, or attach to an identical queued or running job
+    unless force is set. Used by execute_task and the scheduler.
+    Returns (job, created).
+    """
+    fields = job_fields(task_type, target_file, inventory, forks=forks, shards=shards, verbose=verbose)
+    
+    # Queue the job, or join an identical one that is still queued or running;
+    # a worker thread runs it in-process through the shared runner
+    job, created = job_manager.submit_or_attach(
+        user=user,
+        coalesce_window=0 if force else COALESCE_WINDOW,
+        **fields
+    )
+    
+    if created:
+        log_activity(user, "EXECUTE_TASK", f"Job: {job.id}, Type: {task_type}, File: {target_file}, Inventory: {inventory}")
+    else:
+        os.rmdir(os.path.join(LOGS_DIR, os.path.dirname(fields['log_path'])))
+        log_activity(user, "EXECUTE_TASK_ATTACHED", f"Job: {job.id}, Type: {task_type}, File: {target_file}, Inventory: {inventory}")
+    return job, created
+
+def submit_scheduled(schedule):
+    """Scheduler callback: queue a schedule's run through the same path as execute_task"""
+    validate_submission(schedule.task_type, schedule.target_file, schedule.inventory, schedule.forks, schedule.shards)
+    # Schedules apply their own concurrency rules, so they never attach to another job
+    job, _ = submit_task(schedule.user, schedule.task_type, schedule.target_file, schedule.inventory,
+                         forks=schedule.forks, shards=schedule.shards, verbose=schedule.verbose, force=True)
+    return job.id
+
+def load_schedules(entries):
+    """Build schedules from the config, skipping (and reporting) invalid ones"""
+    schedules = []
+    for entry in entries:
+        try:
+            schedules.append(Schedule.from_config(entry))
+        except (CronError, ValueError) as e:
+            print(f"Ignoring schedule {entry.get('name')}: {e}")
+    return schedules
+
+# Recurring jobs; every server process runs the loop and slots are claimed in the database
+scheduler = Scheduler(
+    load_schedules(SCHEDULES),
+    os.path.join(DATA_DIR, 'scheduler.db'),
+    submit_scheduled,
+    lambda schedule: job_manager.count_active(schedule.user)
+)
+
+def start_background_workers():
+    """Start this process's job workers, scheduler, log indexer and log retention"""
+    job_manager.start()
+    scheduler.start()
+    log_search.start()
+    log_retention.start()
+
+@app.route('/execute_task', methods=['POST'])
+@login_required
+def execute_task():
+    task_type = request.form.get('task_type')
+    target_file = request.form.get('target_file')
+    inventory = request.form.get('inventory')
+    verbose = request.form.get('verbose') == 'true'
+    forks = request.form.get('forks', '1').strip().lower()
+    shards = request.form.get('shards', '1').strip().lower() or '1'
+    force = request.form.get('force') == 'true'
+    
+    try:
+        host_count = validate_submission(task_type, target_file, inventory, forks, shards)
+    except SubmissionError as e:
+        flash(str(e))
         return redirect(url_for('dashboard'))
     
+    if host_count == 0:
+        flash(f'Warning: inventory {inventory} defines no hosts')
+    
     try:
-        # Execute the command
-        command = [
-            sys.executable, script_wrapper,
-            '--playbooks', playbook_path,
-            '--inventory', inventory_path,
-            '--forks', str(forks)
-        ]
-        
-        if verbose:
-            command.append('--verbose')
-        
-        # Run in background but capture output to a debug log
-        debug_log = os.path.join(LOGS_DIR, 'debug_execution.log')
-        with open(debug_log, 'a') as f:
-            f.write(f"[{datetime.now()}] Starting command: {' '.join(command)}\n")
-            
-        # We use Popen but redirect to a file to debug
-        with open(debug_log, 'a') as outfile:
-            subprocess.Popen(command, 
-                            stdout=outfile, 
-                            stderr=outfile)
-        
-        log_activity(session['username'], "EXECUTE_TASK", f"Type: {task_type}, File: {target_file}, Inventory: {inventory}")
-        flash(f'Job started successfully: {task_type} - {target_file}')
+        job, created = submit_task(session['username'], task_type, target_file, inventory,
+                                   forks=forks, shards=shards, verbose=verbose, force=force)
+        if created:
+            flash(f'Job {job.id} queued: {task_type} - {target_file}')
+        else:
+            flash(f'An identical job is already {job.status}; attached to job {job.id} started by {job.user}')
         
     except Exception as e:
         log_activity(session['username'], "EXECUTE_TASK_ERROR", f"Error: {str(e)}")
@@ -313,12 +760,368 @@ def execute_task():
     
     return redirect(url_for('dashboard'))
 
+@app.route('/api/jobs')
+@login_required
+def api_jobs():
+    """API endpoint to list queued, running and finished jobs"""
+    status = request.args.get('status')
+    jobs = [job.to_dict() for job in job_manager.list_jobs(status=status)]
+    outcomes = run_history.outcomes([job['log_path'] for job in jobs if job['status'] == FINISHED])
+    for job in jobs:
+        job['outcome'] = outcomes.get(job['log_path'])
+        if job['status'] == RUNNING and TASK_TYPES.get(job['task_type'], {}).get('results'):
+            # Live progress from the summary the runner keeps current while output streams
+            summary = load_summary(os.path.join(LOGS_DIR, os.path.dirname(job['log_path'])))
+            if summary:
+                job['outcome'] = {key: summary['totals'][key] for key in ('hosts', 'failed_hosts', 'unreachable_hosts')}
+                job['current_task'] = summary['current_task']
+    return jsonify({'jobs': jobs, 'counts': job_manager.counts()})
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def api_job_status(job_id):
+    """API endpoint to get the status of a single job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+def batch_response(batch, jobs):
+    summary = summarize_batch(batch, jobs)
+    summary['submitted_at'] = datetime.fromtimestamp(summary['submitted_at']).strftime('%Y-%m-%d %H:%M:%S')
+    return summary
+
+@app.route('/api/batches', methods=['POST'])
+@login_required
+def api_submit_batch():
+    """API endpoint to queue a matrix of targets x inventories or a dependency graph of jobs as one batch"""
+    spec = request.get_json(silent=True)
+    try:
+        entries = expand_batch(spec)
+        for entry in entries:
+            try:
+                validate_submission(entry['task_type'], entry['target_file'], entry['inventory'],
+                                    entry['forks'], entry['shards'])
+            except SubmissionError as e:
+                raise BatchError(f"Job {entry['key']}: {e}")
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    positions = {entry['key']: i for i, entry in enumerate(entries)}
+    fields = []
+    try:
+        for entry in entries:
+            job = job_fields(entry['task_type'], entry['target_file'], entry['inventory'],
+                             forks=entry['forks'], shards=entry['shards'], verbose=entry['verbose'])
+            job['depends_on'] = [positions[parent] for parent in entry['depends_on']]
+            fields.append(job)
+        
+        # Batch members never coalesce: their dependencies are on these exact jobs
+        batch_id, _ = job_manager.submit_batch(fields, name=spec.get('name'), user=session['username'])
+    except Exception:
+        # No job will ever write to the run directories created for this batch
+        for job in fields:
+            shutil.rmtree(os.path.join(LOGS_DIR, os.path.dirname(job['log_path'])), ignore_errors=True)
+        raise
+    log_activity(session['username'], "SUBMIT_BATCH", f"Batch: {batch_id}, Jobs: {len(fields)}")
+    return jsonify(batch_response(*job_manager.get_batch(batch_id)))
+
+@app.route('/api/batches')
+@login_required
+def api_batches():
+    """API endpoint listing recent batches with their progress"""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify({'batches': [batch_response(batch, jobs) for batch, jobs in job_manager.list_batches(limit)]})
+
+@app.route('/api/batches/<batch_id>')
+@login_required
+def api_batch_status(batch_id):
+    """API endpoint with a batch's aggregate status and its jobs"""
+    batch, jobs = job_manager.get_batch(batch_id)
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(batch_response(batch, jobs))
+
+@app.route('/api/batches/<batch_id>/cancel', methods=['POST'])
+@login_required
+def api_cancel_batch(batch_id):
+    """API endpoint to cancel every queued and running job of a batch"""
+    batch, jobs = job_manager.get_batch(batch_id)
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+    for job in jobs:
+        if job.status != FINISHED:
+            job_manager.cancel(job.id, user=session['username'])
+    log_activity(session['username'], "CANCEL_BATCH", f"Batch: {batch_id}")
+    return jsonify(batch_response(*job_manager.get_batch(batch_id)))
+
+@app.route('/api/jobs/<job_id>/hosts')
+@login_required
+def api_job_hosts(job_id):
+    """API endpoint with per-host results of a job, live while it runs (?failed=1 for failures only)"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if not TASK_TYPES[job.task_type].get('results'):
+        return jsonify({'error': f'{TASK_TYPES[job.task_type]["name"]} jobs have no per-host results'}), 400
+    
+    failed_only = request.args.get('failed') == '1'
+    if job.status == FINISHED:
+        hosts = run_history.host_results(job.log_path, failed_only=failed_only)
+        if hosts or failed_only:
+            return jsonify({'job_id': job.id, 'complete': all(h['complete'] for h in hosts), 'hosts': hosts})
+    
+    summary = load_summary(os.path.join(LOGS_DIR, os.path.dirname(job.log_path))) or {'hosts': {}, 'complete': False}
+    hosts = [dict(result, host=host) for host, result in summary['hosts'].items()
+             if not failed_only or result['failed'] or result['unreachable']]
+    return jsonify({
+        'job_id': job.id,
+        'complete': summary['complete'],
+        'current_task': summary.get('current_task'),
+        'hosts': hosts
+    })
+
+@app.route('/api/hosts/<host>/results')
+@login_required
+def api_host_results(host):
+    """API endpoint with a host's results across recent runs"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    results = run_history.host_history(host, limit=limit)
+    for result in results:
+        if result.get('submitted_at'):
+            result['submitted_at'] = datetime.fromtimestamp(result['submitted_at']).strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify({'host': host, 'results': results})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def api_cancel_job(job_id):
+    """API endpoint to cancel a queued or running job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == FINISHED:
+        return jsonify({'error': 'Job has already finished'}), 409
+    
+    job = job_manager.cancel(job_id, user=session['username'])
+    log_activity(session['username'], "CANCEL_JOB", f"Job: {job_id}, Status: {job.status}")
+    return jsonify(job.to_dict())
+
+@app.route('/api/schedules')
+@login_required
+def api_schedules():
+    """API endpoint listing schedules with their next run, last run and recent misses"""
+    return jsonify({'schedules': scheduler.status()})
+
+@app.route('/api/schedules/runs')
+@login_required
+def api_schedule_runs():
+    """API endpoint listing recent scheduled runs, optionally for one schedule"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'runs': scheduler.runs(request.args.get('schedule'), limit=limit)})
+
+# Remote agents
+AGENT_NAME = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+@app.route('/api/agents')
+@login_required
+def api_agents():
+    """API endpoint listing registered agents with their labels, load and whether they are online"""
+    agents = job_manager.list_agents()
+    for agent in agents:
+        for key in ('registered_at', 'last_seen'):
+            agent[key] = datetime.fromtimestamp(agent[key]).strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify({'agents': agents})
+
+@app.route('/api/agents/register', methods=['POST'])
+@agent_required
+def api_agent_register():
+    """Agent API: announce an agent with its labels and capacity"""
+    data = request.get_json(silent=True) or {}
+    name = data.get('name', '')
+    labels = data.get('labels') or []
+    if not AGENT_NAME.match(name):
+        return jsonify({'error': 'Agent names may only contain letters, digits, ".", "_" and "-"'}), 400
+    if not isinstance(labels, list) or not all(isinstance(label, str) for label in labels):
+        return jsonify({'error': 'labels must be a list of strings'}), 400
+    try:
+        capacity = int(data.get('capacity', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'capacity must be a number'}), 400
+    
+    agent = job_manager.register_agent(name, host=data.get('host') or request.remote_addr,
+                                       labels=labels, capacity=capacity)
+    log_activity(f"agent:{name}", "AGENT_REGISTER", f"Host: {agent['host']}, Labels: {','.join(labels)}, Capacity: {agent['capacity']}")
+    return jsonify({'name': name, 'labels': json.loads(agent['labels']), 'capacity': agent['capacity']})
+
+@app.route('/api/agents/<name>/claim', methods=['POST'])
+@agent_required
+def api_agent_claim(name):
+    """Agent API: hand the agent its next job with the files it needs, or 204 when there is none"""
+    if not job_manager.get_agent(name):
+        return jsonify({'error': 'Agent not registered'}), 404
+    job = job_manager.claim_for_agent(name)
+    if job is None:
+        return Response(status=204)
+    
+    params = job.params
+    log_dir = os.path.join(LOGS_DIR, os.path.dirname(job.log_path))
+    try:
+        # Same snapshot a local run would read
+        inventory_path = snapshot_inventory(os.path.join(INVENTORY_DIR, params['inventory']), log_dir)
+        with open(inventory_path, 'r', encoding='utf-8') as f:
+            inventory_content = f.read()
+        with open(os.path.join(PLAYBOOKS_DIR, params['target_file']), 'r', encoding='utf-8') as f:
+            target_content = f.read()
+    except OSError as e:
+        job_manager.finish_agent_job(job, error=f"Could not prepare job for agent {name}: {e}")
+        return Response(status=204)
+    
+    return jsonify({
+        'job': job.to_dict(),
+        'target': target_content,
+        'inventory': inventory_content,
+        'timeout': JOB_TIMEOUTS.get(job.task_type),
+        'limits': JOB_LIMITS,
+        'timestamps': LOG_TIMESTAMPS
+    })
+
+@app.route('/api/agents/<name>/jobs/<job_id>/log', methods=['POST'])
+@agent_required
+def api_agent_log(name, job_id):
+    """
+    Agent API: append output to a job's execution.log. offset is where the
+    chunk starts, so a retried upload is never written twice. Doubles as the
+    job's heartbeat and tells the agent whether the job was cancelled.
+    """
+    job = job_manager.agent_job(name, job_id)
+    if not job:
+        return jsonify({'error': 'Job is not running on this agent'}), 404
+    
+    filepath = os.path.join(LOGS_DIR, job.log_path)
+    offset = request.args.get('offset', 0, type=int)
+    size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+    if offset != size:
+        return jsonify({'error': 'Offset does not match the log size', 'size': size}), 409
+    data = request.get_data()
+    if data:
+        with open(filepath, 'ab') as f:
+            f.write(data)
+    return jsonify({'size': size + len(data), 'cancel': job_manager.agent_heartbeat(name, job_id)})
+
+@app.route('/api/agents/<name>/jobs/<job_id>/summary', methods=['PUT'])
+@agent_required
+def api_agent_summary(name, job_id):
+    """Agent API: replace a running job's per-host result summary"""
+    job = job_manager.agent_job(name, job_id)
+    if not job:
+        return jsonify({'error': 'Job is not running on this agent'}), 404
+    summary = request.get_json(silent=True)
+    if not isinstance(summary, dict) or not isinstance(summary.get('hosts'), dict):
+        return jsonify({'error': 'Expected a result summary'}), 400
+    write_summary(os.path.join(LOGS_DIR, os.path.dirname(job.log_path)), summary)
+    return jsonify({'success': True})
+
+@app.route('/api/agents/<name>/jobs/<job_id>/finish', methods=['POST'])
+@agent_required
+def api_agent_finish(name, job_id):
+    """Agent API: record a job's return code or error once the agent is done with it"""
+    job = job_manager.agent_job(name, job_id)
+    if not job:
+        return jsonify({'error': 'Job is not running on this agent'}), 404
+    data = request.get_json(silent=True) or {}
+    return_code = data.get('return_code')
+    if return_code is not None and not isinstance(return_code, int):
+        return jsonify({'error': 'return_code must be an integer'}), 400
+    
+    # Index per-host results before the job is reported finished, as a local run does
+    record_host_results(job, os.path.join(LOGS_DIR, os.path.dirname(job.log_path)))
+    job = job_manager.finish_agent_job(job, return_code=return_code, error=data.get('error'))
+    return jsonify(job.to_dict())
+
+@app.route('/history')
+@login_required
+def history():
+    """Run history page with filters and paging"""
+    try:
+        filters = history_filters(request.args)
+    except ValueError:
+        flash('Dates must use the YYYY-MM-DD format')
+        return redirect(url_for('history'))
+    
+    page = request.args.get('page', 1, type=int)
+    sort = request.args.get('sort', 'newest')
+    runs, total = run_history.query(filters, page=page, per_page=50, sort=sort)
+    for run in runs:
+        for key in ('submitted_at', 'started_at', 'finished_at'):
+            if run[key]:
+                run[key] = datetime.fromtimestamp(run[key]).strftime('%Y-%m-%d %H:%M:%S')
+    
+    return render_template(
+        'pages/history.html',
+        runs=runs,
+        total=total,
+        page=page,
+        pages=max(1, (total + 49) // 50),
+        sort=sort,
+        sort_orders=list(SORT_ORDERS),
+        args=request.args,
+        stats=run_history.stats('target_file', filters, limit=10)
+    )
+
+@app.route('/api/history')
+@login_required
+def api_history():
+    """API endpoint to query run history with filters, sorting and paging"""
+    try:
+        filters = history_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    runs, total = run_history.query(filters, page=page, per_page=per_page, sort=request.args.get('sort', 'newest'))
+    return jsonify({'runs': runs, 'total': total, 'page': page, 'per_page': per_page})
+
+@app.route('/api/history/stats')
+@login_required
+def api_history_stats():
+    """API endpoint for run counts, failure rates and durations grouped by a column"""
+    try:
+        filters = history_filters(request.args)
+        stats = run_history.stats(request.args.get('group_by', 'target_file'), filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'stats': stats})
+
+@app.route('/api/activity')
+@login_required
+def api_activity():
+    """API endpoint to query the audit log by user, action and time range"""
+    try:
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'), end_of_day=True)
+    except ValueError:
+        return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    entries, total = activity_logger.query(
+        user=request.args.get('user'),
+        action=request.args.get('action'),
+        since=since,
+        until=until,
+        page=page,
+        per_page=per_page
+    )
+    return jsonify({'entries': entries, 'total': total, 'page': page, 'per_page': per_page})
+
 @app.route('/logs')
 @login_required
 def logs():
     raw_path = request.args.get('path', '')
     current_path = raw_path.strip('/') if raw_path else ''
-    directories, files = get_log_files(current_path)
+    cursor = request.args.get('cursor')
+    directories, files, next_cursor = get_log_files(current_path, cursor=cursor)
     
     # Calculate parent path - handle forward slashes properly
     parent_path = None
@@ -336,7 +1139,10 @@ def logs():
                                 files=files, 
         current_path=current_path,
         parent_path=parent_path,
-        breadcrumbs=build_breadcrumbs(current_path)
+        cursor=cursor,
+        next_cursor=next_cursor,
+        breadcrumbs=build_breadcrumbs(current_path),
+        task_types=TASK_TYPES
     )
 
 @app.route('/api/log/<path:filename>')
@@ -349,103 +1155,417 @@ def api_log_content(filename):
     if not is_safe_path(os.path.abspath(LOGS_DIR), os.path.abspath(filepath)):
         return jsonify({'error': 'Access denied'}), 403
     
+    # Logs that retention compressed are still found under their original name
+    filepath = resolve_log(filepath)
+    if not os.path.exists(filepath) or not os.path.isfile(filepath):
+        return jsonify({'error': 'File not found'}), 404
+    
+    try:
+        active = is_log_active(filename)
+        etag, last_modified = file_validators(filepath)
+        # A log that is still being written must always be re-read
+        if not active and is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        # Never load more than the tail of a huge log into memory
+        data, size = read_log_tail(filepath, MAX_INLINE_LOG_BYTES)
+        LOG_BYTES_SERVED.inc(len(data), endpoint='api_log_content')
+        return with_validators(jsonify({
+            'content': data.decode('utf-8', errors='replace'),
+            'offset': size,
+            'truncated': size > MAX_INLINE_LOG_BYTES,
+            'active': active
+        }), etag, last_modified)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/logs/lines/<path:filename>')
+@login_required
+def api_log_lines(filename):
+    """API endpoint to get a page of log lines by line range, or from the head or tail"""
+    filepath = os.path.join(LOGS_DIR, filename)
+    
+    # Security check
+    if not is_safe_path(os.path.abspath(LOGS_DIR), os.path.abspath(filepath)):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Logs that retention compressed are still found under their original name
+    filepath = resolve_log(filepath)
     if not os.path.exists(filepath) or not os.path.isfile(filepath):
         return jsonify({'error': 'File not found'}), 404
     
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return jsonify({'content': content})
+        active = is_log_active(filename)
+        etag, last_modified = file_validators(filepath)
+        if not active and is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        start = request.args.get('start', type=int)
+        count = request.args.get('count', 500, type=int)
+        tail = request.args.get('tail', type=int)
+        page = read_log_page(filepath, start=start, count=count, tail=tail)
+        page['active'] = active
+        LOG_BYTES_SERVED.inc(page['end_offset'] - page['start_offset'], endpoint='api_log_lines')
+        return with_validators(jsonify(page), etag, last_modified)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/logs/search')
+@login_required
+def api_log_search():
+    """Search execution logs for words and phrases; each hit links to its line in the log viewer"""
+    task_type = request.args.get('task_type') or None
+    if task_type and task_type not in TASK_TYPES:
+        return jsonify({'error': f'Unknown task type: {task_type}'}), 400
+    try:
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'), end_of_day=True)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    started = time.perf_counter()
+    try:
+        results, next_cursor = log_search.search(
+            request.args.get('q', ''),
+            task_type=task_type,
+            since=since,
+            until=until,
+            limit=request.args.get('limit', 50, type=int),
+            cursor=request.args.get('cursor') or None
+        )
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    for result in results:
+        result['run_at'] = datetime.fromtimestamp(result['run_at']).strftime('%Y-%m-%d %H:%M:%S')
+        result['url'] = url_for('logs', path=os.path.dirname(result['log_path']),
+                                file=result['log_path'], line=result['line'])
+    return jsonify({
+        'results': results,
+        'next_cursor': next_cursor,
+        'took_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+
+@app.route('/api/logs/retention')
+@login_required
+def api_log_retention():
+    """Retention policy and the last pass; ?preview=1 adds what a pass would do now"""
+    result = {'policy': log_retention.policy, 'enabled': log_retention.enabled,
+              'last_pass': log_retention.last_pass()}
+    if request.args.get('preview') == '1':
+        result['preview'] = log_retention.run_pass(dry_run=True)
+        if result['preview'] is None:
+            return jsonify({'error': 'A retention pass is running, try again shortly'}), 409
+    for key in ('last_pass', 'preview'):
+        if result.get(key):
+            result[key]['started_at'] = datetime.fromtimestamp(result[key]['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify(result)
+
+@app.route('/api/logs/raw/<path:filename>')
+@login_required
+def api_log_raw(filename):
+    """Serve the raw log file; supports HTTP Range requests for byte ranges"""
+    filepath = os.path.join(LOGS_DIR, filename)
+    
+    # Security check
+    if not is_safe_path(os.path.abspath(LOGS_DIR), os.path.abspath(filepath)):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Logs that retention compressed are still found under their original name
+    filepath = resolve_log(filepath)
+    if not os.path.exists(filepath) or not os.path.isfile(filepath):
+        return jsonify({'error': 'File not found'}), 404
+    
+    if is_compressed(filepath):
+        return compressed_log_response(filepath)
+    response = send_file(os.path.abspath(filepath), mimetype='text/plain', conditional=True, max_age=0)
+    LOG_BYTES_SERVED.inc(response.content_length or 0, endpoint='api_log_raw')
+    return response
+
+def compressed_log_response(filepath):
+    """
+    A compressed log as plain text: gzip logs go out as stored to clients
+    that accept gzip, anything else is decompressed while it streams.
+    Byte ranges are not supported for compressed logs.
+    """
+    if filepath.endswith('.gz') and request.accept_encodings['gzip']:
+        response = send_file(os.path.abspath(filepath), mimetype='text/plain', conditional=False, max_age=0)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        response.make_conditional(request, accept_ranges=False)
+        LOG_BYTES_SERVED.inc(response.content_length or 0, endpoint='api_log_raw')
+        return response
+    
+    def chunks():
+        for chunk in read_log_chunks(filepath):
+            LOG_BYTES_SERVED.inc(len(chunk), endpoint='api_log_raw')
+            yield chunk
+    
+    return Response(stream_with_context(chunks()), mimetype='text/plain', headers={'Accept-Ranges': 'none'})
+
+@app.route('/api/logs/stream/<path:filename>')
+@login_required
+def api_log_stream(filename):
+    """Stream new log content as Server-Sent Events, resuming from a byte offset"""
+    filepath = os.path.join(LOGS_DIR, filename)
+    
+    # Security check
+    if not is_safe_path(os.path.abspath(LOGS_DIR), os.path.abspath(filepath)):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    filepath = resolve_log(filepath)
+    if not os.path.isfile(filepath) and not is_log_active(filename):
+        return jsonify({'error': 'File not found'}), 404
+    
+    # EventSource sends Last-Event-ID on reconnect; it takes precedence over ?offset
+    offset = request.headers.get('Last-Event-ID') or request.args.get('offset', '0')
+    try:
+        offset = max(0, int(offset))
+    except ValueError:
+        return jsonify({'error': 'Invalid offset'}), 400
+    
+    events = tail_events(filepath, offset, lambda: is_log_active(filename))
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/inventory')
 @login_required
 def inventory():
     """Inventory management page"""
     inventory_files = []
     
-    if os.path.exists(INVENTORY_DIR):
-        for filename in os.listdir(INVENTORY_DIR):
-            if filename.endswith('.ini'):
-                filepath = os.path.join(INVENTORY_DIR, filename)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    inventory_files.append({
-                        'name': filename,
-                        'size': stat.st_size,
-                        'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                    })
+    for entry in directory_cache.entries(INVENTORY_DIR).values():
+        if entry['name'].endswith('.ini'):
+            inventory_files.append({
+                'name': entry['name'],
+                'size': entry['size'],
+                'modified': datetime.fromtimestamp(entry['mtime']).strftime('%Y-%m-%d %H:%M:%S'),
+                'hosts': inventory_cache.host_count(os.path.join(INVENTORY_DIR, entry['name']))
+            })
     
     inventory_files.sort(key=lambda x: x['name'])
     return render_template('pages/inventory.html', inventory_files=inventory_files)
 
-@app.route('/api/inventory/<filename>')
-@login_required
-def api_inventory_content(filename):
-    """API endpoint to get inventory file content"""
+def inventory_file_path(filename, must_exist=True):
+    """Path of an inventory file in INVENTORY_DIR, returning (filepath, error_response)"""
     # Only allow .ini files
     if not filename.endswith('.ini'):
-        return jsonify({'error': 'Invalid file type'}), 400
+        return None, (jsonify({'error': 'Invalid file type'}), 400)
     
     filepath = os.path.join(INVENTORY_DIR, filename)
     
     # Security check
     if not is_safe_path(os.path.abspath(INVENTORY_DIR), os.path.abspath(filepath)):
-        return jsonify({'error': 'Access denied'}), 403
+        return None, (jsonify({'error': 'Access denied'}), 403)
     
-    if not os.path.exists(filepath) or not os.path.isfile(filepath):
-        return jsonify({'error': 'File not found'}), 404
+    if must_exist and (not os.path.exists(filepath) or not os.path.isfile(filepath)):
+        return None, (jsonify({'error': 'File not found'}), 404)
+    return filepath, None
+
+def inventory_validators(filename, filepath):
+    """Content version as ETag, so edits can be checked against the version they started from"""
+    last_modified = datetime.fromtimestamp(int(os.path.getmtime(filepath)), timezone.utc)
+    return inventory_store.version(filename), last_modified
+
+@app.route('/api/inventory/<filename>')
+@login_required
+def api_inventory_content(filename):
+    """API endpoint to get inventory file content and its version"""
+    filepath, error = inventory_file_path(filename)
+    if error:
+        return error
+    
+    try:
+        etag, last_modified = inventory_validators(filename, filepath)
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        content, version = inventory_store.read(filename)
+        return with_validators(jsonify({'content': content, 'version': version}), version, last_modified)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def save_inventory(filename, content=None, hunks=None, base=None):
+    """Save an inventory through the versioned store and build the API response"""
+    # Full saves may create a file; patches need one to apply to
+    filepath, error = inventory_file_path(filename, must_exist=hunks is not None)
+    if error:
+        return error
     
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return jsonify({'content': content})
+        version = inventory_store.save(filename, content=content, hunks=hunks, base=base,
+                                       user=session['username'])
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'version': e.current}), 409
+    except PatchError as e:
+        return jsonify({'error': f'Patch does not apply: {e}'}), 400
     except Exception as e:
+        log_activity(session['username'], "INVENTORY_SAVE_ERROR", f"Error saving {filename}: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    directory_cache.invalidate(INVENTORY_DIR)
+    
+    log_activity(session['username'], "INVENTORY_SAVE", f"Saved inventory file: {filename} (version {version})")
+    result = {'success': True, 'message': 'File saved successfully', 'version': version}
+    # Saving is never blocked, but report problems the parser found
+    try:
+        result['hosts'] = inventory_cache.get(filepath).host_count
+    except InventoryError as e:
+        result['warning'] = f'Inventory does not parse: {e}'
+    response = jsonify(result)
+    response.set_etag(version)
+    return response
+
+def base_version(data):
+    """Version an edit is based on, from the JSON body or an If-Match header"""
+    if data.get('version'):
+        return data['version']
+    tags = request.if_match.as_set()
+    return next(iter(tags)) if tags else None
 
 @app.route('/api/inventory/<filename>', methods=['POST'])
 @login_required
 def api_inventory_save(filename):
-    """API endpoint to save inventory file content"""
-    # Only allow .ini files
+    """API endpoint to save inventory file content, optionally checked against its version"""
+    data = request.get_json(silent=True) or {}
+    content = data.get('content', '')
+    if not isinstance(content, str):
+        return jsonify({'error': 'content must be a string'}), 400
+    return save_inventory(filename, content=content, base=base_version(data))
+
+@app.route('/api/inventory/<filename>', methods=['PATCH'])
+@login_required
+def api_inventory_patch(filename):
+    """API endpoint to apply line hunks to the version of an inventory file they were made against"""
+    data = request.get_json(silent=True) or {}
+    base = base_version(data)
+    if not base:
+        return jsonify({'error': 'A base version is required, as "version" or If-Match'}), 428
+    return save_inventory(filename, hunks=data.get('hunks'), base=base)
+
+@app.route('/api/inventory/<filename>/versions')
+@login_required
+def api_inventory_versions(filename):
+    """API endpoint listing the saved versions of an inventory file"""
+    filepath, error = inventory_file_path(filename)
+    if error:
+        return error
+    versions = inventory_store.versions(filename, limit=request.args.get('limit', type=int))
+    for version in versions:
+        version['saved_at'] = datetime.fromtimestamp(version['saved_at']).strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify({'filename': filename, 'current': inventory_store.version(filename), 'versions': versions})
+
+@app.route('/api/inventory/<filename>/versions/<version>')
+@login_required
+def api_inventory_version(filename, version):
+    """API endpoint with the content of one saved version of an inventory file"""
+    filepath, error = inventory_file_path(filename)
+    if error:
+        return error
+    content = inventory_store.content(filename, version)
+    if content is None:
+        return jsonify({'error': 'Version not found'}), 404
+    return jsonify({'filename': filename, 'version': version, 'content': content})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; needs the metrics token if one is configured, otherwise a login"""
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    elif 'logged_in' not in session:
+        return redirect(url_for('login'))
+    
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def load_inventory(filename):
+    """Parse an inventory file, returning (inventory, error_response)"""
     if not filename.endswith('.ini'):
-        return jsonify({'error': 'Invalid file type'}), 400
+        return None, (jsonify({'error': 'Invalid file type'}), 400)
     
     filepath = os.path.join(INVENTORY_DIR, filename)
     
     # Security check
     if not is_safe_path(os.path.abspath(INVENTORY_DIR), os.path.abspath(filepath)):
-        return jsonify({'error': 'Access denied'}), 403
+        return None, (jsonify({'error': 'Access denied'}), 403)
+    
+    if not os.path.isfile(filepath):
+        return None, (jsonify({'error': 'File not found'}), 404)
     
     try:
-        data = request.get_json()
-        content = data.get('content', '')
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        log_activity(session['username'], "INVENTORY_SAVE", f"Saved inventory file: {filename}")
-        return jsonify({'success': True, 'message': 'File saved successfully'})
-    except Exception as e:
-        log_activity(session['username'], "INVENTORY_SAVE_ERROR", f"Error saving {filename}: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return inventory_cache.get(filepath), None
+    except InventoryError as e:
+        return None, (jsonify({'error': f'Invalid inventory: {e}', 'line': e.line}), 422)
+    except OSError as e:
+        return None, (jsonify({'error': str(e)}), 500)
 
-if __name__ == '__main__':
+@app.route('/api/inventory/<filename>/hosts')
+@login_required
+def api_inventory_hosts(filename):
+    """API endpoint to list the hosts of an inventory, optionally within one group"""
+    inventory, error = load_inventory(filename)
+    if error:
+        return error
+    
+    group = request.args.get('group')
+    if group:
+        if group not in inventory.groups:
+            return jsonify({'error': f'Unknown group: {group}'}), 404
+        names = inventory.group_hosts(group)
+    else:
+        names = sorted(inventory.hosts)
+    
+    return jsonify({'hosts': [inventory.host_dict(name) for name in names], 'count': len(names)})
+
+@app.route('/api/inventory/<filename>/groups')
+@login_required
+def api_inventory_groups(filename):
+    """API endpoint to list the groups of an inventory with host counts"""
+    inventory, error = load_inventory(filename)
+    if error:
+        return error
+    
+    groups = [inventory.group_dict(name) for name in sorted(inventory.groups)]
+    return jsonify({'groups': groups, 'host_count': inventory.host_count})
+
+@app.route('/api/inventory/<filename>/groups/<group>')
+@login_required
+def api_inventory_group(filename, group):
+    """API endpoint to get one group with all of its hosts"""
+    inventory, error = load_inventory(filename)
+    if error:
+        return error
+    
+    if group not in inventory.groups:
+        return jsonify({'error': f'Unknown group: {group}'}), 404
+    return jsonify(inventory.group_dict(group, with_hosts=True))
+
+def prepare_server(host=HOST, port=PORT):
+    """Print the settings and create missing directories before serving"""
     print("Starting Automation Dashboard...")
-    print(f"Server will run on http{'s' if USE_HTTPS else ''}://{HOST}:{PORT}")
+    print(f"Server will run on http{'s' if USE_HTTPS else ''}://{host}:{port}")
     print(f"Login with configured users")
     print(f"Playbooks directory: {PLAYBOOKS_DIR}")
     print(f"Inventory directory: {INVENTORY_DIR}")
     print(f"Logs directory: {LOGS_DIR}")
+    print(f"Data directory: {DATA_DIR}")
     
     # Create directories if they don't exist
-    for directory in [PLAYBOOKS_DIR, INVENTORY_DIR, LOGS_DIR]:
+    for directory in [PLAYBOOKS_DIR, INVENTORY_DIR, LOGS_DIR, DATA_DIR]:
         if not os.path.exists(directory):
             os.makedirs(directory)
             print(f"Created directory: {directory}")
+
+if __name__ == '__main__':
+    prepare_server()
+    
+    # Resume queued jobs, finish those left running by a stopped server and start the scheduler
+    start_background_workers()
     
-    # SSL context for HTTPS
-    ssl_context = 'adhoc' if USE_HTTPS else None
+    # SSL context for HTTPS: configured certificate files, else a throwaway self-signed one
+    ssl_context = None
+    if USE_HTTPS:
+        ssl_context = (SSL_CERT, SSL_KEY) if SSL_CERT and SSL_KEY else 'adhoc'
     
     app.run(host=HOST, port=PORT, debug=DEBUG, ssl_context=ssl_context)
\ No newline at end of file
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted, precompressed static assets
+Each file under static/ is served from a URL containing a hash of its
+content, so browsers can cache it forever. Hashes and gzip (and brotli, when
+the brotli module is installed) encodings are computed once per file version
+and kept in memory; a file is reprocessed only when its mtime changes.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HASH_LENGTH = 12
+
+# css/dashboard.3f2a1b9c0d12.css -> (css/dashboard, 3f2a1b9c0d12, .css)
+HASHED_NAME = re.compile(r'^(.*)\.([0-9a-f]{%d})(\.[A-Za-z0-9]+)$' % HASH_LENGTH)
+
+# Encodings are only kept when they save at least this fraction
+MIN_SAVING = 0.1
+
+
+class Asset:
+    """One version of a static file with its hash and encoded bodies"""
+
+    def __init__(self, path, mtime_ns, data):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.bodies = {'identity': data}
+
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data) * (1 - MIN_SAVING):
+            self.bodies['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data) * (1 - MIN_SAVING):
+                self.bodies['br'] = compressed
+
+    @property
+    def hashed_path(self):
+        base, ext = os.path.splitext(self.path)
+        return f"{base}.{self.digest}{ext}"
+
+    def body_for(self, accept_encodings):
+        """Pick the smallest encoding the client accepts; returns (encoding, bytes)"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and encoding in accept_encodings:
+                return encoding, self.bodies[encoding]
+        return 'identity', self.bodies['identity']
+
+
+class AssetCache:
+    """In-memory assets of static_dir, rebuilt per file when its mtime changes"""
+
+    def __init__(self, static_dir):
+        self.static_dir = os.path.abspath(static_dir)
+        self._lock = threading.Lock()
+        self._assets = {}
+
+    def get(self, path):
+        """Return the Asset for a file relative to static_dir, or None if missing, not a file or outside it"""
+        full = os.path.abspath(os.path.join(self.static_dir, path))
+        if os.path.commonpath([self.static_dir, full]) != self.static_dir:
+            return None
+        try:
+            st = os.stat(full)
+        except OSError:
+            return None
+        # Directories such as css/ are not assets
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset and asset.mtime_ns == st.st_mtime_ns:
+                return asset
+
+        with open(full, 'rb') as f:
+            asset = Asset(path, st.st_mtime_ns, f.read())
+        with self._lock:
+            self._assets[path] = asset
+        return asset
+
+    def url_path(self, path):
+        """Fingerprinted path for use in URLs; the plain path if the file is missing"""
+        asset = self.get(path)
+        return asset.hashed_path if asset else path
+
+    def resolve(self, hashed_path):
+        """Map a fingerprinted path back to (asset, hash_matches)"""
+        match = HASHED_NAME.match(hashed_path)
+        if match:
+            asset = self.get(match.group(1) + match.group(3))
+            if asset:
+                return asset, asset.digest == match.group(2)
+        return self.get(hashed_path), False
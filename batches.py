@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Batch submissions
+Expands a batch request, either a matrix of targets x inventories or an
+explicit list of jobs with dependencies, into entries ordered so every job
+comes after the jobs it depends on, and summarizes a batch's progress from
+the state of its jobs.
+"""
+
+OPTION_KEYS = ('task_type', 'forks', 'shards', 'verbose')
+MAX_BATCH_JOBS = 200
+
+# Batch job states, beyond the job manager's own
+WAITING = 'waiting'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+
+
+class BatchError(ValueError):
+    """An invalid batch request"""
+
+
+def check_string(value, what, optional=False):
+    """Return value if it is a string (or None when optional); raises BatchError otherwise"""
+    if (value is None and optional) or isinstance(value, str):
+        return value
+    raise BatchError(f'{what} must be a string')
+
+
+def check_id(value, what):
+    """Job ids and dependencies may be strings or integers; returns the id as a string"""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise BatchError(f'{what} must be a string or an integer')
+    return str(value)
+
+
+def options_for(entry, defaults):
+    """Entry options with the batch-level defaults filled in"""
+    options = {key: entry.get(key, defaults.get(key)) for key in OPTION_KEYS}
+    check_string(options['task_type'], 'task_type', optional=True)
+    for key in ('forks', 'shards'):
+        if isinstance(options[key], bool) or not isinstance(options[key], (str, int, type(None))):
+            raise BatchError(f'{key} must be a number or a string')
+    options['forks'] = str(options['forks'] or '1').strip().lower()
+    options['shards'] = str(options['shards'] or '1').strip().lower()
+    options['verbose'] = bool(options['verbose'])
+    return options
+
+
+def expand_matrix(spec):
+    """One entry per target x inventory; with serial set, each waits for the one before it"""
+    matrix = spec['matrix']
+    targets = matrix.get('targets') or []
+    inventories = matrix.get('inventories') or []
+    if not isinstance(targets, list) or not isinstance(inventories, list) or not targets or not inventories:
+        raise BatchError('matrix needs non-empty targets and inventories lists')
+    for value in targets:
+        check_string(value, 'Each matrix target')
+    for value in inventories:
+        check_string(value, 'Each matrix inventory')
+    entries = []
+    for target in targets:
+        for inventory in inventories:
+            entry = dict(options_for(spec, spec), key=f"{target}@{inventory}", target_file=target,
+                         inventory=inventory, depends_on=[])
+            if spec.get('serial') and entries:
+                entry['depends_on'] = [entries[-1]['key']]
+            entries.append(entry)
+    return entries
+
+
+def expand_jobs(spec):
+    """Entries from an explicit job list; ids default to their position"""
+    jobs = spec['jobs']
+    if not isinstance(jobs, list) or not jobs:
+        raise BatchError('jobs must be a non-empty list')
+    entries = []
+    for position, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise BatchError(f'Job {position} must be an object')
+        key = check_id(job.get('id', position), f'Job {position}: id')
+        depends_on = job.get('depends_on')
+        if depends_on is None:
+            depends_on = []
+        elif not isinstance(depends_on, list):
+            depends_on = [depends_on]
+        entries.append(dict(options_for(job, spec), key=key,
+                            target_file=check_string(job.get('target_file'), f'Job {key}: target_file', optional=True),
+                            inventory=check_string(job.get('inventory'), f'Job {key}: inventory', optional=True),
+                            depends_on=[check_id(d, f'Job {key}: depends_on') for d in depends_on]))
+    return entries
+
+
+def order_entries(entries):
+    """Sort entries so dependencies come first; raises BatchError on unknown ids or cycles"""
+    by_key = {}
+    for entry in entries:
+        if entry['key'] in by_key:
+            raise BatchError(f"Duplicate job id: {entry['key']}")
+        by_key[entry['key']] = entry
+    for entry in entries:
+        for parent in entry['depends_on']:
+            if parent not in by_key:
+                raise BatchError(f"Job {entry['key']} depends on unknown job {parent}")
+
+    ordered, done, visiting = [], set(), set()
+
+    def visit(entry):
+        if entry['key'] in done:
+            return
+        if entry['key'] in visiting:
+            raise BatchError(f"Dependency cycle through job {entry['key']}")
+        visiting.add(entry['key'])
+        for parent in entry['depends_on']:
+            visit(by_key[parent])
+        visiting.discard(entry['key'])
+        done.add(entry['key'])
+        ordered.append(entry)
+
+    for entry in entries:
+        visit(entry)
+    return ordered
+
+
+def expand_batch(spec):
+    """Validate a batch request and return its entries in dependency order"""
+    if not isinstance(spec, dict):
+        raise BatchError('Expected a JSON object')
+    if ('matrix' in spec) == ('jobs' in spec):
+        raise BatchError("Give either 'matrix' or 'jobs'")
+    check_string(spec.get('name'), 'name', optional=True)
+    if 'matrix' in spec and not isinstance(spec['matrix'], dict):
+        raise BatchError('matrix must be an object')
+    entries = expand_matrix(spec) if 'matrix' in spec else expand_jobs(spec)
+    if len(entries) > MAX_BATCH_JOBS:
+        raise BatchError(f'A batch can hold at most {MAX_BATCH_JOBS} jobs')
+    return order_entries(entries)
+
+
+def job_state(job, jobs_by_id):
+    """Batch-level state of one job: waiting, queued, running, succeeded, failed, skipped or cancelled"""
+    if job.status == 'finished':
+        if job.succeeded:
+            return SUCCEEDED
+        if job.cancelled_by:
+            return CANCELLED
+        if job.error and job.error.startswith('Skipped'):
+            return SKIPPED
+        return FAILED
+    if job.status == 'queued':
+        parents = [jobs_by_id.get(parent) for parent in job.depends_on]
+        if any(parent is not None and not parent.succeeded for parent in parents):
+            return WAITING
+    return job.status
+
+
+def summarize_batch(batch, jobs):
+    """Aggregate status, per-state counts and progress of a batch"""
+    jobs_by_id = {job.id: job for job in jobs}
+    states = [job_state(job, jobs_by_id) for job in jobs]
+    counts = {}
+    for state in states:
+        counts[state] = counts.get(state, 0) + 1
+    finished = sum(counts.get(state, 0) for state in (SUCCEEDED, FAILED, SKIPPED, CANCELLED))
+
+    if finished < len(jobs):
+        status = 'running' if counts.get('running') or finished else 'queued'
+    elif counts.get(SUCCEEDED, 0) == len(jobs):
+        status = SUCCEEDED
+    elif counts.get(CANCELLED):
+        status = CANCELLED
+    else:
+        status = FAILED
+
+    job_dicts = []
+    for job, state in zip(jobs, states):
+        entry = job.to_dict()
+        entry['state'] = state
+        job_dicts.append(entry)
+
+    return dict(batch, status=status, total=len(jobs), finished=finished, counts=counts,
+                progress=round(finished / len(jobs), 3) if jobs else 1.0, jobs=job_dicts)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for copying child process output into an execution log
+Compares the original line-by-line text loop of the wrapper scripts with
+runner.OutputPump and prints lines/sec and the CPU time spent in the copying
+process for each as JSON.
+
+Usage: python3 benchmarks/bench_output_pump.py [--lines N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from runner import OutputPump  # noqa: E402
+
+# A chatty child resembling ansible-playbook -vvv output. The output is built
+# up front and written in pipe-sized blocks so the child is never the bottleneck.
+CHILD = (
+    "import sys\n"
+    "line = 'ok: [host-%05d] => {\"changed\": false, \"ping\": \"pong\", \"invocation\": {\"module_args\": {}}}\\n'\n"
+    "data = ''.join(line % (i % 500) for i in range(int(sys.argv[1]))).encode()\n"
+    "out = sys.stdout.buffer\n"
+    "for i in range(0, len(data), 65536):\n"
+    "    out.write(data[i:i + 65536])\n"
+)
+
+
+def spawn(lines, text):
+    return subprocess.Popen([sys.executable, '-c', CHILD, str(lines)],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=text)
+
+
+def run_line_loop(lines, log_path):
+    """The copy loop the wrappers used before the pump"""
+    with open(os.devnull, 'w') as echo, open(log_path, 'w') as f:
+        process = spawn(lines, text=True)
+        for line in process.stdout:
+            echo.write(line)
+            f.write(line)
+        process.wait()
+
+
+def run_pump(lines, log_path, timestamps=False):
+    with open(os.devnull, 'wb') as echo, open(log_path, 'wb') as f:
+        process = spawn(lines, text=False)
+        OutputPump([f, echo], timestamps=timestamps).run(process.stdout.fileno())
+        process.stdout.close()
+        process.wait()
+
+
+def measure(fn, lines, repeat):
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'execution.log')
+        for _ in range(repeat):
+            start, cpu_start = time.perf_counter(), time.process_time()
+            fn(lines, log_path)
+            elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            if best is None or elapsed < best[0]:
+                best = (elapsed, cpu)
+    return {'seconds': round(best[0], 4), 'copy_cpu_seconds': round(best[1], 4), 'lines_per_sec': int(lines / best[0])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark log output copying')
+    parser.add_argument('--lines', type=int, default=500000, help='Lines written by the child process')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per variant; the best is reported')
+    args = parser.parse_args()
+
+    # Baseline: the child alone writing into a pipe that is drained without copying
+    def child_only(lines, log_path):
+        process = spawn(lines, text=False)
+        while os.read(process.stdout.fileno(), 1 << 16):
+            pass
+        process.stdout.close()
+        process.wait()
+
+    results = {
+        'lines': args.lines,
+        'child_only': measure(child_only, args.lines, args.repeat),
+        'line_loop': measure(run_line_loop, args.lines, args.repeat),
+        'pump': measure(run_pump, args.lines, args.repeat),
+        'pump_timestamps': measure(lambda n, p: run_pump(n, p, timestamps=True), args.lines, args.repeat)
+    }
+    results['speedup'] = round(results['pump']['lines_per_sec'] / results['line_loop']['lines_per_sec'], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
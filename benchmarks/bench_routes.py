@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Load test for the dashboard's hot paths
+Builds a synthetic workspace (see fixtures.py), then drives the app in-process
+through Flask's test client from several threads and reports latency
+percentiles and throughput per route, plus end-to-end job throughput through
+/execute_task with stub ansible-playbook/pwsh commands on PATH. Runs offline
+and prints JSON; --compare flags regressions against an earlier result.
+
+Usage: python3 benchmarks/bench_routes.py [--runs N] [--big-log-mb N] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import BIG_LOG, BENCH_USER, BENCH_PASSWORD, build_workspace  # noqa: E402
+
+# Metrics compared by --compare and whether a higher value is better
+COMPARED_METRICS = {'p50_ms': False, 'p95_ms': False, 'requests_per_sec': True, 'jobs_per_sec': True}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'mean_ms': round(statistics.mean(values) * 1000, 3) if values else None,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3) if values else None,
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3) if values else None,
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3) if values else None,
+        'requests_per_sec': round(len(values) / elapsed, 1) if elapsed else None
+    }
+
+
+class Clients:
+    """One logged-in test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def get(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self.app.test_client()
+            client.post('/login', data={'username': BENCH_USER, 'password': BENCH_PASSWORD})
+            self._local.client = client
+        return client
+
+
+def bench_route(clients, path, requests, threads):
+    """Time one cold request, then `requests` requests spread over `threads` threads"""
+    start = time.perf_counter()
+    cold = clients.get().get(path)
+    cold_ms = round((time.perf_counter() - start) * 1000, 3)
+    if cold.status_code != 200:
+        raise RuntimeError(f"{path} returned {cold.status_code}")
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        t = time.perf_counter()
+        response = clients.get().get(path)
+        response.get_data()
+        elapsed = time.perf_counter() - t
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code not in (200, 304):
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests)))
+    result = summarize(latencies, time.perf_counter() - start, errors)
+    result['cold_ms'] = cold_ms
+    return result
+
+
+def bench_jobs(app_module, clients, jobs, timeout=300):
+    """Submit jobs through /execute_task and wait for the worker pool to drain them"""
+    kinds = [
+        ('ansible', 'bench.yml', 'small.ini'),
+        ('powershell', 'bench.ps1', 'small.ini'),
+        ('shell', 'bench.sh', 'small.ini')
+    ]
+    client = clients.get()
+    submit_latencies = []
+    start = time.perf_counter()
+    for i in range(jobs):
+        task_type, target, inventory = kinds[i % len(kinds)]
+        t = time.perf_counter()
+        client.post('/execute_task', data={'task_type': task_type, 'target_file': target,
+                                           'inventory': inventory, 'forks': '1', 'force': 'true'})
+        submit_latencies.append(time.perf_counter() - t)
+
+    manager = app_module.job_manager
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        counts = manager.counts()
+        if not counts.get('queued') and not counts.get('running'):
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    finished = manager.list_jobs('finished')
+    failed = [job for job in finished if job.return_code != 0 or job.error]
+    waits = sorted(job.started_at - job.submitted_at for job in finished if job.started_at)
+    durations = sorted(job.duration for job in finished if job.duration is not None)
+    result = summarize(submit_latencies, elapsed, len(failed))
+    result.update({
+        'jobs': jobs,
+        'finished': len(finished),
+        'jobs_per_sec': round(len(finished) / elapsed, 2) if elapsed else None,
+        'queue_wait_p50_ms': round(percentile(waits, 0.5) * 1000, 3) if waits else None,
+        'run_p50_ms': round(percentile(durations, 0.5) * 1000, 3) if durations else None
+    })
+
+    # Leave the workspace as it was so the next run sees the same tree
+    for job in finished:
+        shutil.rmtree(os.path.join('logs', os.path.dirname(job.log_path)), ignore_errors=True)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Return a list of metrics that regressed by more than threshold (a fraction)"""
+    regressions = []
+    for section in ('routes', 'jobs'):
+        current = results.get(section, {})
+        previous = baseline.get(section, {})
+        if section == 'jobs':
+            current, previous = {'execute_task': current}, {'execute_task': previous}
+        for name, metrics in current.items():
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                new, old = metrics.get(metric), previous.get(name, {}).get(metric)
+                if not new or not old:
+                    continue
+                change = (old - new) / old if higher_is_better else (new - old) / old
+                if change > threshold:
+                    regressions.append({'name': name, 'metric': metric, 'baseline': old,
+                                        'current': new, 'change': f"{change:+.0%}"})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dashboard routes and job execution')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'simpleautomatica-bench'),
+                        help='Workspace directory, reused while the fixture parameters match')
+    parser.add_argument('--runs', type=int, default=10000, help='Run directories in the synthetic logs tree')
+    parser.add_argument('--big-log-mb', type=int, default=256, help='Size of the large execution log')
+    parser.add_argument('--hosts', type=int, default=5000, help='Hosts in the large inventory')
+    parser.add_argument('--groups', type=int, default=50, help='Groups in the large inventory')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent client threads')
+    parser.add_argument('--jobs', type=int, default=60, help='Jobs submitted through /execute_task')
+    parser.add_argument('--max-jobs', type=int, default=4, help='max_concurrent_jobs for the job pool')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--compare', help='Earlier results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Regression threshold for --compare')
+    args = parser.parse_args()
+
+    manifest = build_workspace(args.workdir, runs=args.runs, big_log_mb=args.big_log_mb,
+                               hosts=args.hosts, groups=args.groups, max_jobs=args.max_jobs)
+
+    # Every run starts from cold catalogs and an empty history
+    shutil.rmtree(os.path.join(args.workdir, 'data'), ignore_errors=True)
+    os.chdir(args.workdir)
+    os.environ['PATH'] = os.path.join(args.workdir, 'bin') + os.pathsep + os.environ.get('PATH', '')
+
+    import app as app_module
+    clients = Clients(app_module.app)
+
+    big_log = BIG_LOG
+    first_run = sorted(name for name in os.listdir('logs') if name != os.path.dirname(BIG_LOG))[0]
+    _, _, second_page = app_module.get_log_files('', None)
+
+    routes = {
+        'dashboard': '/dashboard',
+        'logs_root': '/logs',
+        'logs_root_page2': f'/logs?cursor={quote(second_page)}' if second_page else '/logs',
+        'logs_run_dir': f'/logs?path={first_run}',
+        'api_log_small': f'/api/log/{first_run}/execution.log',
+        'api_log_big': f'/api/log/{big_log}',
+        'api_log_lines_tail': f'/api/logs/lines/{big_log}?tail=500',
+        'api_log_lines_middle': f'/api/logs/lines/{big_log}?start={args.big_log_mb * 9000}&count=500',
+        'api_inventory_content': '/api/inventory/large.ini',
+        'api_inventory_hosts': '/api/inventory/large.ini/hosts',
+        'api_inventory_groups': '/api/inventory/large.ini/groups',
+        'inventory_page': '/inventory'
+    }
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'requests': args.requests,
+            'threads': args.threads
+        },
+        'fixture': manifest,
+        'routes': {}
+    }
+    for name, path in routes.items():
+        results['routes'][name] = bench_route(clients, path, args.requests, args.threads)
+    results['jobs'] = bench_jobs(app_module, clients, args.jobs)
+
+    if args.compare:
+        with open(args.compare) as f:
+            results['regressions'] = compare(results, json.load(f), args.threshold)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
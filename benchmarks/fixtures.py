@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Synthetic workspace for the benchmarks
+Builds a logs/ tree with many run directories and one very large log, a
+large inventory, small playbooks and stub ansible-playbook/pwsh commands,
+so the app can be benchmarked offline. A workspace is reused as long as it
+was built with the same parameters.
+"""
+
+import json
+import os
+import shutil
+import stat
+import time
+from datetime import datetime
+
+MANIFEST = 'fixture.json'
+BIG_LOG = 'big_run/execution.log'
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench'
+
+# Stub commands: a few lines of output and a recap, without touching any host
+STUB_ANSIBLE = """#!/bin/sh
+echo "PLAY [all] ***"
+echo "TASK [Gathering Facts] ***"
+echo "ok: [localhost]"
+echo ""
+echo "PLAY RECAP ***"
+echo "localhost : ok=1 changed=0 unreachable=0 failed=0 skipped=0 rescued=0 ignored=0"
+"""
+
+STUB_PWSH = """#!/bin/sh
+echo "Running $2"
+echo "Done."
+"""
+
+SHELL_SCRIPT = """#!/bin/bash
+echo "Running against $1"
+echo "Done."
+"""
+
+LOG_LINE = 'ok: [host-{:05d}] => {{"changed": false, "ping": "pong"}}\n'
+
+
+def write_executable(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def build_logs(logs_dir, runs, big_log_mb):
+    """Create run directories spread over the last 30 days plus one large log"""
+    now = time.time()
+    spacing = 30 * 86400 / max(runs, 1)
+    body = ''.join(LOG_LINE.format(i) for i in range(20))
+    for i in range(runs):
+        mtime = now - i * spacing
+        stamp = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d_%H-%M-%S')
+        run_dir = os.path.join(logs_dir, f"{stamp}_{i:06d}_ansible")
+        os.makedirs(run_dir, exist_ok=True)
+        log_path = os.path.join(run_dir, 'execution.log')
+        with open(log_path, 'w') as f:
+            f.write(f"Execution started at {stamp}\n\n{body}")
+        os.utime(log_path, (mtime, mtime))
+        os.utime(run_dir, (mtime, mtime))
+
+    big_path = os.path.join(logs_dir, BIG_LOG)
+    os.makedirs(os.path.dirname(big_path), exist_ok=True)
+    block = ''.join(LOG_LINE.format(i % 100000) for i in range(16384)).encode()
+    remaining = big_log_mb * 1024 * 1024
+    with open(big_path, 'wb') as f:
+        while remaining > 0:
+            chunk = block[:remaining]
+            f.write(chunk)
+            remaining -= len(chunk)
+
+
+def build_inventory(inventory_dir, hosts, groups):
+    """One large inventory with hosts spread over groups, and a small one"""
+    lines = []
+    for g in range(groups):
+        lines.append(f"[group{g:03d}]")
+        for h in range(g, hosts, groups):
+            lines.append(f"host-{h:05d}.example.com ansible_host=10.{h // 65536 % 256}.{h // 256 % 256}.{h % 256}")
+        lines.append('')
+    lines.append('[everything:children]')
+    lines.extend(f"group{g:03d}" for g in range(groups))
+    lines.append('')
+    lines.append('[all:vars]')
+    lines.append('ansible_python_interpreter=/usr/bin/python3')
+    with open(os.path.join(inventory_dir, 'large.ini'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    with open(os.path.join(inventory_dir, 'small.ini'), 'w') as f:
+        f.write('[local]\nlocalhost ansible_connection=local\n')
+
+
+def build_workspace(workdir, runs=10000, big_log_mb=256, hosts=5000, groups=50, max_jobs=4):
+    """Create (or reuse) a workspace and return its manifest"""
+    params = {'runs': runs, 'big_log_mb': big_log_mb, 'hosts': hosts, 'groups': groups, 'max_jobs': max_jobs}
+    manifest_path = os.path.join(workdir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('params') == params:
+            return manifest
+        shutil.rmtree(workdir)
+
+    start = time.perf_counter()
+    for name in ('logs', 'playbooks', 'inventory', 'bin'):
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+
+    build_logs(os.path.join(workdir, 'logs'), runs, big_log_mb)
+    build_inventory(os.path.join(workdir, 'inventory'), hosts, groups)
+
+    with open(os.path.join(workdir, 'playbooks', 'bench.yml'), 'w') as f:
+        f.write('- hosts: all\n  gather_facts: false\n  tasks:\n    - ping:\n')
+    with open(os.path.join(workdir, 'playbooks', 'bench.ps1'), 'w') as f:
+        f.write('Write-Output "bench"\n')
+    write_executable(os.path.join(workdir, 'playbooks', 'bench.sh'), SHELL_SCRIPT)
+    write_executable(os.path.join(workdir, 'bin', 'ansible-playbook'), STUB_ANSIBLE)
+    write_executable(os.path.join(workdir, 'bin', 'pwsh'), STUB_PWSH)
+
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump({
+            'secret_key': 'benchmark',
+            'users': {BENCH_USER: BENCH_PASSWORD},
+            'max_concurrent_jobs': max_jobs,
+            'max_concurrent_per_type': {}
+        }, f, indent=4)
+
+    manifest = {'params': params, 'build_seconds': round(time.perf_counter() - start, 2)}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
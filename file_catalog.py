@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Cached listings of the playbook and inventory directories
+A directory is only rescanned when its mtime changes (a file was added,
+removed or replaced) or when the app invalidates it after writing a file.
+"""
+
+import os
+import threading
+
+from metrics import timed
+
+
+class DirectoryCache:
+    """File listings with size and mtime, rebuilt once per directory change"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def entries(self, directory):
+        """Return {name: {'name', 'size', 'mtime'}} for the regular files in directory"""
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return {}
+
+        with self._lock:
+            cached = self._entries.get(directory)
+            if cached and cached[0] == dir_mtime:
+                return cached[1]
+
+        listing = {}
+        try:
+            with timed('directory_scan'):
+                for entry in os.scandir(directory):
+                    if entry.is_file():
+                        st = entry.stat()
+                        listing[entry.name] = {'name': entry.name, 'size': st.st_size, 'mtime': st.st_mtime}
+        except OSError:
+            return {}
+
+        with self._lock:
+            self._entries[directory] = (dir_mtime, listing)
+        return listing
+
+    def files(self, directory, extension):
+        """Sorted names of files in directory with the given extension"""
+        suffix = f'.{extension}'
+        return sorted(name for name in self.entries(directory) if name.endswith(suffix))
+
+    def invalidate(self, directory):
+        """Drop a cached listing, e.g. after the app rewrote a file in place"""
+        with self._lock:
+            self._entries.pop(directory, None)
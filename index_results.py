@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Backfill per-host results for existing runs
+Parses the execution.log of every run directory that has no summary.json
+yet, writes the summary next to it and indexes the hosts into the run
+history database so the dashboard and API can show their outcomes.
+
+Usage: python3 index_results.py [--logs-dir ./logs] [--data-dir ./data] [--force]
+"""
+
+import argparse
+import os
+import sys
+
+from ansible_output import summarize_log
+from log_reader import log_variants, open_log, resolve_log
+from run_history import RunHistory
+from runner import SUMMARY_FILE, load_summary, write_summary
+
+JOB_LINE_PREFIX = 'Job: '
+
+
+def job_id_of(log_file):
+    """Job id from the first line the runner writes, if the log has one"""
+    with open_log(log_file) as f:
+        first = f.read(4096).split(b'\n', 1)[0].decode('utf-8', errors='replace').strip()
+    return first[len(JOB_LINE_PREFIX):] if first.startswith(JOB_LINE_PREFIX) else None
+
+
+def find_runs(logs_dir):
+    """Yield (run_dir, log_path relative to logs_dir) for every execution.log, compressed or not"""
+    for root, dirs, files in os.walk(logs_dir):
+        dirs.sort()
+        if any(name in files for name in log_variants('execution.log')):
+            run_dir = os.path.relpath(root, logs_dir)
+            yield root, os.path.join(run_dir, 'execution.log').replace(os.sep, '/')
+
+
+def backfill(logs_dir, history, force=False, verbose=False):
+    """Summarize and index runs; returns (indexed, skipped) counts"""
+    indexed_paths = set() if force else history.indexed_log_paths()
+    indexed = skipped = 0
+    for run_dir, log_path in find_runs(logs_dir):
+        if log_path in indexed_paths:
+            skipped += 1
+            continue
+        summary = None if force else load_summary(run_dir)
+        if summary is None:
+            try:
+                summary = summarize_log(resolve_log(os.path.join(run_dir, 'execution.log')))
+            except OSError as e:
+                print(f"Skipping {log_path}: {e}", file=sys.stderr)
+                continue
+            # Only Ansible output has per-host results; leave other runs alone
+            if not summary['hosts']:
+                skipped += 1
+                continue
+            write_summary(run_dir, summary)
+        if summary['hosts']:
+            history.record_hosts(log_path, summary,
+                                 job_id=job_id_of(resolve_log(os.path.join(run_dir, 'execution.log'))))
+            indexed += 1
+            if verbose:
+                totals = summary['totals']
+                print(f"{log_path}: {totals['hosts']} hosts, {totals['failed_hosts']} failed, "
+                      f"{totals['unreachable_hosts']} unreachable")
+    return indexed, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index per-host results of existing runs')
+    parser.add_argument('--logs-dir', default='./logs', help='Logs directory (default: ./logs)')
+    parser.add_argument('--data-dir', default='./data', help='Data directory holding history.db (default: ./data)')
+    parser.add_argument('--force', action='store_true', help=f'Re-parse logs even if {SUMMARY_FILE} exists')
+    parser.add_argument('--verbose', action='store_true', help='Print a line per indexed run')
+    args = parser.parse_args()
+
+    history = RunHistory(os.path.join(args.data_dir, 'history.db'))
+    indexed, skipped = backfill(args.logs_dir, history, force=args.force, verbose=args.verbose)
+    print(f"Indexed {indexed} runs, skipped {skipped}")
+
+
+if __name__ == '__main__':
+    main()
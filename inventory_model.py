@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Parsed model of Ansible INI inventories
+Builds hosts, groups, :children and :vars from an inventory file so the app
+can list hosts, count them and validate a selection without running
+ansible-inventory. Parsed models are cached per file and rebuilt only when
+the file is replaced or its mtime or size changes.
+"""
+
+import os
+import re
+import shlex
+import string
+import threading
+
+from metrics import timed
+
+# Matches one host range such as [01:50], [a:f] or [1:10:2]
+HOST_RANGE = re.compile(r'\[([0-9a-zA-Z]+):([0-9a-zA-Z]+)(?::([0-9]+))?\]')
+MAX_CACHED_INVENTORIES = 256
+
+
+class InventoryError(ValueError):
+    """Raised when an inventory file cannot be parsed"""
+
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+
+
+def expand_host_pattern(pattern, line=None):
+    """Expand Ansible host ranges, e.g. web[01:03] -> web01, web02, web03"""
+    match = HOST_RANGE.search(pattern)
+    if not match:
+        return [pattern]
+
+    start, end, step = match.group(1), match.group(2), int(match.group(3) or 1)
+    head, tail = pattern[:match.start()], pattern[match.end():]
+    if step < 1:
+        raise InventoryError(f"invalid range step in {pattern}", line)
+
+    if start.isdigit() and end.isdigit():
+        width = len(start) if start.startswith('0') else 0
+        values = [str(i).zfill(width) for i in range(int(start), int(end) + 1, step)]
+    elif len(start) == 1 and len(end) == 1 and start.isalpha() and end.isalpha():
+        letters = string.ascii_letters
+        values = list(letters[letters.index(start):letters.index(end) + 1:step])
+    else:
+        raise InventoryError(f"invalid host range in {pattern}", line)
+    if not values:
+        raise InventoryError(f"empty host range in {pattern}", line)
+
+    hosts = []
+    for value in values:
+        hosts.extend(expand_host_pattern(f"{head}{value}{tail}", line))
+    return hosts
+
+
+def parse_vars(tokens, line=None):
+    """Parse key=value tokens into a dict"""
+    result = {}
+    for token in tokens:
+        key, sep, value = token.partition('=')
+        if not sep or not key:
+            raise InventoryError(f"expected key=value, got {token!r}", line)
+        result[key] = value
+    return result
+
+
+class Inventory:
+    """Hosts and groups of one inventory file"""
+
+    def __init__(self):
+        # host -> {'vars': {...}, 'groups': set of direct groups}
+        self.hosts = {}
+        # group -> {'hosts': set, 'children': set, 'vars': {...}}
+        self.groups = {}
+        self._parent_map = None
+        self._group('all')
+        self._group('ungrouped')
+
+    def _group(self, name):
+        if name not in self.groups:
+            self.groups[name] = {'hosts': set(), 'children': set(), 'vars': {}}
+        return self.groups[name]
+
+    def _add_host(self, name, group, host_vars):
+        host = self.hosts.setdefault(name, {'vars': {}, 'groups': set()})
+        host['vars'].update(host_vars)
+        host['groups'].add(group)
+        self._group(group)['hosts'].add(name)
+
+    def group_hosts(self, name):
+        """All hosts in a group, including those of its child groups"""
+        if name not in self.groups:
+            raise KeyError(name)
+        if name == 'all':
+            return sorted(self.hosts)
+        hosts, seen, pending = set(), set(), [name]
+        while pending:
+            group = pending.pop()
+            if group in seen:
+                continue
+            seen.add(group)
+            hosts.update(self.groups[group]['hosts'])
+            pending.extend(self.groups[group]['children'])
+        return sorted(hosts)
+
+    def _parents(self):
+        # Built once; a parsed Inventory is not modified after parse_inventory returns
+        if self._parent_map is None:
+            parents = {}
+            for group, data in self.groups.items():
+                for child in data['children']:
+                    parents.setdefault(child, set()).add(group)
+            self._parent_map = parents
+        return self._parent_map
+
+    def host_groups(self, name):
+        """Every group a host belongs to, directly or through a parent group"""
+        parents = self._parents()
+        groups, pending = set(), list(self.hosts[name]['groups'])
+        while pending:
+            group = pending.pop()
+            if group in groups:
+                continue
+            groups.add(group)
+            pending.extend(parents.get(group, ()))
+        groups.add('all')
+        return sorted(groups)
+
+    @property
+    def host_count(self):
+        return len(self.hosts)
+
+    def host_dict(self, name):
+        return {
+            'name': name,
+            'groups': self.host_groups(name),
+            'vars': dict(self.hosts[name]['vars'])
+        }
+
+    def group_dict(self, name, with_hosts=False):
+        data = self.groups[name]
+        hosts = self.group_hosts(name)
+        result = {
+            'name': name,
+            'host_count': len(hosts),
+            'children': sorted(data['children']),
+            'vars': dict(data['vars'])
+        }
+        if with_hosts:
+            result['hosts'] = hosts
+        return result
+
+
+def parse_inventory(text):
+    """Parse the text of an INI inventory into an Inventory"""
+    inventory = Inventory()
+    group, kind = 'ungrouped', 'hosts'
+    pending_children = []
+
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith(('#', ';')):
+            continue
+
+        if line.startswith('['):
+            if not line.endswith(']'):
+                raise InventoryError(f"malformed section header {line!r}", number)
+            group, _, kind = line[1:-1].strip().partition(':')
+            kind = kind or 'hosts'
+            if not group or kind not in ('hosts', 'children', 'vars'):
+                raise InventoryError(f"invalid section {line!r}", number)
+            inventory._group(group)
+            continue
+
+        if kind == 'vars':
+            key, sep, value = line.partition('=')
+            if not sep or not key.strip():
+                raise InventoryError(f"expected key=value, got {line!r}", number)
+            inventory._group(group)['vars'][key.strip()] = value.strip()
+            continue
+
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise InventoryError(str(e), number)
+        if not tokens:
+            continue
+
+        if kind == 'hosts':
+            host_vars = parse_vars(tokens[1:], number)
+            for name in expand_host_pattern(tokens[0], number):
+                inventory._add_host(name, group, host_vars)
+        else:
+            if len(tokens) != 1:
+                raise InventoryError(f"expected a group name, got {line!r}", number)
+            pending_children.append((group, tokens[0], number))
+
+    # Children may be declared before the groups they name
+    for parent, child, number in pending_children:
+        if child == 'all' or child == parent:
+            raise InventoryError(f"group {parent} cannot contain {child}", number)
+        inventory._group(child)
+        inventory._group(parent)['children'].add(child)
+
+    # A host that also appears under a named group is not "ungrouped"
+    ungrouped = inventory.groups['ungrouped']['hosts']
+    for name in list(ungrouped):
+        if len(inventory.hosts[name]['groups']) > 1:
+            ungrouped.discard(name)
+            inventory.hosts[name]['groups'].discard('ungrouped')
+    return inventory
+
+
+class InventoryCache:
+    """Parsed inventories, rebuilt when a file's mtime or size changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def get(self, filepath):
+        """Return the Inventory for filepath; raises OSError or InventoryError"""
+        st = os.stat(filepath)
+        # Saves replace the file, so a new inode marks new content even within one mtime tick
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._models.get(filepath)
+            if cached and cached[0] == key:
+                return cached[1]
+
+        with timed('inventory_parse'), open(filepath, 'r', encoding='utf-8') as f:
+            model = parse_inventory(f.read())
+        with self._lock:
+            self._models[filepath] = (key, model)
+            # Run snapshots add a path per job; drop the oldest entries
+            while len(self._models) > MAX_CACHED_INVENTORIES:
+                self._models.pop(next(iter(self._models)))
+        return model
+
+    def host_count(self, filepath):
+        """Number of hosts in an inventory, or None if it cannot be parsed"""
+        try:
+            return self.get(filepath).host_count
+        except (OSError, InventoryError):
+            return None
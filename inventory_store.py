@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Versioned inventory storage
+Inventory files are saved by writing a temporary file next to them and
+renaming it over the original, so readers see either the old or the new
+content, never a partial file. Every saved version is kept compressed in a
+small SQLite history, versions are identified by a hash of their content,
+and edits can be sent as line patches against a known version.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+from storage import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_versions (
+    filename TEXT NOT NULL,
+    version TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    user TEXT,
+    size INTEGER NOT NULL,
+    content BLOB NOT NULL,
+    PRIMARY KEY (filename, version)
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_versions_saved ON inventory_versions(filename, saved_at);
+"""
+
+DEFAULT_KEEP_VERSIONS = 50
+# Directories ansible reads relative to the inventory file
+VARS_DIRS = ('group_vars', 'host_vars')
+SNAPSHOT_FILE = 'inventory.ini'
+
+
+class PatchError(ValueError):
+    """A patch that does not apply to its base version"""
+
+
+class VersionConflict(Exception):
+    """The file changed since the version an edit was based on"""
+
+    def __init__(self, current):
+        super().__init__(f'Inventory changed since it was loaded (now at version {current})')
+        self.current = current
+
+
+def content_version(content):
+    """Short content hash used as an inventory's version and ETag"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+def apply_patch(content, hunks):
+    """
+    Apply line hunks to content. Each hunk is {'start': n, 'delete': k,
+    'insert': [lines]}: replace k lines starting at line n (0-based) of the
+    base with the given lines. Hunks refer to base line numbers and must be
+    sorted and must not overlap.
+    """
+    if not isinstance(hunks, list):
+        raise PatchError('hunks must be a list')
+    lines = content.split('\n')
+    result = []
+    position = 0
+    for hunk in hunks:
+        if not isinstance(hunk, dict):
+            raise PatchError('Each hunk must be an object')
+        start, delete, insert = hunk.get('start'), hunk.get('delete', 0), hunk.get('insert', [])
+        if not isinstance(start, int) or not isinstance(delete, int) or start < position or delete < 0:
+            raise PatchError('Hunks need increasing, non-overlapping start and delete line counts')
+        if start + delete > len(lines):
+            raise PatchError(f'Hunk at line {start} runs past the end of the file')
+        if not isinstance(insert, list) or not all(isinstance(line, str) for line in insert):
+            raise PatchError('insert must be a list of lines')
+        result.extend(lines[position:start])
+        result.extend(insert)
+        position = start + delete
+    result.extend(lines[position:])
+    return '\n'.join(result)
+
+
+def atomic_write(filepath, content):
+    """Replace filepath with content via a temporary file and rename, keeping its permissions"""
+    directory = os.path.dirname(filepath) or '.'
+    fd, tmp = tempfile.mkstemp(prefix=f'.{os.path.basename(filepath)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            shutil.copymode(filepath, tmp)
+        except OSError:
+            os.chmod(tmp, 0o644)
+        os.replace(tmp, filepath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def snapshot_inventory(filepath, run_dir):
+    """
+    Copy an inventory into a run directory so the run reads one fixed version
+    however often the file is saved meanwhile. group_vars and host_vars next
+    to the inventory are linked in so ansible still finds them.
+    Returns the snapshot's path.
+    """
+    dest = os.path.join(run_dir, SNAPSHOT_FILE)
+    shutil.copyfile(filepath, dest)
+    source_dir = os.path.dirname(os.path.abspath(filepath))
+    for name in VARS_DIRS:
+        vars_dir = os.path.join(source_dir, name)
+        if os.path.isdir(vars_dir) and not os.path.lexists(os.path.join(run_dir, name)):
+            os.symlink(vars_dir, os.path.join(run_dir, name))
+    return dest
+
+
+class InventoryStore:
+    """Atomic, versioned saves of the inventory files in one directory"""
+
+    def __init__(self, inventory_dir, db_path, keep_versions=DEFAULT_KEEP_VERSIONS):
+        self.inventory_dir = inventory_dir
+        self.db_path = db_path
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def _path(self, filename):
+        return os.path.join(self.inventory_dir, filename)
+
+    def read(self, filename):
+        """Return (content, version) of an inventory file"""
+        with open(self._path(filename), 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        return content, content_version(content)
+
+    def _read_current(self, filename):
+        """Like read(), but (None, None) for a file that does not exist yet"""
+        try:
+            return self.read(filename)
+        except FileNotFoundError:
+            return None, None
+
+    def version(self, filename):
+        """Current version of a file, cached by its stat data"""
+        st = os.stat(self._path(filename))
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._versions.get(filename)
+            if cached and cached[0] == key:
+                return cached[1]
+        _, version = self.read(filename)
+        with self._lock:
+            self._versions[filename] = (key, version)
+        return version
+
+    def save(self, filename, content=None, hunks=None, base=None, user=None):
+        """
+        Save new content, or apply hunks to the base version, and return the
+        new version. Raises VersionConflict if base is given and the file has
+        moved on, PatchError if the hunks do not apply.
+        """
+        conn = self._conn()
+        # The write lock orders saves from every server process
+        with transaction(conn):
+            current, current_version = self._read_current(filename)
+            if base is not None and base != current_version:
+                raise VersionConflict(current_version)
+            if hunks is not None:
+                content = apply_patch(current, hunks)
+            version = content_version(content)
+            if version == current_version:
+                return version
+
+            # The first save of a file also keeps the version it replaced
+            if current is not None:
+                self._record(conn, filename, current, current_version, os.path.getmtime(self._path(filename)),
+                             None, replace=False)
+            atomic_write(self._path(filename), content)
+            self._record(conn, filename, content, version, time.time(), user, replace=True)
+            self._trim(conn, filename)
+        return version
+
+    def _record(self, conn, filename, content, version, saved_at, user, replace):
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        conn.execute(
+            f'{verb} INTO inventory_versions (filename, version, saved_at, user, size, content) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, version, saved_at, user, len(content.encode('utf-8')),
+             zlib.compress(content.encode('utf-8'), 9))
+        )
+
+    def _trim(self, conn, filename):
+        conn.execute(
+            'DELETE FROM inventory_versions WHERE filename = ? AND version NOT IN '
+            '(SELECT version FROM inventory_versions WHERE filename = ? ORDER BY saved_at DESC LIMIT ?)',
+            (filename, filename, self.keep_versions)
+        )
+
+    def versions(self, filename, limit=None):
+        """Saved versions of a file, newest first, without their content"""
+        rows = self._conn().execute(
+            'SELECT version, saved_at, user, size FROM inventory_versions WHERE filename = ? '
+            'ORDER BY saved_at DESC LIMIT ?',
+            (filename, limit or self.keep_versions)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def content(self, filename, version):
+        """Content of a saved version, or None if it is not in the history"""
+        row = self._conn().execute(
+            'SELECT content FROM inventory_versions WHERE filename = ? AND version = ?',
+            (filename, version)
+        ).fetchone()
+        return zlib.decompress(row['content']).decode('utf-8') if row else None
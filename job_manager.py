@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+"""
+Background job manager for the automation dashboard
+Queues submitted tasks in a shared SQLite table and runs them on a bounded
+pool of worker threads. Every server process runs its own pool; jobs are
+claimed atomically, so several processes share one queue without running a
+job twice, and the concurrency limits apply across all of them. Jobs can be
+submitted together as a batch whose members wait for the jobs they depend on.
+Remote agents register here and claim jobs the same way, each within its own
+capacity and only for jobs whose required labels it has.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from storage import connect, transaction
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    task_type TEXT NOT NULL,
+    user TEXT,
+    description TEXT,
+    log_path TEXT,
+    params TEXT,
+    status TEXT NOT NULL,
+    owner TEXT,
+    pid INTEGER,
+    return_code INTEGER,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    cancelled_by TEXT,
+    submission_key TEXT,
+    attached INTEGER NOT NULL DEFAULT 0,
+    batch_id TEXT,
+    labels TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, submitted_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_log_path ON jobs (log_path);
+CREATE INDEX IF NOT EXISTS idx_jobs_submitted ON jobs (submitted_at);
+
+CREATE TABLE IF NOT EXISTS job_dependencies (
+    job_id TEXT NOT NULL,
+    depends_on TEXT NOT NULL,
+    PRIMARY KEY (job_id, depends_on)
+);
+CREATE INDEX IF NOT EXISTS idx_job_dependencies_parent ON job_dependencies (depends_on);
+
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    user TEXT,
+    submitted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_batches_submitted ON batches (submitted_at);
+
+CREATE TABLE IF NOT EXISTS agents (
+    name TEXT PRIMARY KEY,
+    host TEXT,
+    labels TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    registered_at REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+
+# Created after ADDED_COLUMNS so older databases have the columns they index
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_submission_key ON jobs (submission_key, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id);
+"""
+
+# Queued jobs whose dependencies all finished successfully (or were trimmed from history)
+READY = ("status = 'queued' AND NOT EXISTS ("
+         "SELECT 1 FROM job_dependencies d JOIN jobs p ON p.id = d.depends_on WHERE d.job_id = jobs.id "
+         "AND NOT (p.status = 'finished' AND p.return_code = 0 AND p.error IS NULL))")
+
+# Jobs whose required labels are all in the JSON list bound to the placeholder
+LABELS_MATCH = ("NOT EXISTS (SELECT 1 FROM json_each(COALESCE(jobs.labels, '[]')) "
+                "WHERE value NOT IN (SELECT value FROM json_each(?)))")
+
+COLUMNS = ('id', 'task_type', 'user', 'description', 'log_path', 'params', 'status', 'owner', 'pid',
+           'return_code', 'error', 'submitted_at', 'started_at', 'finished_at', 'heartbeat_at', 'cancelled_by',
+           'submission_key', 'attached', 'batch_id', 'labels')
+
+# Columns added after the first release, created on databases that predate them
+ADDED_COLUMNS = {
+    'cancelled_by': 'TEXT',
+    'submission_key': 'TEXT',
+    'attached': 'INTEGER NOT NULL DEFAULT 0',
+    'batch_id': 'TEXT',
+    'labels': 'TEXT'
+}
+
+# Running jobs whose owner has not sent a heartbeat for this long are considered lost
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = 60
+
+# Owner of jobs running on a remote agent, followed by the agent's name
+AGENT_PREFIX = 'agent:'
+
+INTERRUPTED_ERROR = 'Interrupted: the server process running this job stopped'
+AGENT_LOST_ERROR = 'Interrupted: the agent running this job stopped responding'
+DEPENDENCY_ERROR = 'Skipped: dependency {} did not succeed'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """A single submitted task and its execution state"""
+
+    def __init__(self, task_type, user=None, description=None, log_path=None, params=None, submission_key=None,
+                 labels=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.task_type = task_type
+        self.user = user
+        self.description = description
+        self.log_path = log_path
+        self.params = params or {}
+        self.status = QUEUED
+        self.owner = None
+        self.pid = None
+        self.return_code = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled_by = None
+        self.submission_key = submission_key
+        # Identical submissions that joined this job instead of starting their own
+        self.attached = 0
+        self.batch_id = None
+        self.depends_on = []
+        # Labels a worker or agent needs to run this job
+        self.labels = sorted(labels or [])
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        for column in COLUMNS:
+            if column != 'heartbeat_at':
+                setattr(job, column, row[column])
+        job.params = json.loads(row['params']) if row['params'] else {}
+        job.labels = json.loads(row['labels']) if row['labels'] else []
+        job.depends_on = []
+        return job
+
+    @property
+    def agent(self):
+        """Name of the agent running the job, or None"""
+        if self.owner and self.owner.startswith(AGENT_PREFIX):
+            return self.owner[len(AGENT_PREFIX):]
+        return None
+
+    @property
+    def succeeded(self):
+        return self.status == FINISHED and self.return_code == 0 and self.error is None
+
+    @property
+    def duration(self):
+        """Seconds spent running, or running so far"""
+        if self.started_at is None:
+            return None
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return round(end - self.started_at, 3)
+
+    def to_dict(self):
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+
+        return {
+            'id': self.id,
+            'task_type': self.task_type,
+            'user': self.user,
+            'description': self.description,
+            'log_path': self.log_path,
+            'params': self.params,
+            'status': self.status,
+            'pid': self.pid,
+            'return_code': self.return_code,
+            'error': self.error,
+            'submitted_at': fmt(self.submitted_at),
+            'started_at': fmt(self.started_at),
+            'finished_at': fmt(self.finished_at),
+            'duration': self.duration,
+            'cancelled_by': self.cancelled_by,
+            'attached': self.attached,
+            'batch_id': self.batch_id,
+            'depends_on': self.depends_on,
+            'labels': self.labels,
+            'agent': self.agent
+        }
+
+
+class JobManager:
+    """
+    Bounded worker pool with a global and per task type concurrency limit.
+    execute(job) runs a job to completion on a worker thread and returns its
+    return code. Job state lives in the SQLite database at db_path so it is
+    shared by every process using the same file. The pool only takes jobs
+    whose required labels are in labels; with local=False it takes none and
+    jobs are left to remote agents.
+    """
+
+    def __init__(self, execute, db_path, max_workers=4, per_type_limits=None, history_limit=200,
+                 poll_interval=1.0, labels=None, local=True):
+        self.execute = execute
+        self.db_path = db_path
+        self.max_workers = max(1, int(max_workers))
+        self.per_type_limits = {k: max(1, int(v)) for k, v in (per_type_limits or {}).items()}
+        self.labels = sorted(labels or [])
+        self.local = local
+        self.history_limit = history_limit
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._cond = threading.Condition()
+        self._workers = []
+        self._started_by = None
+        self._listeners = []
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, kind in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+            conn.executescript(INDEXES)
+            self._ready = True
+        return conn
+
+    def add_listener(self, callback):
+        """Register callback(job), called when a job is queued, starts and finishes"""
+        self._listeners.append(callback)
+
+    def _notify(self, job):
+        for callback in self._listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"Job listener error for {job.id}: {e}")
+
+    def start(self):
+        """Start this process's worker threads; safe to call more than once"""
+        with self._cond:
+            # A forked server worker inherits the parent's state but not its threads
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            if self._started_by == owner:
+                return
+            self.owner = self._started_by = owner
+            self._workers = []
+            for i in range(self.max_workers if self.local else 0):
+                worker = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+        self.reap_lost_jobs()
+
+    def submit(self, task_type, user=None, description=None, log_path=None, params=None):
+        """Queue a task for execution and return its Job"""
+        job, _ = self.submit_or_attach(task_type, user=user, description=description, log_path=log_path,
+                                       params=params)
+        return job
+
+    def submit_or_attach(self, task_type, user=None, description=None, log_path=None, params=None,
+                         submission_key=None, coalesce_window=0, labels=None):
+        """
+        Queue a task unless a job with the same submission_key was submitted
+        within coalesce_window seconds and is still queued or running; in
+        that case the submission attaches to it. Returns (job, created).
+        """
+        job = Job(task_type, user=user, description=description, log_path=log_path, params=params,
+                  submission_key=submission_key, labels=labels)
+        conn = self._conn()
+        # The lookup and insert share a write transaction so concurrent
+        # submissions from several processes still coalesce into one job
+        with transaction(conn):
+            if submission_key and coalesce_window > 0:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE submission_key = ? AND status IN ('queued', 'running') "
+                    "AND submitted_at >= ? ORDER BY submitted_at DESC LIMIT 1",
+                    (submission_key, job.submitted_at - coalesce_window)).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE jobs SET attached = attached + 1 WHERE id = ?', (row['id'],))
+                    existing = Job.from_row(row)
+                    existing.attached += 1
+                    return existing, False
+            conn.execute(
+                'INSERT INTO jobs (id, task_type, user, description, log_path, params, status, submitted_at, '
+                'submission_key, labels) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.task_type, job.user, job.description, job.log_path, json.dumps(job.params),
+                 job.status, job.submitted_at, job.submission_key, json.dumps(job.labels)))
+        # Only once committed, so listeners never hear of a job that was rolled back. A worker
+        # may already have claimed it; listeners see the running state before this queued one
+        self._notify(job)
+        # Workers are started lazily so importing the app never spawns threads
+        self.start()
+        with self._cond:
+            self._cond.notify_all()
+        return job, True
+
+    def submit_batch(self, entries, name=None, user=None):
+        """
+        Queue several jobs as one batch, atomically. Each entry holds the
+        submit() arguments plus depends_on, a list of indexes of earlier
+        entries that must succeed before it runs. Returns (batch_id, jobs).
+        """
+        batch_id = uuid.uuid4().hex[:12]
+        jobs = []
+        conn = self._conn()
+        with transaction(conn):
+            conn.execute('INSERT INTO batches (id, name, user, submitted_at) VALUES (?, ?, ?, ?)',
+                         (batch_id, name, user, time.time()))
+            for entry in entries:
+                job = Job(entry['task_type'], user=user, description=entry.get('description'),
+                          log_path=entry.get('log_path'), params=entry.get('params'),
+                          submission_key=entry.get('submission_key'), labels=entry.get('labels'))
+                job.batch_id = batch_id
+                job.depends_on = [jobs[i].id for i in entry.get('depends_on', [])]
+                conn.execute(
+                    'INSERT INTO jobs (id, task_type, user, description, log_path, params, status, submitted_at, '
+                    'submission_key, batch_id, labels) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job.id, job.task_type, job.user, job.description, job.log_path, json.dumps(job.params),
+                     job.status, job.submitted_at, job.submission_key, batch_id, json.dumps(job.labels)))
+                conn.executemany('INSERT INTO job_dependencies (job_id, depends_on) VALUES (?, ?)',
+                                 [(job.id, parent) for parent in job.depends_on])
+                jobs.append(job)
+        for job in jobs:
+            self._notify(job)
+        self.start()
+        with self._cond:
+            self._cond.notify_all()
+        return batch_id, jobs
+
+    def set_pid(self, job, pid):
+        """Record the process id of a running job's child process"""
+        job.pid = pid
+        self._conn().execute('UPDATE jobs SET pid = ? WHERE id = ?', (pid, job.id))
+
+    def get(self, job_id):
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def find_by_log_path(self, log_path):
+        """Return the most recent job writing to log_path, if any"""
+        row = self._conn().execute(
+            'SELECT * FROM jobs WHERE log_path = ? ORDER BY submitted_at DESC LIMIT 1', (log_path,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def list_jobs(self, status=None):
+        """Return jobs newest first, optionally filtered by status"""
+        if status:
+            rows = self._conn().execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY submitted_at DESC', (status,)).fetchall()
+        else:
+            rows = self._conn().execute('SELECT * FROM jobs ORDER BY submitted_at DESC').fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def count_active(self, user):
+        """Number of a user's jobs that are queued or running"""
+        return self._conn().execute(
+            "SELECT COUNT(*) AS n FROM jobs WHERE user = ? AND status IN ('queued', 'running')", (user,)).fetchone()['n']
+
+    def dependencies(self, job_ids):
+        """{job_id: [ids it depends on]} for the given jobs"""
+        result = {job_id: [] for job_id in job_ids}
+        if job_ids:
+            rows = self._conn().execute(
+                f"SELECT job_id, depends_on FROM job_dependencies WHERE job_id IN ({','.join('?' * len(job_ids))})",
+                list(job_ids)).fetchall()
+            for row in rows:
+                result[row['job_id']].append(row['depends_on'])
+        return result
+
+    def get_batch(self, batch_id):
+        """Return (batch row as dict, jobs in submission order), or (None, []) if unknown"""
+        conn = self._conn()
+        row = conn.execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+        if row is None:
+            return None, []
+        jobs = [Job.from_row(r) for r in conn.execute(
+            'SELECT * FROM jobs WHERE batch_id = ? ORDER BY submitted_at, rowid', (batch_id,)).fetchall()]
+        deps = self.dependencies([job.id for job in jobs])
+        for job in jobs:
+            job.depends_on = deps[job.id]
+        return dict(row), jobs
+
+    def list_batches(self, limit=20):
+        """Most recent batches, newest first"""
+        rows = self._conn().execute('SELECT id FROM batches ORDER BY submitted_at DESC LIMIT ?', (limit,)).fetchall()
+        return [self.get_batch(row['id']) for row in rows]
+
+    def counts(self):
+        """Number of jobs in each state"""
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def cancel(self, job_id, user=None):
+        """
+        Cancel a job. A queued job is finished straight away; a running job is
+        flagged, and the process running it kills it on its next check.
+        Returns the updated Job, or None if it does not exist.
+        """
+        conn = self._conn()
+        now = time.time()
+        with transaction(conn):
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            skipped = []
+            if row['status'] == QUEUED:
+                conn.execute(
+                    "UPDATE jobs SET status = 'finished', error = ?, finished_at = ?, cancelled_by = ? WHERE id = ?",
+                    (f"Cancelled by {user}", now, user, job_id))
+                skipped = self._skip_dependents(conn, job_id, now)
+            elif row['status'] == RUNNING:
+                conn.execute('UPDATE jobs SET cancelled_by = ? WHERE id = ?', (user, job_id))
+        job = self.get(job_id)
+        if row['status'] == QUEUED:
+            self._notify(job)
+            self._notify_ids(skipped)
+        return job
+
+    def cancel_requested(self, job_id):
+        """Who asked to cancel a running job, or None"""
+        row = self._conn().execute('SELECT cancelled_by FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row['cancelled_by'] if row else None
+
+    def _trim_history(self, conn):
+        # Only finished jobs are dropped; queued and running jobs are always kept
+        conn.execute(
+            "DELETE FROM jobs WHERE status = 'finished' AND id NOT IN "
+            "(SELECT id FROM jobs WHERE status = 'finished' ORDER BY finished_at DESC LIMIT ?)",
+            (self.history_limit,))
+        conn.execute('DELETE FROM job_dependencies WHERE job_id NOT IN (SELECT id FROM jobs)')
+        conn.execute('DELETE FROM batches WHERE id NOT IN (SELECT batch_id FROM jobs WHERE batch_id IS NOT NULL)')
+
+    def _skip_dependents(self, conn, job_id, now):
+        """Finish queued jobs that depend, directly or not, on a job that did not succeed; returns their ids"""
+        skipped = []
+        pending = [job_id]
+        while pending:
+            parent = pending.pop()
+            rows = conn.execute(
+                "SELECT j.id FROM job_dependencies d JOIN jobs j ON j.id = d.job_id "
+                "WHERE d.depends_on = ? AND j.status = 'queued'", (parent,)).fetchall()
+            for row in rows:
+                conn.execute("UPDATE jobs SET status = 'finished', error = ?, finished_at = ? WHERE id = ?",
+                             (DEPENDENCY_ERROR.format(parent), now, row['id']))
+                skipped.append(row['id'])
+                pending.append(row['id'])
+        return skipped
+
+    def _notify_ids(self, job_ids):
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job:
+                self._notify(job)
+
+    # Remote agents
+
+    def register_agent(self, name, host=None, labels=None, capacity=1):
+        """
+        Record an agent coming online and return its row as a dict. Jobs a
+        previous process under the same name was running are finished as
+        interrupted, since the new process knows nothing about them.
+        """
+        conn = self._conn()
+        now = time.time()
+        with transaction(conn):
+            conn.execute(
+                'INSERT OR REPLACE INTO agents (name, host, labels, capacity, registered_at, last_seen) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (name, host, json.dumps(sorted(labels or [])), max(1, int(capacity)), now, now))
+            lost = [row['id'] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND owner = ?", (AGENT_PREFIX + name,))]
+            skipped = []
+            for job_id in lost:
+                conn.execute("UPDATE jobs SET status = 'finished', error = ?, finished_at = ? WHERE id = ?",
+                             (AGENT_LOST_ERROR, now, job_id))
+                skipped += self._skip_dependents(conn, job_id, now)
+        self._notify_ids(lost + skipped)
+        return self.get_agent(name)
+
+    def get_agent(self, name):
+        row = self._conn().execute('SELECT * FROM agents WHERE name = ?', (name,)).fetchone()
+        return dict(row) if row else None
+
+    def list_agents(self):
+        """Registered agents with their labels, running job count and whether they are online"""
+        conn = self._conn()
+        running = {row['owner']: row['n'] for row in conn.execute(
+            f"SELECT owner, COUNT(*) AS n FROM jobs WHERE status = 'running' AND owner LIKE '{AGENT_PREFIX}%' "
+            "GROUP BY owner")}
+        cutoff = time.time() - STALE_AFTER
+        agents = []
+        for row in conn.execute('SELECT * FROM agents ORDER BY name'):
+            agent = dict(row)
+            agent['labels'] = json.loads(agent['labels'])
+            agent['running'] = running.get(AGENT_PREFIX + agent['name'], 0)
+            agent['online'] = agent['last_seen'] >= cutoff
+            agents.append(agent)
+        return agents
+
+    def claim_for_agent(self, name):
+        """Claim the next job an agent can run, or return None; None as well for an unregistered agent"""
+        conn = self._conn()
+        conn.execute('UPDATE agents SET last_seen = ? WHERE name = ?', (time.time(), name))
+        agent = self.get_agent(name)
+        if agent is None:
+            return None
+        job = self._claim(agent)
+        if job:
+            self._notify(job)
+        return job
+
+    def agent_job(self, name, job_id):
+        """A job the named agent is running, or None"""
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE id = ? AND owner = ? AND status = 'running'",
+            (job_id, AGENT_PREFIX + name)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def agent_heartbeat(self, name, job_id):
+        """Keep an agent's job from being reaped; returns who asked to cancel it, or None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('UPDATE agents SET last_seen = ? WHERE name = ?', (now, name))
+        conn.execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ?',
+                     (now, job_id, AGENT_PREFIX + name))
+        return self.cancel_requested(job_id)
+
+    def finish_agent_job(self, job, return_code=None, error=None):
+        """Record the end of a job an agent ran, as a local worker would"""
+        job.return_code, job.error = return_code, error
+        job.finished_at = time.time()
+        job.status = FINISHED
+        skipped = self._finish(job)
+        with self._cond:
+            self._cond.notify_all()
+        self._notify(job)
+        self._notify_ids(skipped)
+        return job
+
+    # Claiming and recovery
+
+    def _claim(self, agent=None):
+        """
+        Atomically move the oldest ready job to running. Without agent the job
+        is claimed for this process's pool, within the global and per task
+        type limits shared by all server processes; with agent (a row of the
+        agents table) for that agent, within its capacity. Either way only
+        jobs whose required labels the runner has are considered.
+        """
+        if agent is None:
+            owner, labels, capacity, type_limits = self.owner, self.labels, self.max_workers, self.per_type_limits
+            mine, mine_args = f"owner NOT LIKE '{AGENT_PREFIX}%'", ()
+        else:
+            owner = AGENT_PREFIX + agent['name']
+            labels, capacity, type_limits = json.loads(agent['labels']), agent['capacity'], {}
+            mine, mine_args = 'owner = ?', (owner,)
+        labels = json.dumps(labels)
+        conn = self._conn()
+        # Cheap read first so idle workers don't take the write lock on every poll
+        if conn.execute(f"SELECT 1 FROM jobs WHERE {READY} AND {LABELS_MATCH} LIMIT 1", (labels,)).fetchone() is None:
+            return None
+        with transaction(conn):
+            running = {row['task_type']: row['n'] for row in conn.execute(
+                f"SELECT task_type, COUNT(*) AS n FROM jobs WHERE status = 'running' AND {mine} GROUP BY task_type",
+                mine_args)}
+            if sum(running.values()) >= capacity:
+                return None
+            full = [t for t, limit in type_limits.items() if running.get(t, 0) >= limit]
+            placeholders = ','.join('?' * len(full))
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE {READY} AND {LABELS_MATCH} "
+                f"{f'AND task_type NOT IN ({placeholders})' if full else ''} "
+                f"ORDER BY submitted_at LIMIT 1", [labels] + full).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (owner, now, now, row['id']))
+        job = Job.from_row(row)
+        job.status, job.owner, job.started_at = RUNNING, owner, now
+        return job
+
+    def _finish(self, job):
+        """Record a job's end; returns the ids of dependents skipped because it failed"""
+        conn = self._conn()
+        skipped = []
+        with transaction(conn):
+            conn.execute(
+                "UPDATE jobs SET status = 'finished', return_code = ?, error = ?, finished_at = ? WHERE id = ?",
+                (job.return_code, job.error, job.finished_at, job.id))
+            if not job.succeeded:
+                skipped = self._skip_dependents(conn, job.id, job.finished_at)
+            self._trim_history(conn)
+        return skipped
+
+    def reap_lost_jobs(self):
+        """Finish running jobs whose owning process died, so they don't hold capacity forever"""
+        conn = self._conn()
+        now = time.time()
+        host = socket.gethostname()
+        lost = []
+        skipped = []
+        with transaction(conn):
+            for row in conn.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall():
+                on_agent = (row['owner'] or '').startswith(AGENT_PREFIX)
+                owner_host, _, owner_pid = (row['owner'] or '').rpartition(':')
+                dead_here = not on_agent and owner_host == host and owner_pid.isdigit() \
+                    and not process_alive(int(owner_pid))
+                silent = (row['heartbeat_at'] or 0) < now - STALE_AFTER
+                if dead_here or silent:
+                    error = AGENT_LOST_ERROR if on_agent else INTERRUPTED_ERROR
+                    conn.execute(
+                        "UPDATE jobs SET status = 'finished', error = ?, finished_at = ? WHERE id = ?",
+                        (error, now, row['id']))
+                    skipped += self._skip_dependents(conn, row['id'], now)
+                    lost.append((row, error))
+        for row, error in lost:
+            job = Job.from_row(row)
+            job.status, job.error, job.finished_at = FINISHED, error, now
+            self._notify(job)
+        self._notify_ids(skipped)
+        return len(lost)
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self._conn().execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                                     (time.time(), self.owner))
+                self.reap_lost_jobs()
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+            with self._cond:
+                # Pick up capacity freed by reaped jobs
+                self._cond.notify_all()
+
+    # Workers
+
+    def _next_job(self):
+        # Wait for a claimable job; other processes' submissions are seen by polling
+        while True:
+            job = self._claim()
+            if job:
+                return job
+            with self._cond:
+                self._cond.wait(self.poll_interval)
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self._next_job()
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            self._notify(job)
+            try:
+                job.return_code = self.execute(job)
+            except Exception as e:
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.status = FINISHED
+                skipped = []
+                try:
+                    skipped = self._finish(job)
+                except Exception as e:
+                    print(f"Could not record the end of job {job.id}: {e}")
+                with self._cond:
+                    self._cond.notify_all()
+            self._notify(job)
+            self._notify_ids(skipped)
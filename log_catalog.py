@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Persistent catalog of the logs directory
+Keeps an SQLite index of every log file and directory so the dashboard and
+log explorer can answer listings without rescanning the filesystem. The index
+is refreshed incrementally: a directory is only relisted when its mtime
+changes, and only recently active directories have their files re-statted.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from metrics import timed
+from storage import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_entries (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_log_entries_listing ON log_entries (parent, is_dir, name);
+CREATE INDEX IF NOT EXISTS idx_log_entries_parent_mtime ON log_entries (parent, is_dir, mtime);
+CREATE INDEX IF NOT EXISTS idx_log_entries_mtime ON log_entries (is_dir, mtime);
+
+CREATE TABLE IF NOT EXISTS log_dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    active_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_log_dirs_active ON log_dirs (active_at);
+"""
+
+# Directories relisted per transaction while reconciling, so requests wait at most one batch
+RECONCILE_BATCH = 50
+
+
+def format_mtime(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def entry_to_dict(row):
+    """Convert a catalog row to the dict shape used by the templates"""
+    if row['is_dir']:
+        return {'name': row['name'], 'path': row['path'], 'type': 'dir'}
+    return {
+        'name': row['name'],
+        'path': row['path'],
+        'size': row['size'],
+        'modified': format_mtime(row['mtime']),
+        'timestamp': row['mtime'],
+        'type': 'file'
+    }
+
+
+def join_path(parent, name):
+    return f"{parent}/{name}" if parent else name
+
+
+class LogCatalog:
+    """Incrementally maintained index of files and directories under logs_dir"""
+
+    def __init__(self, logs_dir, db_path, hot_seconds=3600, refresh_interval=2, reconcile_interval=3600):
+        self.logs_dir = logs_dir
+        self.db_path = db_path
+        self.hot_seconds = hot_seconds
+        self.refresh_interval = refresh_interval
+        self.reconcile_interval = reconcile_interval
+
+        self._lock = threading.Lock()
+        self._last_refresh = 0
+        self._last_reconcile = 0
+        self._reconciling = False
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    # Scanning
+
+    def _scan_dir(self, conn, rel, recursive=False, descend=True):
+        """
+        Relist one directory, stat'ing new entries and files, and drop vanished
+        ones. New subdirectories are scanned as well unless descend is False.
+        """
+        abs_dir = os.path.join(self.logs_dir, rel)
+        try:
+            dir_mtime = os.stat(abs_dir).st_mtime
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            self._forget(conn, rel)
+            return
+
+        known = {row['name']: row['is_dir'] for row in conn.execute(
+            'SELECT name, is_dir FROM log_entries WHERE parent = ?', (rel,))}
+        seen = set()
+        new_dirs = []
+        active_at = dir_mtime
+
+        # Links are skipped, e.g. the group_vars a run's inventory snapshot links to, and
+        # left out of seen so entries indexed through them by older versions are dropped
+        for entry in entries:
+            path = join_path(rel, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    seen.add(entry.name)
+                    if entry.name in known and not recursive:
+                        continue
+                    mtime = entry.stat().st_mtime
+                    conn.execute(
+                        'INSERT OR REPLACE INTO log_entries (path, parent, name, is_dir, size, mtime) VALUES (?, ?, ?, 1, NULL, ?)',
+                        (path, rel, entry.name, mtime))
+                    new_dirs.append(path)
+                elif entry.is_file(follow_symlinks=False):
+                    seen.add(entry.name)
+                    st = entry.stat()
+                    active_at = max(active_at, st.st_mtime)
+                    conn.execute(
+                        'INSERT OR REPLACE INTO log_entries (path, parent, name, is_dir, size, mtime) VALUES (?, ?, ?, 0, ?, ?)',
+                        (path, rel, entry.name, st.st_size, st.st_mtime))
+            except OSError:
+                continue
+
+        for name in set(known) - seen:
+            self._forget(conn, join_path(rel, name))
+
+        conn.execute('INSERT OR REPLACE INTO log_dirs (path, mtime, active_at) VALUES (?, ?, ?)',
+                     (rel, dir_mtime, active_at))
+
+        if descend:
+            for path in new_dirs:
+                self._scan_dir(conn, path, recursive=True)
+
+    def _forget(self, conn, path):
+        """Remove an entry and everything below it"""
+        if not path:
+            conn.execute('DELETE FROM log_entries')
+            conn.execute('DELETE FROM log_dirs')
+            return
+        prefix = f"{path}/"
+        for table in ('log_entries', 'log_dirs'):
+            conn.execute(f'DELETE FROM {table} WHERE path = ? OR substr(path, 1, ?) = ?', (path, len(prefix), prefix))
+
+    def _restat_files(self, conn, rel):
+        """Update size and mtime of the known files in a directory whose listing is unchanged"""
+        active_at = None
+        for row in conn.execute('SELECT path, name FROM log_entries WHERE parent = ? AND is_dir = 0', (rel,)).fetchall():
+            try:
+                st = os.stat(os.path.join(self.logs_dir, row['path']))
+            except OSError:
+                self._forget(conn, row['path'])
+                continue
+            active_at = max(active_at or 0, st.st_mtime)
+            conn.execute('UPDATE log_entries SET size = ?, mtime = ? WHERE path = ?',
+                         (st.st_size, st.st_mtime, row['path']))
+        if active_at:
+            conn.execute('UPDATE log_dirs SET active_at = MAX(active_at, ?) WHERE path = ?', (active_at, rel))
+
+    def rescan(self, rel=''):
+        """Relist one directory now, e.g. after files in it were replaced or removed"""
+        conn = self._conn()
+        with self._lock, transaction(conn):
+            self._scan_dir(conn, rel)
+
+    def _is_real_dir(self, rel):
+        """Whether rel is a directory under logs_dir reached without following links"""
+        abs_dir = os.path.join(self.logs_dir, rel)
+        expected = os.path.normpath(os.path.join(os.path.realpath(self.logs_dir), rel))
+        return os.path.isdir(abs_dir) and os.path.realpath(abs_dir) == expected
+
+    def _walk_dirs(self):
+        """Mtime of every directory under logs_dir, read from the filesystem only"""
+        found = {}
+        pending = ['']
+        while pending:
+            rel = pending.pop()
+            abs_dir = os.path.join(self.logs_dir, rel)
+            try:
+                found[rel] = os.stat(abs_dir).st_mtime
+                with os.scandir(abs_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(join_path(rel, entry.name))
+            except OSError:
+                found.pop(rel, None)
+        return found
+
+    def rebuild(self):
+        """
+        Reconcile the catalog with the logs tree. The tree is walked without
+        holding the lock, then only directories whose mtime differs from
+        log_dirs are relisted, a batch at a time in short transactions.
+        """
+        conn = self._conn()
+        with timed('catalog_rebuild'):
+            found = self._walk_dirs()
+            known = {row['path']: row['mtime'] for row in conn.execute('SELECT path, mtime FROM log_dirs')}
+            # Sorted so a parent is relisted before its new subdirectories
+            changed = sorted(rel for rel, mtime in found.items() if known.get(rel) != mtime)
+            # Recheck: a refresh may have added a directory since the walk
+            vanished = [rel for rel in known if rel not in found and not self._is_real_dir(rel)]
+
+            for i in range(0, len(changed), RECONCILE_BATCH):
+                with self._lock, transaction(conn):
+                    for rel in changed[i:i + RECONCILE_BATCH]:
+                        self._scan_dir(conn, rel, descend=False)
+            for i in range(0, len(vanished), RECONCILE_BATCH):
+                with self._lock, transaction(conn):
+                    for rel in vanished[i:i + RECONCILE_BATCH]:
+                        self._forget(conn, rel)
+            self._last_reconcile = time.time()
+
+    def _background_reconcile(self):
+        try:
+            self.rebuild()
+        finally:
+            self._reconciling = False
+
+    def refresh(self, force=False):
+        """Bring the catalog up to date, touching only root and recently active directories"""
+        now = time.time()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        conn = self._conn()
+
+        if conn.execute('SELECT 1 FROM log_dirs LIMIT 1').fetchone() is None:
+            self.rebuild()
+            self._last_refresh = time.time()
+            return
+
+        with self._lock, timed('catalog_refresh'):
+            with transaction(conn):
+                candidates = [''] + [row['path'] for row in conn.execute(
+                    "SELECT path FROM log_dirs WHERE active_at >= ? AND path != ''", (now - self.hot_seconds,))]
+                for rel in candidates:
+                    row = conn.execute('SELECT mtime FROM log_dirs WHERE path = ?', (rel,)).fetchone()
+                    try:
+                        dir_mtime = os.stat(os.path.join(self.logs_dir, rel)).st_mtime
+                    except OSError:
+                        self._forget(conn, rel)
+                        continue
+                    if row is None or row['mtime'] != dir_mtime:
+                        self._scan_dir(conn, rel)
+                    else:
+                        self._restat_files(conn, rel)
+            self._last_refresh = time.time()
+
+        # Catch changes in long-idle directories now and then; rebuild only locks for short batches
+        if now - self._last_reconcile > self.reconcile_interval and not self._reconciling:
+            self._reconciling = True
+            threading.Thread(target=self._background_reconcile, name='log-catalog-reconcile', daemon=True).start()
+
+    def touch(self, rel_dir):
+        """Mark a directory as active so its files are re-statted on the next refresh"""
+        conn = self._conn()
+        with self._lock:
+            conn.execute('INSERT INTO log_dirs (path, mtime, active_at) VALUES (?, 0, ?) '
+                         'ON CONFLICT(path) DO UPDATE SET active_at = excluded.active_at',
+                         (rel_dir, time.time()))
+        self._last_refresh = 0
+
+    # Queries
+
+    def recent_files(self, since, limit=10):
+        """Files modified at or after the since timestamp, newest first"""
+        self.refresh()
+        rows = self._conn().execute(
+            'SELECT * FROM log_entries WHERE is_dir = 0 AND mtime >= ? ORDER BY mtime DESC LIMIT ?',
+            (since, limit)).fetchall()
+        return [entry_to_dict(row) for row in rows]
+
+    def recent_runs(self, limit=10):
+        """Top-level run directories, newest first"""
+        self.refresh()
+        rows = self._conn().execute(
+            "SELECT * FROM log_entries WHERE parent = '' AND is_dir = 1 ORDER BY mtime DESC LIMIT ?",
+            (limit,)).fetchall()
+        return [entry_to_dict(row) for row in rows]
+
+    def list_dir(self, rel, cursor=None, limit=200):
+        """
+        One page of a directory listing: subdirectories by name, then files
+        newest first. Returns (dirs, files, next_cursor); the cursor encodes
+        the last entry shown so pages stay stable while new runs arrive.
+        """
+        self.refresh()
+        conn = self._conn()
+        dirs, files = [], []
+        kind, _, value = (cursor or 'd:').partition(':')
+
+        if kind == 'd':
+            rows = conn.execute(
+                'SELECT * FROM log_entries WHERE parent = ? AND is_dir = 1 AND name > ? ORDER BY name LIMIT ?',
+                (rel, value, limit + 1)).fetchall()
+            dirs = [entry_to_dict(row) for row in rows[:limit]]
+            if len(rows) > limit:
+                return dirs, files, f"d:{dirs[-1]['name']}"
+            value = ''
+
+        remaining = limit - len(dirs)
+        if not value:
+            rows = conn.execute(
+                'SELECT * FROM log_entries WHERE parent = ? AND is_dir = 0 ORDER BY mtime DESC, name LIMIT ?',
+                (rel, remaining + 1)).fetchall()
+        else:
+            mtime, _, name = value.partition(':')
+            rows = conn.execute(
+                'SELECT * FROM log_entries WHERE parent = ? AND is_dir = 0 AND (mtime < ? OR (mtime = ? AND name > ?)) '
+                'ORDER BY mtime DESC, name LIMIT ?',
+                (rel, float(mtime), float(mtime), name, remaining + 1)).fetchall()
+
+        files = [entry_to_dict(row) for row in rows[:remaining]]
+        next_cursor = None
+        if len(rows) > remaining:
+            if files:
+                last = files[-1]
+                next_cursor = f"f:{last['timestamp']!r}:{last['name']}"
+            else:
+                next_cursor = 'f:'
+        return dirs, files, next_cursor
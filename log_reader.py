@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Incremental readers for execution logs
+Serves pages of large log files through mmap and a cached line-offset index,
+and tails growing log files as Server-Sent Events with byte offsets.
+Logs compressed by retention (.gz, .zst) are read through a streaming
+decompressor instead, never inflated whole into memory.
+"""
+
+import bisect
+import collections
+import gzip
+import json
+import mmap
+import os
+import threading
+import time
+import zlib
+from array import array
+
+from metrics import LOG_BYTES_SERVED, timed
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_POLL_INTERVAL = 0.5
+STREAM_KEEPALIVE = 15
+
+MAX_PAGE_LINES = 5000
+INDEX_CACHE_SIZE = 32
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+# Decompressed bytes between gzip restart points; each keeps a decompressor copy (about 40 KB)
+CHECKPOINT_BYTES = 16 * 1024 * 1024
+# Compressed bytes fed to the decompressor at a time, which bounds how far apart checkpoints land
+GZIP_BLOCK_SIZE = 64 * 1024
+
+# Suffixes of compressed logs, in the order a log's compressed copy is looked for
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+
+def is_compressed(filepath):
+    return filepath.endswith(COMPRESSED_SUFFIXES)
+
+
+def log_variants(filepath):
+    """A log's path followed by the paths of its possible compressed copies"""
+    return [filepath] + [filepath + suffix for suffix in COMPRESSED_SUFFIXES]
+
+
+def resolve_log(filepath):
+    """The file to read for a log: the log itself or, once retention compressed it, its compressed copy"""
+    for candidate in log_variants(filepath):
+        if os.path.isfile(candidate):
+            return candidate
+    return filepath
+
+
+def open_log(filepath):
+    """
+    Open a log for reading bytes. Compressed logs are decompressed as they
+    are read; seeking forward decompresses and discards up to the offset.
+    """
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, 'rb')
+    if filepath.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('Reading .zst logs needs the zstandard module')
+        return zstandard.ZstdDecompressor().stream_reader(open(filepath, 'rb'), read_across_frames=True, closefd=True)
+    return open(filepath, 'rb')
+
+
+class LineIndex:
+    """Byte offsets of every line start in a log file, extended as the file grows"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self.inode = inode
+        self.offsets = array('Q', [0])
+        self.indexed_size = 0
+
+    def refresh(self):
+        """Index any bytes appended since the last call; rebuild if the file was replaced"""
+        st = os.stat(self.filepath)
+        with self._lock:
+            if st.st_ino != self.inode or st.st_size < self.indexed_size:
+                self._reset(st.st_ino)
+            if st.st_size == self.indexed_size:
+                return
+            with timed('log_index'), open(self.filepath, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    size = min(len(mm), st.st_size)
+                    pos = mm.find(b'\n', self.indexed_size, size)
+                    while pos != -1:
+                        self.offsets.append(pos + 1)
+                        pos = mm.find(b'\n', pos + 1, size)
+            self.indexed_size = size
+
+    @property
+    def line_count(self):
+        # The last offset is only a real line once bytes follow it
+        if self.offsets[-1] == self.indexed_size:
+            return len(self.offsets) - 1
+        return len(self.offsets)
+
+    def read_lines(self, start, count):
+        """Return lines [start, start + count) and their byte range, reading only that slice"""
+        self.refresh()
+        with self._lock:
+            total = self.line_count
+            start = max(0, min(start, total))
+            end = max(start, min(start + count, total))
+            start_offset = self.offsets[start] if start < len(self.offsets) else self.indexed_size
+            end_offset = self.offsets[end] if end < len(self.offsets) else self.indexed_size
+            size = self.indexed_size
+
+        content = self.read_bytes(start_offset, end_offset) if end_offset > start_offset else b''
+        return {
+            'content': content.decode('utf-8', errors='replace'),
+            'start_line': start,
+            'end_line': end,
+            'total_lines': total,
+            'start_offset': start_offset,
+            'end_offset': end_offset,
+            'size': size
+        }
+
+    def read_bytes(self, start_offset, end_offset):
+        with timed('log_read'), open(self.filepath, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[start_offset:end_offset]
+
+
+def read_full(f, size):
+    """Read size bytes, or fewer only at the end of the file; decompressing readers may return less"""
+    parts = []
+    while size > 0:
+        data = f.read(size)
+        if not data:
+            break
+        parts.append(data)
+        size -= len(data)
+    return b''.join(parts)
+
+
+def inflate_gzip(f, decompressor=None):
+    """
+    Decompress a gzip stream from f's current position, yielding (data,
+    decompressor, input_offset) per block of input. After each block the
+    decompressor has consumed all input up to input_offset, so a copy of it
+    resumes decompression from there. Handles files of several gzip members.
+    """
+    decompressor = decompressor or zlib.decompressobj(wbits=31)
+    for block in iter(lambda: f.read(GZIP_BLOCK_SIZE), b''):
+        data = decompressor.decompress(block)
+        # A new member starts after the end of the previous one
+        while decompressor.eof and decompressor.unused_data:
+            rest = decompressor.unused_data
+            decompressor = zlib.decompressobj(wbits=31)
+            data += decompressor.decompress(rest)
+        yield data, decompressor, f.tell()
+
+
+class CompressedLineIndex(LineIndex):
+    """
+    Line index of a compressed log, built in one streaming pass. Compressed
+    logs are finished and never change, so the index is never extended;
+    offsets and sizes refer to the decompressed content.
+    For gzip, the pass also keeps a copy of the decompressor every
+    CHECKPOINT_BYTES of output, so a page read starts from the nearest
+    checkpoint instead of decompressing the file from the start. zstd
+    decompressors can't be copied; forward reads reuse one open reader.
+    """
+
+    def _reset(self, inode):
+        super()._reset(inode)
+        # (decompressed offset, compressed offset, decompressor copy or None for the file start)
+        self.checkpoints = [(0, 0, None)]
+        self._reader = None
+        self._reader_position = 0
+
+    def refresh(self):
+        st = os.stat(self.filepath)
+        with self._lock:
+            if st.st_ino == self.inode:
+                return
+            self._reset(None)
+            position = 0
+            gzipped = self.filepath.endswith('.gz')
+            with timed('log_index'), open(self.filepath, 'rb') if gzipped else open_log(self.filepath) as f:
+                if gzipped:
+                    blocks = inflate_gzip(f)
+                else:
+                    blocks = ((data, None, None) for data in iter(lambda: f.read(DECOMPRESS_CHUNK_SIZE), b''))
+                for chunk, decompressor, input_offset in blocks:
+                    pos = chunk.find(b'\n')
+                    while pos != -1:
+                        self.offsets.append(position + pos + 1)
+                        pos = chunk.find(b'\n', pos + 1)
+                    position += len(chunk)
+                    if decompressor and position - self.checkpoints[-1][0] >= CHECKPOINT_BYTES:
+                        self.checkpoints.append((position, input_offset, decompressor.copy()))
+            self.indexed_size = position
+            self.inode = st.st_ino
+
+    def read_bytes(self, start_offset, end_offset):
+        with timed('log_read'):
+            if self.filepath.endswith('.gz'):
+                return self._read_gzip(start_offset, end_offset)
+            return self._read_forward(start_offset, end_offset)
+
+    def _read_gzip(self, start_offset, end_offset):
+        checkpoint = self.checkpoints[bisect.bisect_right(self.checkpoints, (start_offset, float('inf'))) - 1]
+        position, input_offset, decompressor = checkpoint
+        parts = []
+        with open(self.filepath, 'rb') as f:
+            f.seek(input_offset)
+            for data, _, _ in inflate_gzip(f, decompressor.copy() if decompressor else None):
+                block_start, position = position, position + len(data)
+                if position > start_offset:
+                    parts.append(data[max(0, start_offset - block_start):end_offset - block_start])
+                if position >= end_offset:
+                    break
+        return b''.join(parts)
+
+    def _read_forward(self, start_offset, end_offset):
+        # Paging forward ("Load later") continues the open reader instead of starting over
+        with self._lock:
+            if self._reader is None or start_offset < self._reader_position:
+                if self._reader is not None:
+                    self._reader.close()
+                self._reader = open_log(self.filepath)
+                self._reader_position = 0
+            skip = start_offset - self._reader_position
+            while skip > 0:
+                data = self._reader.read(min(skip, DECOMPRESS_CHUNK_SIZE))
+                if not data:
+                    break
+                skip -= len(data)
+            data = read_full(self._reader, end_offset - start_offset)
+            self._reader_position = start_offset + len(data)
+            return data
+
+
+_index_cache = collections.OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_line_index(filepath):
+    """Return the cached LineIndex for a file, building it on first use"""
+    key = os.path.realpath(filepath)
+    with _index_cache_lock:
+        index = _index_cache.get(key)
+        if index is None:
+            index = CompressedLineIndex(key) if is_compressed(key) else LineIndex(key)
+            _index_cache[key] = index
+            while len(_index_cache) > INDEX_CACHE_SIZE:
+                _index_cache.popitem(last=False)
+        else:
+            _index_cache.move_to_end(key)
+    return index
+
+
+def read_log_page(filepath, start=None, count=500, tail=None):
+    """Read a page of lines from the head, an explicit line or the tail of a log"""
+    index = get_line_index(filepath)
+    if tail is not None:
+        count = max(0, min(tail, MAX_PAGE_LINES))
+        index.refresh()
+        start = max(0, index.line_count - count)
+    else:
+        count = max(0, min(count, MAX_PAGE_LINES))
+        start = max(0, start or 0)
+    return index.read_lines(start, count)
+
+
+def read_log_tail(filepath, max_bytes):
+    """Return (the last max_bytes of a log, its full size)"""
+    if is_compressed(filepath):
+        index = get_line_index(filepath)
+        index.refresh()
+        size = index.indexed_size
+        return index.read_bytes(max(0, size - max_bytes), size), size
+    size = os.path.getsize(filepath)
+    with timed('log_tail_read'), open(filepath, 'rb') as f:
+        f.seek(max(0, size - max_bytes))
+        return f.read(max_bytes), size
+
+
+def read_log_chunks(filepath):
+    """Yield a log's content in chunks, decompressing compressed logs as they are read"""
+    with open_log(filepath) as f:
+        yield from iter(lambda: f.read(STREAM_CHUNK_SIZE), b'')
+
+
+def sse_event(event, data, event_id=None):
+    """Format a single Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def complete_length(data):
+    """
+    Bytes of data up to its last newline, or if it has none, up to the end of
+    its last whole UTF-8 character, so a chunk never splits a character
+    """
+    end = data.rfind(b'\n') + 1
+    if end:
+        return end
+    # Step back over continuation bytes (10xxxxxx) to the lead byte of the last character
+    start = len(data) - 1
+    while start > 0 and len(data) - start < 4 and data[start] & 0xC0 == 0x80:
+        start -= 1
+    lead = data[start]
+    size = 2 if lead >> 5 == 0b110 else 3 if lead >> 4 == 0b1110 else 4 if lead >> 3 == 0b11110 else 1
+    return len(data) if start + size <= len(data) else start
+
+
+def tail_events(filepath, offset, is_active):
+    """
+    Yield SSE events for new content in filepath starting at byte offset.
+    is_active() tells whether a job may still write to the file; once it
+    returns False and the file is drained an 'end' event closes the stream.
+    """
+    if is_compressed(filepath):
+        yield from compressed_events(filepath, offset)
+        return
+
+    last_sent = time.time()
+
+    while True:
+        active = is_active()
+        try:
+            with open(filepath, 'rb') as f:
+                f.seek(offset)
+                data = f.read(STREAM_CHUNK_SIZE)
+        except FileNotFoundError:
+            # The job may still be queued and not have created its log yet
+            data = b''
+            if not active:
+                yield sse_event('end', {'offset': offset, 'reason': 'missing'})
+                return
+
+        if data and active and len(data) < STREAM_CHUNK_SIZE:
+            # Hold back a trailing partial line until the writer completes it
+            data = data[:data.rfind(b'\n') + 1]
+        elif len(data) == STREAM_CHUNK_SIZE:
+            # More follows; end this event where the next can pick up without splitting a character
+            data = data[:complete_length(data) or len(data)]
+
+        if data:
+            offset += len(data)
+            LOG_BYTES_SERVED.inc(len(data), endpoint='api_log_stream')
+            yield sse_event('log', {'offset': offset, 'text': data.decode('utf-8', errors='replace')}, event_id=offset)
+            last_sent = time.time()
+            continue
+
+        if not active:
+            yield sse_event('end', {'offset': offset, 'reason': 'complete'})
+            return
+
+        if time.time() - last_sent >= STREAM_KEEPALIVE:
+            yield ': keepalive\n\n'
+            last_sent = time.time()
+        time.sleep(STREAM_POLL_INTERVAL)
+
+
+def compressed_events(filepath, offset):
+    """SSE events for a compressed log: finished, so it is streamed once from offset to the end"""
+    pending = b''
+    with open_log(filepath) as f:
+        f.seek(offset)
+        for data in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            # Carry a split character or partial line over to the next read
+            data = pending + data
+            end = complete_length(data) or len(data)
+            data, pending = data[:end], data[end:]
+            offset += len(data)
+            LOG_BYTES_SERVED.inc(len(data), endpoint='api_log_stream')
+            yield sse_event('log', {'offset': offset, 'text': data.decode('utf-8', errors='replace')}, event_id=offset)
+    if pending:
+        offset += len(pending)
+        LOG_BYTES_SERVED.inc(len(pending), endpoint='api_log_stream')
+        yield sse_event('log', {'offset': offset, 'text': pending.decode('utf-8', errors='replace')}, event_id=offset)
+    yield sse_event('end', {'offset': offset, 'reason': 'complete'})
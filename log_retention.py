@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Retention for the logs directory
+Every directory under logs/ holds one run. A while after a run finished its
+log files are compressed in place (gzip, or zstd when the zstandard module
+is installed), and whole runs are deleted, oldest first, beyond a maximum
+age, run count or total size. Runs whose job is still queued or running,
+and runs written to recently, are never touched. Passes run every few
+minutes, in one server process at a time.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import time
+
+from metrics import LOG_RETENTION, LOGS_BYTES, timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process is assumed
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_POLICY = {
+    # Compress a run's logs once it has been idle this long (0 disables compression)
+    'compress_after_hours': 24,
+    'compression': 'gzip',
+    # Delete runs older than this, beyond this many runs, or beyond this total size (0 disables each)
+    'max_age_days': 0,
+    'max_runs': 0,
+    'max_total_mb': 0,
+    'check_interval': 600
+}
+
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+# Files compressed in a run directory; summaries and inventory snapshots stay readable as they are
+COMPRESSIBLE_SUFFIX = '.log'
+# Runs written to this recently are left alone even without a known job, e.g. command line runs
+MIN_IDLE_SECONDS = 3600
+# First pass after startup, so it doesn't compete with the server starting up
+STARTUP_DELAY = 60
+COPY_CHUNK_SIZE = 1024 * 1024
+# Run names listed in a pass result; the counts always cover every run
+MAX_LISTED_RUNS = 100
+
+
+def compress_file(filepath, method):
+    """
+    Replace filepath with a compressed copy that keeps its mtime, and return
+    the bytes saved. Returns None, leaving the file alone, if it changed
+    while it was being compressed.
+    """
+    st = os.stat(filepath)
+    target = filepath + SUFFIXES[method]
+    fd, tmp = tempfile.mkstemp(prefix=f'.{os.path.basename(target)}.', suffix='.tmp',
+                               dir=os.path.dirname(filepath))
+    try:
+        with open(filepath, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            if method == 'zstd':
+                with zstandard.ZstdCompressor().stream_writer(dst, closefd=False) as writer:
+                    shutil.copyfileobj(src, writer, COPY_CHUNK_SIZE)
+            else:
+                with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6, mtime=int(st.st_mtime)) as writer:
+                    shutil.copyfileobj(src, writer, COPY_CHUNK_SIZE)
+            dst.flush()
+            os.fsync(dst.fileno())
+        now = os.stat(filepath)
+        if (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            os.unlink(tmp)
+            return None
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    # Readers look for the log first and its compressed copy second, so the copy is in place before this
+    os.unlink(filepath)
+    return st.st_size - os.path.getsize(target)
+
+
+def scan_run(path):
+    """Newest file mtime, total size and compressible files of one run directory"""
+    newest, size, files = None, 0, []
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            filepath = os.path.join(root, name)
+            try:
+                st = os.lstat(filepath)
+            except OSError:
+                continue
+            # Links (e.g. to group_vars) and leftovers of an interrupted compression don't count
+            if not stat.S_ISREG(st.st_mode) or name.endswith('.tmp'):
+                continue
+            newest = max(newest or 0, st.st_mtime)
+            size += st.st_size
+            if name.endswith(COMPRESSIBLE_SUFFIX):
+                files.append(filepath)
+    if newest is None:
+        newest = os.stat(path).st_mtime
+    return newest, size, files
+
+
+class LogRetention:
+    """Compresses and prunes the run directories under logs_dir by policy"""
+
+    def __init__(self, logs_dir, state_path, policy=None, is_active=None, on_change=None):
+        self.logs_dir = logs_dir
+        self.state_path = state_path
+        self.policy = dict(DEFAULT_POLICY, **(policy or {}))
+        if self.policy['compression'] not in SUFFIXES or (self.policy['compression'] == 'zstd' and not zstandard):
+            print(f"Log compression '{self.policy['compression']}' is not available; using gzip")
+            self.policy['compression'] = 'gzip'
+        # Tells whether a job may still write to a run directory
+        self.is_active = is_active or (lambda run: False)
+        # Called with the compressed and the deleted run names after each pass that changed anything
+        self.on_change = on_change
+        self.owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return any(self.policy[key] for key in ('compress_after_hours', 'max_age_days', 'max_runs', 'max_total_mb'))
+
+    def start(self):
+        """Start this process's retention thread; safe to call more than once"""
+        if not self.enabled:
+            return
+        with self._lock:
+            # A forked server worker inherits the parent's state but not its thread
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            if self.owner == owner:
+                return
+            self.owner = owner
+            threading.Thread(target=self._loop, name='log-retention', daemon=True).start()
+
+    def _loop(self):
+        time.sleep(min(STARTUP_DELAY, self.policy['check_interval']))
+        while True:
+            try:
+                self.run_pass()
+            except Exception as e:
+                print(f"Log retention pass failed: {e}")
+            time.sleep(self.policy['check_interval'])
+
+    def run_pass(self, dry_run=False):
+        """
+        Compress and delete runs as the policy says and return what was done,
+        or what would be done with dry_run. Returns None if another server
+        process is running a pass.
+        """
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(self.state_path + '.lock', 'w') as lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            with timed('log_retention'):
+                result = self._pass(dry_run)
+        if not dry_run:
+            self._save_state(result)
+        return result
+
+    def _runs(self, now):
+        runs = []
+        for entry in os.scandir(self.logs_dir):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                mtime, size, files = scan_run(entry.path)
+            except OSError:
+                continue
+            busy = now - mtime < MIN_IDLE_SECONDS or self.is_active(entry.name)
+            runs.append({'name': entry.name, 'path': entry.path, 'mtime': mtime, 'size': size,
+                         'files': files, 'busy': busy})
+        runs.sort(key=lambda run: run['mtime'], reverse=True)
+        return runs
+
+    def _pass(self, dry_run):
+        started = time.time()
+        policy = self.policy
+        max_age = policy['max_age_days'] * 86400
+        compress_after = policy['compress_after_hours'] * 3600
+        runs = self._runs(started)
+
+        compressed, saved = [], 0
+        if compress_after:
+            for run in runs:
+                idle = started - run['mtime']
+                if run['busy'] or not run['files'] or idle < compress_after or (max_age and idle > max_age):
+                    continue
+                if not dry_run:
+                    run_saved = 0
+                    for filepath in run['files']:
+                        try:
+                            run_saved += compress_file(filepath, policy['compression']) or 0
+                        except OSError as e:
+                            print(f"Could not compress {filepath}: {e}")
+                    run['size'] -= run_saved
+                    saved += run_saved
+                compressed.append(run['name'])
+
+        # Newest first: once the count or size limit is reached, every older run goes
+        deleted, freed = [], 0
+        kept_runs = kept_bytes = 0
+        over_limit = False
+        for run in runs:
+            if run['busy']:
+                kept_runs += 1
+                kept_bytes += run['size']
+                continue
+            over_limit = over_limit or bool(
+                (policy['max_runs'] and kept_runs >= policy['max_runs'])
+                or (policy['max_total_mb'] and kept_bytes + run['size'] > policy['max_total_mb'] * 1024 * 1024))
+            if over_limit or (max_age and started - run['mtime'] > max_age):
+                if not dry_run:
+                    shutil.rmtree(run['path'], ignore_errors=True)
+                deleted.append(run['name'])
+                freed += run['size']
+            else:
+                kept_runs += 1
+                kept_bytes += run['size']
+
+        if not dry_run:
+            LOG_RETENTION.inc(len(compressed), action='compressed')
+            LOG_RETENTION.inc(len(deleted), action='deleted')
+            LOGS_BYTES.set(kept_bytes)
+            if self.on_change and (compressed or deleted):
+                self.on_change(compressed, deleted)
+
+        return {
+            'started_at': started,
+            'duration': round(time.time() - started, 3),
+            'dry_run': dry_run,
+            'runs': kept_runs,
+            'bytes': kept_bytes,
+            'compressed_runs': len(compressed),
+            'compressed': compressed[:MAX_LISTED_RUNS],
+            'bytes_saved': saved,
+            'deleted_runs': len(deleted),
+            'deleted': deleted[:MAX_LISTED_RUNS],
+            'bytes_freed': freed
+        }
+
+    def _save_state(self, result):
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp, self.state_path)
+
+    def last_pass(self):
+        """Result of the last pass run by any server process, or None"""
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
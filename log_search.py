@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Full-text search over execution logs
+Keeps an SQLite FTS5 index of every run's execution.log in chunks of lines.
+The index only records which words occur in each chunk, and the chunk's text
+is kept compressed next to it, so the index stays a fraction of the size of
+the logs; the lines of a matching chunk are then checked one by one, which
+gives exact phrase matches and line numbers. A log is indexed when its run
+finishes. Indexing is incremental: a log that only grew is indexed from where
+the last pass stopped, so nothing is ever rebuilt from scratch. A catch-up
+pass at startup picks up runs that finished while no server was running and
+drops logs that were deleted.
+"""
+
+import os
+import queue
+import re
+import socket
+import threading
+import time
+import unicodedata
+import zlib
+from datetime import datetime
+
+from ansible_output import ANSI_ESCAPE
+from log_reader import is_compressed, log_variants, open_log, read_full, resolve_log
+from metrics import timed
+from storage import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_logs (
+    id INTEGER PRIMARY KEY,
+    log_path TEXT NOT NULL UNIQUE,
+    task_type TEXT,
+    run_at REAL NOT NULL,
+    inode INTEGER,
+    indexed_bytes INTEGER NOT NULL DEFAULT 0,
+    indexed_lines INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_indexed_logs_run ON indexed_logs (run_at);
+CREATE TABLE IF NOT EXISTS log_chunk_text (
+    id INTEGER PRIMARY KEY,
+    first_line INTEGER NOT NULL,
+    content BLOB NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS log_chunks USING fts5(
+    content, content='', detail=none, tokenize="unicode61 tokenchars '_'"
+);
+"""
+
+LOG_NAME = 'execution.log'
+CHUNK_LINES = 64
+# Chunk rowids are (log id << CHUNK_BITS) | chunk number, so a log's chunks form one rowid range
+CHUNK_BITS = 24
+# Bytes read and committed per indexing step, so a huge log never holds the write lock for long
+BATCH_BYTES = 4 * 1024 * 1024
+MAX_RESULTS = 200
+# Logs fetched at a time, newest first, while a search walks back through them
+LOG_BATCH = 200
+# Candidate chunks checked, and seconds spent, per search request; a query whose candidates
+# rarely hold a matching line returns early with a cursor to continue from
+MAX_SCAN_CHUNKS = 2000
+MAX_SCAN_SECONDS = 1.0
+# Longest line text returned with a hit
+MAX_LINE_CHARS = 500
+
+# Word characters of the FTS tokenizer (unicode61 with '_' as a token character)
+TOKEN = re.compile(r'\w+')
+
+# Run directories are named YYYY-mm-dd_HH-MM-SS_<task type>[_n]
+RUN_DIR = re.compile(r'^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_(.+?)(?:_\d+)?$')
+# A query part: optional '-' for exclusion, then a "quoted phrase" or a bare word
+QUERY_PART = re.compile(r'(-?)(?:"([^"]*)"?|(\S+))')
+
+
+class SearchError(ValueError):
+    """A query that can't be searched for"""
+
+
+def run_info(log_path, mtime):
+    """(task type, run timestamp) from a log's run directory name, falling back to its mtime"""
+    parts = log_path.split('/')
+    match = RUN_DIR.match(parts[-2]) if len(parts) > 1 else None
+    if not match:
+        return None, mtime
+    return match.group(2), datetime.strptime(match.group(1), '%Y-%m-%d_%H-%M-%S').timestamp()
+
+
+def quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fold(text):
+    """Lowercase and strip accents, as the FTS tokenizer does"""
+    if text.isascii():
+        return text.lower()
+    return ''.join(c for c in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(c))
+
+
+def parse_query(query):
+    """
+    Split a search box query into (exclude, tokens, prefix) terms. Words and
+    "quoted phrases" must all occur on a matching line, word* matches a
+    prefix and -word or -"phrase" leaves out lines that contain it.
+    """
+    terms = []
+    for negate, phrase, word in QUERY_PART.findall(query or ''):
+        prefix = bool(word) and word.endswith('*')
+        tokens = TOKEN.findall(fold((word or phrase).rstrip('*')))
+        # Punctuation alone tokenizes to nothing and would match everything
+        if tokens:
+            terms.append((bool(negate), tokens, prefix))
+    if not any(not exclude for exclude, _, _ in terms):
+        raise SearchError('Enter at least one word to search for')
+    return terms
+
+
+def match_expression(terms):
+    """FTS5 expression finding the chunks that contain every word of the included terms"""
+    words = []
+    for exclude, tokens, prefix in terms:
+        if exclude:
+            continue
+        words.extend(quote(token) for token in tokens[:-1])
+        words.append(quote(tokens[-1]) + ('*' if prefix else ''))
+    return ' AND '.join(dict.fromkeys(words))
+
+
+def term_spans(tokens, words, prefix):
+    """Character ranges where a term's tokens occur in a line's (token, start, end) words"""
+    spans = []
+    for i in range(len(words) - len(tokens) + 1):
+        window = words[i:i + len(tokens)]
+        if all(word[0] == token for word, token in zip(window[:-1], tokens)) and (
+                window[-1][0].startswith(tokens[-1]) if prefix else window[-1][0] == tokens[-1]):
+            spans.append([window[0][1], window[-1][2]])
+    return spans
+
+
+def line_matches(line, terms):
+    """Sorted match ranges if the line satisfies every term, else None"""
+    # Most lines of a matching chunk lack some word; skip tokenizing those
+    folded = fold(line)
+    if not all(tokens[0] in folded for exclude, tokens, _ in terms if not exclude):
+        return None
+    words = [(fold(m.group()), m.start(), m.end()) for m in TOKEN.finditer(line)]
+    matches = []
+    for exclude, tokens, prefix in terms:
+        spans = term_spans(tokens, words, prefix)
+        if bool(spans) == exclude:
+            return None
+        matches.extend(spans)
+    return sorted(matches)
+
+
+def clean_line(raw):
+    return ANSI_ESCAPE.sub('', raw.decode('utf-8', errors='replace')).rstrip('\r')
+
+
+def format_cursor(position):
+    """Cursor string for a (run_at, rowid, line) search position"""
+    run_at, rowid, line = position
+    return f"{run_at!r}:{rowid}:{line}"
+
+
+class LogSearchIndex:
+    """Incrementally maintained full-text index of the execution logs under logs_dir"""
+
+    def __init__(self, logs_dir, db_path, is_active=None):
+        self.logs_dir = logs_dir
+        self.db_path = db_path
+        # Tells whether a job may still append to a log; its unfinished last line waits until it does
+        self.is_active = is_active or (lambda log_path: False)
+        self.owner = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def start(self):
+        """Start this process's indexer thread, which first catches up; safe to call more than once"""
+        with self._lock:
+            # A forked server worker inherits the parent's state but not its thread
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            if self.owner == owner:
+                return
+            self.owner = owner
+            threading.Thread(target=self._loop, name='log-indexer', daemon=True).start()
+
+    def enqueue(self, log_path):
+        """Index a log in the background, e.g. once its run finished"""
+        self._queue.put(log_path)
+
+    def _loop(self):
+        try:
+            self.catch_up()
+        except Exception as e:
+            print(f"Log search catch-up failed: {e}")
+        while True:
+            log_path = self._queue.get()
+            try:
+                self.index_log(log_path, final=True)
+            except Exception as e:
+                print(f"Could not index {log_path}: {e}")
+
+    def catch_up(self):
+        """Index every log that changed since it was last indexed and forget deleted ones"""
+        with timed('log_search_catch_up'):
+            conn = self._conn()
+            known = {row['log_path']: row for row in conn.execute(
+                'SELECT log_path, indexed_bytes, indexed_at FROM indexed_logs')}
+            found = set()
+            for root, dirs, files in os.walk(self.logs_dir):
+                name = next((name for name in log_variants(LOG_NAME) if name in files), None)
+                if name is None:
+                    continue
+                log_path = os.path.relpath(os.path.join(root, LOG_NAME), self.logs_dir).replace(os.sep, '/')
+                found.add(log_path)
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                row = known.get(log_path)
+                if row is None:
+                    stale = True
+                elif is_compressed(name):
+                    # Compressing keeps the log's mtime; only a pass before the last write missed anything
+                    stale = (row['indexed_at'] or 0) < st.st_mtime
+                else:
+                    stale = row['indexed_bytes'] != st.st_size
+                if stale:
+                    self.index_log(log_path, final=not self.is_active(log_path))
+            for log_path in set(known) - found:
+                self.forget(log_path)
+
+    def forget(self, log_path):
+        """Drop a log and its chunks from the index"""
+        conn = self._conn()
+        with transaction(conn):
+            row = conn.execute('SELECT id FROM indexed_logs WHERE log_path = ?', (log_path,)).fetchone()
+            if row:
+                self._delete_chunks(conn, row['id'])
+                conn.execute('DELETE FROM indexed_logs WHERE id = ?', (row['id'],))
+
+    def _delete_chunks(self, conn, log_id):
+        # The FTS table keeps no text of its own, so removing a chunk means handing it the words again
+        bounds = (log_id << CHUNK_BITS, (log_id + 1) << CHUNK_BITS)
+        rows = conn.execute('SELECT id, content FROM log_chunk_text WHERE id >= ? AND id < ?', bounds)
+        conn.executemany("INSERT INTO log_chunks (log_chunks, rowid, content) VALUES ('delete', ?, ?)",
+                         ((row['id'], zlib.decompress(row['content']).decode('utf-8')) for row in rows.fetchall()))
+        conn.execute('DELETE FROM log_chunk_text WHERE id >= ? AND id < ?', bounds)
+
+    def _entry(self, conn, log_path, st, compressed):
+        """The log's index row, starting over if the file was replaced or truncated"""
+        row = conn.execute('SELECT * FROM indexed_logs WHERE log_path = ?', (log_path,)).fetchone()
+        # A compressed copy has its own inode and size but the same content, so it continues the index
+        if row and not compressed and (row['inode'] != st.st_ino or st.st_size < row['indexed_bytes']):
+            self._delete_chunks(conn, row['id'])
+            conn.execute('DELETE FROM indexed_logs WHERE id = ?', (row['id'],))
+            row = None
+        if row is None:
+            task_type, run_at = run_info(log_path, st.st_mtime)
+            conn.execute('INSERT INTO indexed_logs (log_path, task_type, run_at, inode) VALUES (?, ?, ?, ?)',
+                         (log_path, task_type, run_at, st.st_ino))
+            row = conn.execute('SELECT * FROM indexed_logs WHERE log_path = ?', (log_path,)).fetchone()
+        return row
+
+    def index_log(self, log_path, final=False):
+        """
+        Index what was appended to a log since the last call and return the
+        number of new lines. Only complete lines are indexed unless final is
+        set, in which case a last line without a newline is included too.
+        Logs compressed by retention are read through their compressed copy.
+        """
+        filepath = resolve_log(os.path.join(self.logs_dir, log_path))
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            self.forget(log_path)
+            return 0
+
+        conn = self._conn()
+        with transaction(conn):
+            row = self._entry(conn, log_path, st, is_compressed(filepath))
+        offset = row['indexed_bytes']
+        added = 0
+        with timed('log_search_index'), open_log(filepath) as f:
+            # Compressed logs can only seek forward, so unfinished lines are carried over rather than re-read
+            f.seek(offset)
+            pending = b''
+            while True:
+                block = read_full(f, BATCH_BYTES)
+                at_eof = len(block) < BATCH_BYTES
+                data = pending + block
+                if at_eof and final:
+                    end = len(data)
+                else:
+                    end = data.rfind(b'\n') + 1
+                    if end == 0 and len(data) >= BATCH_BYTES:
+                        # A single line longer than a batch; index it in pieces
+                        end = len(data)
+                if end:
+                    lines = [clean_line(line) for line in data[:end].split(b'\n')]
+                    if data[end - 1:end] == b'\n':
+                        lines.pop()
+                    if not self._append(conn, row['id'], offset, offset + end, lines):
+                        # Another process is indexing the same log
+                        break
+                    offset += end
+                    added += len(lines)
+                pending = data[end:]
+                if at_eof:
+                    break
+        if not added:
+            with transaction(conn):
+                conn.execute('UPDATE indexed_logs SET indexed_at = ? WHERE id = ?', (time.time(), row['id']))
+        return added
+
+    def _append(self, conn, log_id, offset, new_offset, lines):
+        """Store the chunks for lines read from offset; False if offset is no longer where the index ends"""
+        with transaction(conn):
+            row = conn.execute('SELECT indexed_bytes, indexed_lines, chunks FROM indexed_logs WHERE id = ?',
+                               (log_id,)).fetchone()
+            if row is None or row['indexed_bytes'] != offset:
+                return False
+            chunk, first_line = row['chunks'], row['indexed_lines']
+            for start in range(0, len(lines), CHUNK_LINES):
+                rowid = (log_id << CHUNK_BITS) | chunk
+                content = '\n'.join(lines[start:start + CHUNK_LINES])
+                conn.execute('INSERT INTO log_chunks (rowid, content) VALUES (?, ?)', (rowid, content))
+                conn.execute('INSERT INTO log_chunk_text (id, first_line, content) VALUES (?, ?, ?)',
+                             (rowid, first_line + start, zlib.compress(content.encode('utf-8'))))
+                chunk += 1
+            conn.execute('UPDATE indexed_logs SET indexed_bytes = ?, indexed_lines = ?, chunks = ?, '
+                         'indexed_at = ? WHERE id = ?',
+                         (new_offset, first_line + len(lines), chunk, time.time(), log_id))
+        return True
+
+    def search(self, query, task_type=None, since=None, until=None, limit=50, cursor=None):
+        """
+        At most limit matching lines, newest run first, and the cursor of the
+        next page or None on the last one. The cursor is 'run_at:rowid:line',
+        where the next page starts: line is the index of the next line to
+        check in chunk rowid, or 0 once that chunk is done.
+        """
+        terms = parse_query(query)
+        expression = match_expression(terms)
+        limit = max(1, min(limit, MAX_RESULTS))
+        clauses, args = [], []
+        if task_type:
+            clauses.append('task_type = ?')
+            args.append(task_type)
+        if since is not None:
+            clauses.append('run_at >= ?')
+            args.append(since)
+        if until is not None:
+            clauses.append('run_at < ?')
+            args.append(until)
+
+        after = None
+        if cursor:
+            try:
+                run_at, rowid, line = (cursor.split(':') + ['0'])[:3]
+                after = (float(run_at), int(rowid), int(line))
+            except ValueError:
+                raise SearchError('Invalid cursor')
+
+        conn = self._conn()
+        results = []
+        scanned = 0
+        deadline = time.monotonic() + MAX_SCAN_SECONDS
+        with timed('log_search_query'):
+            while True:
+                # Walk the logs newest first through the run_at index, one batch at a time
+                where, where_args = list(clauses), list(args)
+                if after:
+                    where.append('(run_at < ? OR (run_at = ? AND id <= ?))')
+                    where_args += [after[0], after[0], after[1] >> CHUNK_BITS]
+                logs = conn.execute(
+                    f"SELECT id, log_path, task_type, run_at FROM indexed_logs "
+                    f"WHERE {' AND '.join(where) or '1'} ORDER BY run_at DESC, id DESC LIMIT ?",
+                    where_args + [LOG_BATCH]).fetchall()
+
+                for log in logs:
+                    first = log['id'] << CHUNK_BITS
+                    last = first | ((1 << CHUNK_BITS) - 1)
+                    start = first
+                    if after and after[1] >> CHUNK_BITS == log['id']:
+                        # Resume inside a partly checked chunk, or after a finished one
+                        start = after[1] if after[2] else after[1] + 1
+                    chunks = conn.execute(
+                        'SELECT rowid FROM log_chunks WHERE log_chunks MATCH ? AND rowid BETWEEN ? AND ? ORDER BY rowid',
+                        (expression, start, last)).fetchall()
+                    for (rowid,) in chunks:
+                        if scanned and (scanned >= MAX_SCAN_CHUNKS or time.monotonic() > deadline):
+                            return results, format_cursor(after)
+                        scanned += 1
+                        skip = after[2] if after and after[1] == rowid else 0
+                        chunk = conn.execute('SELECT first_line, content FROM log_chunk_text WHERE id = ?',
+                                             (rowid,)).fetchone()
+                        after = (log['run_at'], rowid, 0)
+                        if chunk is None:
+                            continue
+                        lines = zlib.decompress(chunk['content']).decode('utf-8').split('\n')
+                        for index in range(skip, len(lines)):
+                            matches = line_matches(lines[index], terms)
+                            if matches is None:
+                                continue
+                            results.append({
+                                'log_path': log['log_path'],
+                                'task_type': log['task_type'],
+                                'run_at': log['run_at'],
+                                'line': chunk['first_line'] + 1 + index,
+                                'text': lines[index][:MAX_LINE_CHARS],
+                                'matches': [m for m in matches if m[0] < MAX_LINE_CHARS]
+                            })
+                            if len(results) >= limit:
+                                # Full page: the next one resumes at the following line
+                                if index + 1 < len(lines):
+                                    return results, format_cursor((log['run_at'], rowid, index + 1))
+                                return results, format_cursor(after)
+                    # Done with this log; logs without a candidate chunk count towards the time budget only
+                    after = (log['run_at'], last, 0)
+                    if time.monotonic() > deadline:
+                        return results, format_cursor(after)
+
+                if len(logs) < LOG_BATCH:
+                    return results, None
+
+    def stats(self):
+        """Indexed logs, lines and bytes"""
+        row = self._conn().execute(
+            'SELECT COUNT(*) AS logs, COALESCE(SUM(indexed_lines), 0) AS lines, '
+            'COALESCE(SUM(indexed_bytes), 0) AS bytes FROM indexed_logs').fetchone()
+        return dict(row)
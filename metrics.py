@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+In-process metrics in the Prometheus text exposition format
+Counters, gauges and histograms with labels, kept in a module-level registry
+that /metrics renders. Modules record into the shared metrics below; nothing
+is exported unless something scrapes the endpoint.
+
+The registry lives in process memory. Under gunicorn each worker process has
+its own, and a scrape is answered by whichever worker takes the request, so
+counters and histograms cover that worker only; automation_process_info tells
+which one it was. Job counts are read from the shared job queue and are the
+same in every worker.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+JOB_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    """Base class: a named family of samples keyed by label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value)"""
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield '', key, (), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.label_names, key, extra)} {format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def replace(self, values):
+        """Swap in a fresh {label values tuple: value} snapshot, e.g. at scrape time"""
+        with self._lock:
+            self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state['counts']))) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                yield '_bucket', key, (('le', format_value(float(bound))),), cumulative
+            yield '_bucket', key, (('le', '+Inf'),), state['count']
+            yield '_sum', key, (), state['sum']
+            yield '_count', key, (), state['count']
+
+
+class Registry:
+    """Ordered set of metrics plus collectors run just before rendering"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() is called on every scrape to refresh gauges that are cheaper to compute on demand"""
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# HTTP
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'automation_http_request_duration_seconds', 'Time spent handling requests',
+    ('endpoint', 'method', 'status')))
+LOG_BYTES_SERVED = REGISTRY.register(Counter(
+    'automation_log_bytes_served_total', 'Bytes of log content sent to clients', ('endpoint',)))
+
+# Jobs
+JOBS = REGISTRY.register(Gauge(
+    'automation_jobs', 'Jobs currently known to the job manager', ('state', 'task_type')))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    'automation_jobs_finished_total', 'Jobs that finished', ('task_type', 'result')))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    'automation_job_duration_seconds', 'Job run time from start to finish', ('task_type', 'result'),
+    buckets=JOB_BUCKETS))
+JOB_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    'automation_job_queue_wait_seconds', 'Time jobs spent queued before a worker started them', ('task_type',),
+    buckets=JOB_BUCKETS))
+
+# Subprocesses
+SPAWN_SECONDS = REGISTRY.register(Histogram(
+    'automation_subprocess_spawn_seconds', 'Time to spawn a task subprocess', ('task_type',)))
+SUBPROCESSES = REGISTRY.register(Gauge(
+    'automation_subprocesses_running', 'Task subprocesses currently alive', ('task_type',)))
+
+# Log retention
+LOG_RETENTION = REGISTRY.register(Counter(
+    'automation_log_retention_runs_total', 'Runs compressed or deleted by log retention', ('action',)))
+LOGS_BYTES = REGISTRY.register(Gauge(
+    'automation_logs_bytes', 'Size of the run directories under logs/ after the last retention pass'))
+
+# Process
+PROCESS_INFO = REGISTRY.register(Gauge(
+    'automation_process_info', 'Server process that answered this scrape; other metrics count this process only',
+    ('pid',)))
+
+# Filesystem and storage operations (directory scans, catalog refreshes, file reads)
+OPERATION_SECONDS = REGISTRY.register(Histogram(
+    'automation_operation_duration_seconds', 'Time spent in instrumented internal operations', ('operation',)))
+
+
+def timed(operation):
+    """Context manager recording the duration of an internal operation"""
+    return OPERATION_SECONDS.time(operation=operation)
+
+
+def collect_process_info():
+    # Read at scrape time: a forked worker has a different pid than the process that imported this module
+    PROCESS_INFO.replace({(os.getpid(),): 1})
+
+
+REGISTRY.add_collector(collect_process_info)
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Run history store
+Records every job execution with structured metadata in SQLite so past runs
+can be filtered, paged and aggregated with indexed queries. Per-host results
+parsed from Ansible output are kept alongside, keyed by the run's log path.
+"""
+
+import json
+import time
+
+from ansible_output import RECAP_FIELDS
+from storage import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    job_id TEXT PRIMARY KEY,
+    user TEXT,
+    task_type TEXT NOT NULL,
+    target_file TEXT,
+    inventory TEXT,
+    forks INTEGER,
+    verbose INTEGER,
+    status TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration REAL,
+    exit_code INTEGER,
+    error TEXT,
+    log_path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_submitted ON runs (submitted_at);
+CREATE INDEX IF NOT EXISTS idx_runs_user ON runs (user, submitted_at);
+CREATE INDEX IF NOT EXISTS idx_runs_task_type ON runs (task_type, submitted_at);
+CREATE INDEX IF NOT EXISTS idx_runs_target ON runs (target_file, submitted_at);
+CREATE INDEX IF NOT EXISTS idx_runs_inventory ON runs (inventory, submitted_at);
+CREATE INDEX IF NOT EXISTS idx_runs_duration ON runs (duration);
+CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status);
+CREATE INDEX IF NOT EXISTS idx_runs_log_path ON runs (log_path);
+
+CREATE TABLE IF NOT EXISTS host_results (
+    log_path TEXT NOT NULL,
+    job_id TEXT,
+    host TEXT NOT NULL,
+    ok INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER NOT NULL DEFAULT 0,
+    unreachable INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    rescued INTEGER NOT NULL DEFAULT 0,
+    ignored INTEGER NOT NULL DEFAULT 0,
+    failed_tasks TEXT,
+    complete INTEGER NOT NULL DEFAULT 0,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (log_path, host)
+);
+CREATE INDEX IF NOT EXISTS idx_host_results_host ON host_results (host, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_host_results_job ON host_results (job_id);
+"""
+
+# Columns that can be filtered on with an exact match
+FILTER_COLUMNS = ('user', 'task_type', 'target_file', 'inventory', 'status')
+
+# Columns the stats endpoint can group by
+GROUP_COLUMNS = ('user', 'task_type', 'target_file', 'inventory')
+
+SORT_ORDERS = {
+    'newest': 'submitted_at DESC',
+    'oldest': 'submitted_at ASC',
+    'slowest': 'duration DESC',
+    'fastest': 'duration ASC'
+}
+
+FAILED_CONDITION = '(exit_code != 0 OR error IS NOT NULL)'
+
+
+class RunHistory:
+    """SQLite-backed record of job executions"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def record(self, job):
+        """Insert or update the row for a job from its current state"""
+        params = job.params or {}
+        # The queued notification is sent after the job is committed, so a worker may have
+        # recorded it as running already; a queued state never replaces a later one
+        verb = 'INSERT OR IGNORE' if job.status == 'queued' else 'INSERT OR REPLACE'
+        self._conn().execute(
+            f'{verb} INTO runs (job_id, user, task_type, target_file, inventory, forks, verbose, status, '
+            'submitted_at, started_at, finished_at, duration, exit_code, error, log_path) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job.id, job.user, job.task_type, params.get('target_file'), params.get('inventory'),
+             params.get('forks'), int(bool(params.get('verbose'))), job.status,
+             job.submitted_at, job.started_at, job.finished_at,
+             job.duration if job.finished_at else None, job.return_code, job.error, job.log_path))
+
+    def _where(self, filters):
+        clauses, args = [], []
+        for column in FILTER_COLUMNS:
+            value = filters.get(column)
+            if value:
+                clauses.append(f'{column} = ?')
+                args.append(value)
+        if filters.get('since') is not None:
+            clauses.append('submitted_at >= ?')
+            args.append(filters['since'])
+        if filters.get('until') is not None:
+            clauses.append('submitted_at < ?')
+            args.append(filters['until'])
+        if filters.get('result') == 'failed':
+            clauses.append(f"status = 'finished' AND {FAILED_CONDITION}")
+        elif filters.get('result') == 'success':
+            clauses.append("status = 'finished' AND exit_code = 0 AND error IS NULL")
+        where = ' AND '.join(clauses) if clauses else '1'
+        return where, args
+
+    def query(self, filters=None, page=1, per_page=50, sort='newest'):
+        """Return (rows, total) for one page of runs matching filters"""
+        where, args = self._where(filters or {})
+        order = SORT_ORDERS.get(sort, SORT_ORDERS['newest'])
+        if sort in ('slowest', 'fastest'):
+            where += ' AND duration IS NOT NULL'
+        page = max(1, page)
+        per_page = max(1, min(per_page, 500))
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM runs WHERE {where}', args).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT * FROM runs WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+            args + [per_page, (page - 1) * per_page]).fetchall()
+        return [dict(row) for row in rows], total
+
+    def stats(self, group_by='target_file', filters=None, limit=50):
+        """Run count, failure rate and durations per group, slowest first"""
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f'Cannot group by {group_by}')
+        where, args = self._where(filters or {})
+        rows = self._conn().execute(
+            f"SELECT {group_by} AS name, COUNT(*) AS runs, "
+            f"SUM(CASE WHEN status = 'finished' AND {FAILED_CONDITION} THEN 1 ELSE 0 END) AS failures, "
+            f"AVG(duration) AS avg_duration, MAX(duration) AS max_duration "
+            f"FROM runs WHERE {where} GROUP BY {group_by} ORDER BY avg_duration DESC LIMIT ?",
+            args + [limit]).fetchall()
+        result = []
+        for row in rows:
+            entry = dict(row)
+            entry['failure_rate'] = round(entry['failures'] / entry['runs'], 4) if entry['runs'] else 0
+            for key in ('avg_duration', 'max_duration'):
+                if entry[key] is not None:
+                    entry[key] = round(entry[key], 3)
+            result.append(entry)
+        return result
+
+    # Per-host results
+
+    def record_hosts(self, log_path, summary, job_id=None):
+        """Replace the per-host results of the run writing to log_path"""
+        now = time.time()
+        conn = self._conn()
+        with transaction(conn):
+            conn.execute('DELETE FROM host_results WHERE log_path = ?', (log_path,))
+            conn.executemany(
+                f"INSERT INTO host_results (log_path, job_id, host, {', '.join(RECAP_FIELDS)}, failed_tasks, "
+                f"complete, recorded_at) VALUES (?, ?, ?, {', '.join('?' * len(RECAP_FIELDS))}, ?, ?, ?)",
+                [(log_path, job_id, host) + tuple(result.get(key, 0) for key in RECAP_FIELDS)
+                 + (json.dumps(result.get('failed_tasks', [])), int(summary.get('complete', False)), now)
+                 for host, result in summary.get('hosts', {}).items()])
+
+    def indexed_log_paths(self):
+        """Log paths that already have host results"""
+        return {row[0] for row in self._conn().execute('SELECT DISTINCT log_path FROM host_results')}
+
+    def _host_rows(self, rows):
+        result = []
+        for row in rows:
+            entry = dict(row)
+            entry['failed_tasks'] = json.loads(entry['failed_tasks'] or '[]')
+            entry['complete'] = bool(entry['complete'])
+            result.append(entry)
+        return result
+
+    def host_results(self, log_path, failed_only=False):
+        """Per-host results of one run, failures first"""
+        where = 'log_path = ?' + (' AND (failed > 0 OR unreachable > 0)' if failed_only else '')
+        rows = self._conn().execute(
+            f'SELECT * FROM host_results WHERE {where} ORDER BY (failed + unreachable) > 0 DESC, host',
+            (log_path,)).fetchall()
+        return self._host_rows(rows)
+
+    def host_history(self, host, limit=50):
+        """Recent results for one host across runs, newest first"""
+        rows = self._conn().execute(
+            'SELECT h.*, r.task_type, r.target_file, r.inventory, r.submitted_at FROM host_results h '
+            'LEFT JOIN runs r ON r.log_path = h.log_path WHERE h.host = ? ORDER BY h.recorded_at DESC LIMIT ?',
+            (host, limit)).fetchall()
+        return self._host_rows(rows)
+
+    def outcomes(self, log_paths):
+        """Host totals for several runs: {log_path: {hosts, failed_hosts, unreachable_hosts}}"""
+        log_paths = [path for path in log_paths if path]
+        if not log_paths:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT log_path, COUNT(*) AS hosts, SUM(failed > 0) AS failed_hosts, "
+            f"SUM(unreachable > 0) AS unreachable_hosts FROM host_results "
+            f"WHERE log_path IN ({','.join('?' * len(log_paths))}) GROUP BY log_path", log_paths).fetchall()
+        return {row['log_path']: {key: row[key] for key in ('hosts', 'failed_hosts', 'unreachable_hosts')}
+                for row in rows}
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+Shared task runner for Ansible playbooks, PowerShell and shell scripts
+Builds the command for a task type, runs it and writes its execution log.
+The dashboard calls run_task() directly from its worker threads; the
+run_*.py scripts are thin command line front-ends over main().
+"""
+
+import argparse
+import datetime
+import json
+import os
+import math
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from ansible_output import ResultParser, parse_recap, format_recap
+from inventory_model import InventoryCache
+from metrics import SPAWN_SECONDS, SUBPROCESSES
+
+PUMP_CHUNK_SIZE = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# Sharding: don't split below this many hosts per shard, and allow this many
+# forks per CPU core across all shards (forks mostly wait on SSH, not the CPU)
+MIN_HOSTS_PER_SHARD = 10
+FORKS_PER_CPU = 4
+MAX_AUTO_FORKS = 50
+
+# Per-host results are parsed from the output as it streams and saved next to
+# execution.log, at most this often while the run is going
+SUMMARY_FILE = 'summary.json'
+SUMMARY_INTERVAL = 5.0
+
+# After a timeout or cancel, children get SIGTERM and this long to exit before SIGKILL
+KILL_GRACE_SECONDS = 10
+WATCH_INTERVAL = 1.0
+
+# Resource limits a task's children can run under: limit name -> (rlimit, multiplier)
+RLIMITS = {
+    'cpu_seconds': ('RLIMIT_CPU', 1),
+    'address_space_mb': ('RLIMIT_AS', 1024 * 1024),
+    'open_files': ('RLIMIT_NOFILE', 1)
+}
+
+inventory_cache = InventoryCache()
+
+
+class TaskTimeout(Exception):
+    """A task ran longer than its timeout and was killed"""
+
+
+class TaskCancelled(Exception):
+    """A task was cancelled while running and was killed"""
+
+
+class OutputPump:
+    """
+    Copies a child's output to one or more binary sinks in large chunks.
+    Sinks are flushed at most every flush_interval seconds (and whenever the
+    child goes quiet), instead of once per line. With timestamps enabled each
+    line is prefixed with the time it was read.
+    """
+
+    def __init__(self, sinks, flush_interval=DEFAULT_FLUSH_INTERVAL, timestamps=False, chunk_size=PUMP_CHUNK_SIZE):
+        self.sinks = sinks
+        self.flush_interval = flush_interval
+        self.timestamps = timestamps
+        self.chunk_size = chunk_size
+        self.bytes_copied = 0
+        self._at_line_start = True
+
+    def _stamp(self, chunk):
+        prefix = datetime.datetime.now().strftime('[%H:%M:%S.%f')[:-3].encode() + b'] '
+        lines = chunk.split(b'\n')
+        out = []
+        for i, line in enumerate(lines):
+            last = i == len(lines) - 1
+            if last and not line:
+                break
+            if self._at_line_start:
+                out.append(prefix)
+            out.append(line)
+            if not last:
+                out.append(b'\n')
+            self._at_line_start = not last
+        return b''.join(out)
+
+    def _write(self, data):
+        for sink in self.sinks:
+            sink.write(data)
+
+    def _flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def run(self, fd):
+        """Copy from file descriptor fd until EOF"""
+        last_flush = time.monotonic()
+        pending = False
+        while True:
+            if pending:
+                # Wake up to flush if the child stays quiet past the interval
+                timeout = max(0, self.flush_interval - (time.monotonic() - last_flush))
+                ready, _, _ = select.select([fd], [], [], timeout)
+                if not ready:
+                    self._flush()
+                    last_flush = time.monotonic()
+                    pending = False
+                    continue
+
+            chunk = os.read(fd, self.chunk_size)
+            if not chunk:
+                break
+            self.bytes_copied += len(chunk)
+            self._write(self._stamp(chunk) if self.timestamps else chunk)
+            pending = True
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+                pending = False
+        self._flush()
+
+
+class PrefixedSink:
+    """
+    Binary sink that writes whole lines, each with a prefix, to a shared
+    target under a lock so several pumps can merge into one stream.
+    """
+
+    def __init__(self, target, prefix, lock):
+        self.target = target
+        self.prefix = prefix
+        self.lock = lock
+        self._partial = b''
+
+    def write(self, data):
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        if lines:
+            with self.lock:
+                self.target.write(b''.join(self.prefix + line + b'\n' for line in lines))
+
+    def flush(self):
+        with self.lock:
+            self.target.flush()
+
+    def close(self):
+        """Write out a trailing line that had no newline"""
+        if self._partial:
+            self.write(b'\n')
+
+
+def write_summary(log_dir, summary):
+    """Atomically replace log_dir/summary.json"""
+    path = os.path.join(log_dir, SUMMARY_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(summary, f)
+    os.replace(tmp, path)
+
+
+def load_summary(log_dir):
+    """Read log_dir/summary.json, or None if the run has none"""
+    try:
+        with open(os.path.join(log_dir, SUMMARY_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ResultRecorder:
+    """
+    Output sink that feeds a ResultParser and keeps summary.json in log_dir
+    current: rewritten on flush at most every interval seconds while output
+    arrives, and once more when the run ends.
+    """
+
+    def __init__(self, log_dir, interval=SUMMARY_INTERVAL):
+        self.log_dir = log_dir
+        self.interval = interval
+        self.parser = ResultParser()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_write = 0
+
+    def write(self, data):
+        with self._lock:
+            self.parser.write(data)
+            self._dirty = True
+
+    def flush(self):
+        if self._dirty and time.monotonic() - self._last_write >= self.interval:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            summary = self.parser.summary()
+            self._dirty = False
+            self._last_write = time.monotonic()
+        write_summary(self.log_dir, summary)
+
+    def close(self):
+        with self._lock:
+            self.parser.close()
+        self.save()
+
+
+def limit_child(limits):
+    """
+    Return a preexec_fn applying rlimits and a nice level in the child before
+    it execs, or None when no limits are set. Only plain system calls run
+    there, since the parent has other threads.
+    """
+    rlimits = []
+    for key, (name, multiplier) in RLIMITS.items():
+        if limits.get(key) and resource is not None:
+            value = int(limits[key]) * multiplier
+            rlimits.append((getattr(resource, name), value))
+    nice = int(limits.get('nice') or 0)
+    if not rlimits and not nice:
+        return None
+
+    def apply():
+        for rlimit, value in rlimits:
+            # Never raise the hard limit, which an unprivileged process can't do
+            hard = resource.getrlimit(rlimit)[1]
+            value = value if hard == resource.RLIM_INFINITY else min(value, hard)
+            resource.setrlimit(rlimit, (value, hard))
+        if nice:
+            os.nice(nice)
+    return apply
+
+
+def ionice_prefix(limits):
+    """ionice command prefix for the configured I/O class, e.g. 'idle' or 'best-effort:7'"""
+    setting = limits.get('ionice')
+    if not setting or not shutil.which('ionice'):
+        return []
+    classes = {'realtime': '1', 'best-effort': '2', 'idle': '3'}
+    io_class, _, level = str(setting).partition(':')
+    prefix = ['ionice', '-c', classes.get(io_class, io_class)]
+    if level:
+        prefix += ['-n', level]
+    return prefix
+
+
+class ProcessGuard:
+    """
+    Watches a task's child processes from a background thread and kills
+    their process groups once the timeout passes or should_cancel() returns
+    a reason. reason records why the task was stopped, if it was.
+    """
+
+    def __init__(self, timeout=None, should_cancel=None, interval=WATCH_INTERVAL):
+        self.timeout = timeout
+        self.should_cancel = should_cancel
+        self.interval = interval
+        self.processes = []
+        self.reason = None
+        self._started = time.monotonic()
+        self._done = threading.Event()
+        self._thread = None
+
+    def add(self, process):
+        self.processes.append(process)
+        if self._thread is None and (self.timeout or self.should_cancel):
+            self._thread = threading.Thread(target=self._watch, name='process-guard', daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        while not self._done.wait(self.interval):
+            if self.timeout and time.monotonic() - self._started > self.timeout:
+                self.stop(TaskTimeout(f"Timed out after {self.timeout:g}s"))
+            elif self.should_cancel:
+                try:
+                    cancelled_by = self.should_cancel()
+                except Exception as e:
+                    print(f"Cancel check failed: {e}")
+                    continue
+                if cancelled_by:
+                    self.stop(TaskCancelled(f"Cancelled by {cancelled_by}"))
+
+    def stop(self, reason):
+        """Terminate every child process group, escalating to SIGKILL after a grace period"""
+        self.reason = reason
+        self._done.set()
+        self._signal(signal.SIGTERM)
+        deadline = time.monotonic() + KILL_GRACE_SECONDS
+        while time.monotonic() < deadline and any(p.poll() is None for p in self.processes):
+            time.sleep(0.1)
+        self._signal(signal.SIGKILL)
+
+    def _signal(self, sig):
+        for process in self.processes:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, sig)
+                except ProcessLookupError:
+                    pass
+
+    def stop_watching(self):
+        """End the watch thread; safe to call more than once"""
+        self._done.set()
+
+    def close(self):
+        """Stop watching; raises the stop reason if the task was killed"""
+        self.stop_watching()
+        if self.reason:
+            raise self.reason
+
+
+def spawn(cmd, task_type, limits=None, guard=None):
+    """Start a task's child process with output piped back, recording spawn time"""
+    limits = limits or {}
+    prefix = ionice_prefix(limits)
+    if prefix and not shutil.which(cmd[0]):
+        # Report a missing command as such, not as a failing ionice
+        raise FileNotFoundError(cmd[0])
+    start = time.perf_counter()
+    # Each child leads its own process group so a kill reaches everything it started
+    process = subprocess.Popen(prefix + cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               start_new_session=True, preexec_fn=limit_child(limits))
+    SPAWN_SECONDS.observe(time.perf_counter() - start, task_type=task_type)
+    SUBPROCESSES.inc(task_type=task_type)
+    if guard:
+        guard.add(process)
+    return process
+
+
+def reap(process, task_type):
+    """Close a child's pipe and wait for it so no zombie is left behind"""
+    process.stdout.close()
+    process.wait()
+    SUBPROCESSES.dec(task_type=task_type)
+
+
+# Command builders
+
+def build_ansible_command(target, inventory, forks='1', verbose=False):
+    cmd = ['ansible-playbook', target, '-i', inventory, '--forks', str(forks)]
+    if verbose:
+        cmd.append('-vvv')  # Add verbose flag if enabled
+    return cmd
+
+
+def build_powershell_command(target, inventory, forks='1', verbose=False):
+    # Assuming pwsh for PowerShell Core on Linux/Mac
+    return ['pwsh', '-File', target, '-Inventory', inventory]
+
+
+def build_shell_command(target, inventory, forks='1', verbose=False):
+    return ['/bin/bash', target, inventory]
+
+
+def simulate_powershell(target, log, echo=None):
+    """Stand-in output used when pwsh is not installed; echo is the command line's stdout, if any"""
+    lines = [
+        "pwsh command not found. Simulating execution for demo.\n",
+        f"Simulating PowerShell script {os.path.basename(target)}...\n",
+        "Reading inventory...\n",
+        "Processing items...\n",
+        "Done.\n"
+    ]
+    for line in lines:
+        log.write(line)
+        if echo:
+            echo.write(line.encode())
+    if echo:
+        echo.flush()
+    return 0
+
+
+# Registry of task types: how to build the command and how the CLI behaves
+TASK_TYPES = {
+    'ansible': {
+        'name': 'Ansible',
+        'extension': 'yml',
+        'build': build_ansible_command,
+        'description': 'Run Ansible Playbook',
+        'target_help': 'Path to playbook file',
+        'target_label': 'Playbook',
+        'error_prefix': 'Error executing command',
+        'exit_on_failure': True,
+        'shardable': True,
+        # Output is parsed into per-host results in summary.json
+        'results': True
+    },
+    'powershell': {
+        'name': 'PowerShell',
+        'extension': 'ps1',
+        'build': build_powershell_command,
+        'missing_command': simulate_powershell,
+        'description': 'Run PowerShell Script',
+        'target_help': 'Path to script file (reusing argument name)',
+        'target_label': 'Script',
+        'error_prefix': 'Error executing PowerShell script',
+        # Don't exit with error to avoid crashing the wrapper if pwsh is missing, just log it
+        'exit_on_failure': False
+    },
+    'shell': {
+        'name': 'Shell',
+        'extension': 'sh',
+        'build': build_shell_command,
+        'description': 'Run Shell Script',
+        'target_help': 'Path to script file (reusing playbooks arg)',
+        'target_label': 'Script',
+        'error_prefix': 'Error executing shell script',
+        'exit_on_failure': False
+    }
+}
+
+
+def default_log_dir(task_type):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    return os.path.join('logs', f"{timestamp}_{task_type}")
+
+
+def resolve_shards(shards, host_count, cpu_count=None):
+    """Number of shards to run: an explicit count or 'auto', capped by the host count"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if shards == 'auto':
+        shards = min(cpu_count, math.ceil(host_count / MIN_HOSTS_PER_SHARD))
+    return max(1, min(int(shards), host_count))
+
+
+def resolve_forks(forks, host_count, shards=1, cpu_count=None):
+    """Forks per ansible-playbook process: an explicit value or 'auto' from CPU and host counts"""
+    if forks != 'auto':
+        return int(forks)
+    cpu_count = cpu_count or os.cpu_count() or 1
+    hosts_per_shard = math.ceil(host_count / shards) if host_count else 1
+    budget = max(1, min(MAX_AUTO_FORKS, cpu_count * FORKS_PER_CPU // shards))
+    return max(1, min(hosts_per_shard, budget))
+
+
+def split_hosts(hosts, shards):
+    """Deal hosts round-robin into shards so each slice gets a similar mix"""
+    return [hosts[i::shards] for i in range(shards)]
+
+
+def run_sharded(target, inventory, log_dir, log, shard_hosts, forks, verbose, echo=None, on_start=None,
+                flush_interval=DEFAULT_FLUSH_INTERVAL, timestamps=False, limits=None, guard=None, recorder=None):
+    """
+    Run one ansible-playbook per host slice in parallel. Each shard writes
+    its own shard-N.log; lines are also merged into log (and echo) with a
+    [shard N] prefix, followed by a combined recap. Returns the first
+    nonzero shard return code, or 0 if every shard succeeded.
+    """
+    lock = threading.Lock()
+    shards = []
+    for number, hosts in enumerate(shard_hosts, 1):
+        limit_file = os.path.join(log_dir, f"shard-{number}.hosts")
+        with open(limit_file, 'w') as f:
+            f.write('\n'.join(hosts) + '\n')
+        cmd = build_ansible_command(target, inventory, forks=forks, verbose=verbose)
+        cmd += ['--limit', f"@{os.path.abspath(limit_file)}"]
+        log.write(f"[shard {number}] {len(hosts)} hosts: {' '.join(cmd)}\n".encode())
+        shards.append({'number': number, 'cmd': cmd, 'log': os.path.join(log_dir, f"shard-{number}.log")})
+    log.write(b'\n')
+    log.flush()
+
+    def pump(shard):
+        prefix = f"[shard {shard['number']}] ".encode()
+        merged = [PrefixedSink(log, prefix, lock)] + ([PrefixedSink(echo, prefix, lock)] if echo else [])
+        if recorder:
+            merged.append(PrefixedSink(recorder, prefix, lock))
+        with open(shard['log'], 'wb') as shard_log:
+            OutputPump([shard_log] + merged, flush_interval=flush_interval, timestamps=timestamps).run(
+                shard['process'].stdout.fileno())
+        for sink in merged:
+            sink.close()
+            sink.flush()
+
+    threads = []
+    try:
+        for shard in shards:
+            shard['process'] = spawn(shard['cmd'], 'ansible', limits=limits, guard=guard)
+            if on_start:
+                on_start(shard['process'])
+            thread = threading.Thread(target=pump, args=(shard,), name=f"shard-{shard['number']}", daemon=True)
+            thread.start()
+            threads.append(thread)
+    finally:
+        for thread in threads:
+            thread.join()
+        for shard in shards:
+            if 'process' in shard:
+                reap(shard['process'], 'ansible')
+
+    recap = {}
+    for shard in shards:
+        with open(shard['log'], 'r', errors='replace') as f:
+            recap.update(parse_recap(f))
+    summary = format_recap(recap, title=f"PLAY RECAP ({len(shards)} shards)")
+    log.write(b'\n' + summary.encode())
+    if echo:
+        echo.write(b'\n' + summary.encode())
+        echo.flush()
+
+    codes = [shard['process'].returncode for shard in shards]
+    for shard, code in zip(shards, codes):
+        if code != 0:
+            log.write(f"Shard {shard['number']} failed with return code {code}\n".encode())
+    log.flush()
+    # Not max(): a shard killed by a signal has a negative return code
+    return next((code for code in codes if code != 0), 0)
+
+
+def run_task(task_type, target, inventory, log_dir, forks='1', verbose=False, echo=None, on_start=None,
+             job_id=None, flush_interval=DEFAULT_FLUSH_INTERVAL, timestamps=False, shards=1,
+             timeout=None, should_cancel=None, limits=None):
+    """
+    Run one task and write its output to log_dir/execution.log.
+    echo is an optional binary stream that receives a copy of the output and
+    on_start(process) is called once for each child process spawned.
+    forks and shards accept 'auto'; shards > 1 splits the inventory's hosts
+    across parallel ansible-playbook processes.
+    After timeout seconds, or once should_cancel() returns who cancelled,
+    the children's process groups are killed and TaskTimeout or
+    TaskCancelled is raised. limits holds optional rlimits, nice and ionice.
+    Task types with results enabled also get log_dir/summary.json with
+    per-host outcomes, kept current while the run streams.
+    Returns the child's return code.
+    """
+    guard = ProcessGuard(timeout=timeout, should_cancel=should_cancel)
+    recorder = ResultRecorder(log_dir) if TASK_TYPES[task_type].get('results') else None
+    try:
+        returncode = _run_task(task_type, target, inventory, log_dir, forks, verbose, echo, on_start, job_id,
+                               flush_interval, timestamps, shards, limits, guard, recorder)
+    finally:
+        # Also when _run_task raised, or the watch thread would poll should_cancel() forever
+        guard.stop_watching()
+        if recorder and os.path.isdir(log_dir):
+            recorder.close()
+        if guard.reason:
+            with open(os.path.join(log_dir, 'execution.log'), 'a') as f:
+                f.write(f"\nExecution stopped: {guard.reason}\n")
+    guard.close()
+    return returncode
+
+
+def _run_task(task_type, target, inventory, log_dir, forks, verbose, echo, on_start, job_id,
+              flush_interval, timestamps, shards, limits, guard, recorder):
+    task = TASK_TYPES[task_type]
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, 'execution.log')
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+    shards = shards if shards == 'auto' else int(shards)
+    hosts = []
+    if task.get('shardable') and (forks == 'auto' or shards != 1):
+        hosts = sorted(inventory_cache.get(inventory).hosts)
+    shard_count = resolve_shards(shards, len(hosts)) if task.get('shardable') and hosts else 1
+    forks = resolve_forks(forks, len(hosts), shard_count) if forks == 'auto' else forks
+    cmd = task['build'](target, inventory, forks=forks, verbose=verbose)
+
+    with open(log_file, 'w', buffering=1) as f:
+        if job_id:
+            f.write(f"Job: {job_id}\n")
+        f.write(f"Execution started at {timestamp}\n")
+
+        if shard_count > 1:
+            f.write(f"Sharded run: {len(hosts)} hosts in {shard_count} shards, {forks} forks each\n")
+            f.flush()
+            returncode = run_sharded(target, inventory, log_dir, f.buffer, split_hosts(hosts, shard_count),
+                                     forks, verbose, echo=echo, on_start=on_start,
+                                     flush_interval=flush_interval, timestamps=timestamps,
+                                     limits=limits, guard=guard, recorder=recorder)
+            if returncode != 0:
+                f.write(f"\nExecution failed with return code {returncode}\n")
+            return returncode
+
+        f.write(f"Command: {' '.join(cmd)}\n\n")
+
+        try:
+            process = spawn(cmd, task_type, limits=limits, guard=guard)
+        except FileNotFoundError:
+            if 'missing_command' in task:
+                return task['missing_command'](target, f, echo=echo)
+            raise
+
+        try:
+            if on_start:
+                on_start(process)
+            sinks = [f.buffer] + ([echo] if echo else []) + ([recorder] if recorder else [])
+            f.flush()
+            OutputPump(sinks, flush_interval=flush_interval, timestamps=timestamps).run(process.stdout.fileno())
+        finally:
+            reap(process, task_type)
+
+        if process.returncode != 0:
+            f.write(f"\nExecution failed with return code {process.returncode}\n")
+        return process.returncode
+
+
+def main(task_type, argv=None):
+    """Command line entry point shared by the run_*.py wrapper scripts"""
+    task = TASK_TYPES[task_type]
+    parser = argparse.ArgumentParser(description=task['description'])
+    parser.add_argument('--playbooks', required=True, help=task['target_help'])
+    parser.add_argument('--inventory', required=True, help='Path to inventory file')
+    parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
+    parser.add_argument('--forks', default='1', help="Number of forks, or 'auto' to size from CPU and host counts")
+    parser.add_argument('--log-dir', help='Directory for the execution log (default: new timestamped directory)')
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help='Seconds between log flushes while output is streaming')
+    parser.add_argument('--timestamps', action='store_true', help='Prefix each output line with the time it was read')
+    parser.add_argument('--timeout', type=float, help='Kill the run after this many seconds')
+    if task.get('shardable'):
+        parser.add_argument('--shards', default='1',
+                            help="Split the inventory's hosts across this many parallel runs, or 'auto'")
+    args = parser.parse_args(argv)
+
+    log_dir = args.log_dir or default_log_dir(task_type)
+
+    print(f"Starting {task['name']} execution...")
+    print(f"{task['target_label']}: {args.playbooks}")
+    print(f"Inventory: {args.inventory}")
+    print(f"Logs: {os.path.join(log_dir, 'execution.log')}")
+    sys.stdout.flush()
+
+    try:
+        returncode = run_task(task_type, args.playbooks, args.inventory, log_dir,
+                              forks=args.forks, verbose=args.verbose, echo=sys.stdout.buffer,
+                              flush_interval=args.flush_interval, timestamps=args.timestamps,
+                              shards=getattr(args, 'shards', 1), timeout=args.timeout)
+    except Exception as e:
+        msg = f"{task['error_prefix']}: {e}\n"
+        print(msg)
+        with open(os.path.join(log_dir, 'execution.log'), 'a') as f:
+            f.write(msg)
+        returncode = 1
+
+    if returncode != 0 and task['exit_on_failure']:
+        sys.exit(returncode)
+
+    print("Execution complete.")
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Built-in scheduler for recurring jobs
+Each schedule pairs a cron expression with a task submission. A background
+thread in every server process fires due runs through the dashboard's normal
+submission path. Each run slot is claimed in a shared SQLite table first, so
+several processes never submit the same run twice. A per-schedule jitter
+spreads out schedules that share a minute, and a run whose previous run is
+still going is skipped instead of piling up behind it.
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from storage import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedule_runs (
+    schedule TEXT NOT NULL,
+    slot REAL NOT NULL,
+    fire_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    job_id TEXT,
+    detail TEXT,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (schedule, slot)
+);
+CREATE INDEX IF NOT EXISTS idx_schedule_runs_status ON schedule_runs (schedule, status, slot);
+"""
+
+# Run states
+CLAIMED = 'claimed'
+SUBMITTED = 'submitted'
+SKIPPED = 'skipped'
+MISSED = 'missed'
+FAILED = 'failed'
+
+# Runs more than this many seconds late (e.g. the server was down) are recorded as missed, not run
+MISFIRE_GRACE = 300
+# Upper bound on slots handled per schedule in one pass, so a long outage can't stall the loop
+MAX_SLOTS_PER_PASS = 1000
+# Longest the scheduler thread sleeps between passes
+CHECK_INTERVAL = 30
+RETENTION_DAYS = 30
+
+ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *'
+}
+
+MONTH_NAMES = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+DAY_NAMES = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+
+
+class CronError(ValueError):
+    """An invalid cron expression or schedule definition"""
+
+
+def parse_field(text, low, high, names=None):
+    """Expand one cron field (*, */n, a-b/n, lists, names) into a set of values"""
+    values = set()
+    for part in text.lower().split(','):
+        spec, _, step = part.partition('/')
+        if step and not step.isdigit():
+            raise CronError(f"Invalid step in '{part}'")
+        step = int(step) if step else 1
+        if step < 1:
+            raise CronError(f"Invalid step in '{part}'")
+
+        if spec == '*':
+            start, end = low, high
+        else:
+            first, _, last = spec.partition('-')
+            start = parse_value(first, low, high, names)
+            # 'a/n' means every n-th value from a to the end of the range
+            end = parse_value(last, low, high, names) if last else (high if step > 1 else start)
+            if start > end:
+                raise CronError(f"Invalid range '{part}'")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_value(text, low, high, names):
+    if names and text in names:
+        return names.index(text) + low
+    if not text.isdigit():
+        raise CronError(f"Invalid value '{text}'")
+    value = int(text)
+    if not low <= value <= high:
+        raise CronError(f"Value {value} out of range {low}-{high}")
+    return value
+
+
+class CronExpression:
+    """Standard five-field cron expression (minute hour day month weekday) in local time"""
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise CronError(f"Expected 5 fields in '{expression}'")
+        self.minutes = parse_field(fields[0], 0, 59)
+        self.hours = parse_field(fields[1], 0, 23)
+        self.days = parse_field(fields[2], 1, 31)
+        self.months = parse_field(fields[3], 1, 12, MONTH_NAMES)
+        self.weekdays = parse_field(fields[4], 0, 7, DAY_NAMES)
+        # Sunday is 0 or 7
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        in_days = dt.day in self.days
+        in_weekdays = (dt.weekday() + 1) % 7 in self.weekdays
+        # As in cron, a restricted day and weekday match when either one does
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, dt):
+        """First matching minute strictly after dt"""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t.year + 5
+        while t.year <= limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise CronError(f"'{self.expression}' never matches")
+
+
+class Schedule:
+    """A recurring task submission"""
+
+    def __init__(self, name, cron, task_type, target_file, inventory, forks='1', shards='1', verbose=False,
+                 jitter=0, max_concurrent=1, skip_if_running=True, enabled=True):
+        if not name:
+            raise CronError('Schedules need a name')
+        self.name = name
+        self.cron = CronExpression(cron)
+        # Reject expressions that parse but can never fire, e.g. '0 0 30 2 *'
+        self.cron.next_after(datetime.now())
+        self.task_type = task_type
+        self.target_file = target_file
+        self.inventory = inventory
+        self.forks = str(forks).lower()
+        self.shards = str(shards).lower()
+        self.verbose = bool(verbose)
+        self.jitter = max(0, int(jitter))
+        self.max_concurrent = max(1, int(max_concurrent)) if max_concurrent else None
+        self.skip_if_running = bool(skip_if_running)
+        self.enabled = bool(enabled)
+
+    @classmethod
+    def from_config(cls, entry):
+        """Build a schedule from a config.json 'schedules' entry"""
+        try:
+            return cls(**entry)
+        except TypeError as e:
+            raise CronError(f"Invalid schedule {entry.get('name')}: {e}")
+
+    @property
+    def user(self):
+        """User name recorded on the jobs this schedule submits"""
+        return f"schedule:{self.name}"
+
+    def fire_time(self, slot):
+        """When a slot actually runs: the slot time plus a stable per-schedule, per-slot jitter"""
+        if not self.jitter:
+            return slot
+        digest = hashlib.sha256(f"{self.name}:{slot.isoformat()}".encode()).digest()
+        return slot + timedelta(seconds=int.from_bytes(digest[:4], 'big') % (self.jitter + 1))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'cron': self.cron.expression,
+            'task_type': self.task_type,
+            'target_file': self.target_file,
+            'inventory': self.inventory,
+            'forks': self.forks,
+            'shards': self.shards,
+            'verbose': self.verbose,
+            'jitter': self.jitter,
+            'max_concurrent': self.max_concurrent,
+            'skip_if_running': self.skip_if_running,
+            'enabled': self.enabled
+        }
+
+
+class Scheduler:
+    """
+    Fires due schedule slots. submit(schedule) queues a run and returns its
+    job id; active_count(schedule) returns how many of the schedule's jobs
+    are queued or running. Run records live in the SQLite database at
+    db_path, shared by every process using the same file.
+    """
+
+    def __init__(self, schedules, db_path, submit, active_count, misfire_grace=MISFIRE_GRACE,
+                 interval=CHECK_INTERVAL):
+        self.schedules = {schedule.name: schedule for schedule in schedules}
+        self.db_path = db_path
+        self.submit = submit
+        self.active_count = active_count
+        self.misfire_grace = misfire_grace
+        self.interval = interval
+        self.owner = None
+
+        self._lock = threading.Lock()
+        self._cursors = {}
+        self._ready = False
+
+    def _conn(self):
+        conn = connect(self.db_path)
+        if not self._ready:
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def start(self):
+        """Start this process's scheduler thread; safe to call more than once"""
+        if not self.schedules:
+            return
+        with self._lock:
+            # A forked server worker inherits the parent's state but not its thread
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            if self.owner == owner:
+                return
+            self.owner = owner
+            threading.Thread(target=self._loop, name='scheduler', daemon=True).start()
+
+    def _cursor(self, schedule, now):
+        """Last slot already handled; new schedules start from now rather than replaying the past"""
+        if schedule.name not in self._cursors:
+            row = self._conn().execute(
+                'SELECT MAX(slot) AS slot FROM schedule_runs WHERE schedule = ?', (schedule.name,)).fetchone()
+            self._cursors[schedule.name] = datetime.fromtimestamp(row['slot']) if row['slot'] else now
+        return self._cursors[schedule.name]
+
+    def _record(self, conn, schedule, slot, status, job_id=None, detail=None):
+        conn.execute(
+            'UPDATE schedule_runs SET status = ?, job_id = ?, detail = ?, recorded_at = ? '
+            'WHERE schedule = ? AND slot = ?',
+            (status, job_id, detail, time.time(), schedule.name, slot.timestamp()))
+
+    def _claim(self, conn, schedule, slot, status=CLAIMED):
+        """Insert the slot's row; False if another process already has it"""
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO schedule_runs (schedule, slot, fire_at, status, recorded_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (schedule.name, slot.timestamp(), schedule.fire_time(slot).timestamp(), status, time.time()))
+        return cursor.rowcount == 1
+
+    def _fire(self, conn, schedule, slot):
+        if not self._claim(conn, schedule, slot):
+            return
+        active = self.active_count(schedule)
+        if schedule.skip_if_running and active:
+            self._record(conn, schedule, slot, SKIPPED, detail='Previous run still active')
+        elif schedule.max_concurrent and active >= schedule.max_concurrent:
+            self._record(conn, schedule, slot, SKIPPED,
+                         detail=f'{active} runs active (max_concurrent {schedule.max_concurrent})')
+        else:
+            try:
+                job_id = self.submit(schedule)
+            except Exception as e:
+                self._record(conn, schedule, slot, FAILED, detail=str(e))
+            else:
+                self._record(conn, schedule, slot, SUBMITTED, job_id=job_id)
+
+    def run_pending(self, now=None):
+        """Handle every slot that has come due; returns seconds until the next one"""
+        now = now or datetime.now()
+        conn = self._conn()
+        wait = self.interval
+        for schedule in self.schedules.values():
+            if not schedule.enabled:
+                continue
+            try:
+                wait = min(wait, self._run_schedule(conn, schedule, now))
+            except CronError as e:
+                # One broken schedule must not stop the others from firing
+                print(f"Schedule {schedule.name} skipped: {e}")
+        return max(1, wait)
+
+    def _run_schedule(self, conn, schedule, now):
+        """Handle one schedule's due slots; returns seconds until its next one"""
+        wait = self.interval
+        cursor = self._cursor(schedule, now)
+        for _ in range(MAX_SLOTS_PER_PASS):
+            slot = schedule.cron.next_after(cursor)
+            fire_at = schedule.fire_time(slot)
+            if fire_at > now:
+                wait = (fire_at - now).total_seconds()
+                break
+            if (now - fire_at).total_seconds() > self.misfire_grace:
+                self._claim(conn, schedule, slot, MISSED)
+            else:
+                self._fire(conn, schedule, slot)
+            cursor = slot
+        else:
+            # Far behind after an outage: skip ahead instead of recording every slot
+            cursor = now - timedelta(seconds=self.misfire_grace)
+        self._cursors[schedule.name] = cursor
+        return wait
+
+    def trim(self):
+        """Drop run records older than the retention period"""
+        cutoff = time.time() - RETENTION_DAYS * 86400
+        conn = self._conn()
+        with transaction(conn):
+            conn.execute('DELETE FROM schedule_runs WHERE slot < ?', (cutoff,))
+
+    def _loop(self):
+        last_trim = 0
+        while True:
+            try:
+                wait = self.run_pending()
+                if time.time() - last_trim > 3600:
+                    self.trim()
+                    last_trim = time.time()
+            except Exception as e:
+                print(f"Scheduler pass failed: {e}")
+                wait = self.interval
+            time.sleep(wait)
+
+    def status(self, now=None):
+        """Per-schedule summary for the dashboard: next run, last run and recent misses"""
+        now = now or datetime.now()
+        conn = self._conn()
+        since = (now - timedelta(days=1)).timestamp()
+        result = []
+        for schedule in self.schedules.values():
+            info = schedule.to_dict()
+            info['next_run'] = None
+            if schedule.enabled:
+                try:
+                    slot = schedule.cron.next_after(max(now, self._cursors.get(schedule.name, now)))
+                    info['next_run'] = schedule.fire_time(slot).strftime('%Y-%m-%d %H:%M:%S')
+                except CronError as e:
+                    info['error'] = str(e)
+            last = conn.execute(
+                "SELECT * FROM schedule_runs WHERE schedule = ? AND status != 'claimed' "
+                "ORDER BY slot DESC LIMIT 1", (schedule.name,)).fetchone()
+            info['last_run'] = self._run_dict(last) if last else None
+            info['missed_24h'] = conn.execute(
+                "SELECT COUNT(*) AS n FROM schedule_runs WHERE schedule = ? AND status = 'missed' AND slot >= ?",
+                (schedule.name, since)).fetchone()['n']
+            result.append(info)
+        return result
+
+    def runs(self, name=None, limit=50):
+        """Recent run records, newest first"""
+        if name:
+            rows = self._conn().execute(
+                'SELECT * FROM schedule_runs WHERE schedule = ? ORDER BY slot DESC LIMIT ?', (name, limit)).fetchall()
+        else:
+            rows = self._conn().execute(
+                'SELECT * FROM schedule_runs ORDER BY slot DESC LIMIT ?', (limit,)).fetchall()
+        return [self._run_dict(row) for row in rows]
+
+    @staticmethod
+    def _run_dict(row):
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+
+        return {
+            'schedule': row['schedule'],
+            'slot': fmt(row['slot']),
+            'fire_at': fmt(row['fire_at']),
+            'status': row['status'],
+            'job_id': row['job_id'],
+            'detail': row['detail']
+        }
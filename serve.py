@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Production server for the automation dashboard
+Runs the app under gunicorn with several worker processes when gunicorn is
+installed, otherwise under Werkzeug's threaded server in a single process.
+Both read the same config.json (or the file named by AUTOMATION_CONFIG) and
+serve TLS from the configured certificate files. Job state lives in the data
+directory, so every worker process sees and runs the same job queue.
+Metrics are the exception: each worker keeps its own, and /metrics reports
+those of the worker that answers it.
+
+Usage: python3 serve.py [--config FILE] [--workers N] [--threads N] [--host HOST] [--port PORT]
+"""
+
+import argparse
+import os
+import sys
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the automation dashboard in production mode')
+    parser.add_argument('--config', help='Configuration file (default: config.json)')
+    parser.add_argument('--workers', type=int, help="Worker processes (default: 'workers' from the config)")
+    parser.add_argument('--threads', type=int, help="Threads per worker (default: 'threads' from the config)")
+    parser.add_argument('--host', help="Address to bind (default: 'host' from the config)")
+    parser.add_argument('--port', type=int, help="Port to bind (default: 'port' from the config)")
+    return parser.parse_args()
+
+
+def ssl_files(dashboard):
+    """Return (cert, key) when HTTPS is enabled; exits if the files are not configured"""
+    if not dashboard.USE_HTTPS:
+        return None
+    if not dashboard.SSL_CERT or not dashboard.SSL_KEY:
+        sys.exit("use_https requires ssl_cert and ssl_key in the configuration for serve.py")
+    for path in (dashboard.SSL_CERT, dashboard.SSL_KEY):
+        if not os.path.isfile(path):
+            sys.exit(f"TLS file not found: {path}")
+    return dashboard.SSL_CERT, dashboard.SSL_KEY
+
+
+def run_gunicorn(host, port, workers, threads, tls):
+    from gunicorn.app.base import BaseApplication
+
+    def post_worker_init(worker):
+        # Each worker process runs its own job workers and scheduler against the shared queue
+        import app as dashboard
+        dashboard.start_background_workers()
+
+    options = {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        # Log streams stay open for as long as a job runs
+        'timeout': 120,
+        'post_worker_init': post_worker_init
+    }
+    if tls:
+        options['certfile'], options['keyfile'] = tls
+
+    class DashboardServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import app as dashboard
+            return dashboard.app
+
+    DashboardServer().run()
+
+
+def run_werkzeug(dashboard, host, port, workers, tls):
+    from werkzeug.serving import run_simple
+
+    if workers > 1:
+        print("gunicorn is not installed; serving with one threaded process (pip install gunicorn for more)")
+    dashboard.start_background_workers()
+    run_simple(host, port, dashboard.app, threaded=True, ssl_context=tls)
+
+
+def main():
+    args = parse_args()
+    if args.config:
+        os.environ['AUTOMATION_CONFIG'] = args.config
+
+    import app as dashboard
+    if dashboard.CONFIG_ERROR:
+        sys.exit(f"Could not load {dashboard.CONFIG_FILE}; copy config.example.json and edit it first")
+
+    host = args.host or dashboard.HOST
+    port = args.port or dashboard.PORT
+    workers = max(1, args.workers or dashboard.WORKERS)
+    threads = max(1, args.threads or dashboard.THREADS)
+    tls = ssl_files(dashboard)
+    dashboard.prepare_server(host, port)
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_werkzeug(dashboard, host, port, workers, tls)
+    else:
+        print(f"Serving with gunicorn: {workers} workers x {threads} threads")
+        run_gunicorn(host, port, workers, threads, tls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+document.getElementById('task_type').addEventListener('change', function() {
+    const targetSelect = document.getElementById('target_file');
+    targetSelect.innerHTML = '<option value="" disabled selected>Select execution target...</option>';
+
+    let files = [];
+    switch (this.value) {
+        case 'ansible': files = playbookFiles; break;
+        case 'powershell': files = powershellFiles; break;
+        case 'shell': files = shellFiles; break;
+    }
+
+    files.forEach(file => {
+        const option = document.createElement('option');
+        option.value = file;
+        option.textContent = file;
+        targetSelect.appendChild(option);
+    });
+
+    targetSelect.disabled = files.length === 0;
+
+    // Only Ansible runs can be split across inventory shards
+    const shards = document.getElementById('shards');
+    shards.disabled = this.value !== 'ansible';
+    if (shards.disabled) shards.value = '1';
+});
+
+function filesForType(type) {
+    switch (type) {
+        case 'ansible': return playbookFiles;
+        case 'powershell': return powershellFiles;
+        case 'shell': return shellFiles;
+    }
+    return [];
+}
+
+document.getElementById('batch_task_type').addEventListener('change', function() {
+    const targets = document.getElementById('batch_targets');
+    targets.innerHTML = '';
+    filesForType(this.value).forEach(file => {
+        const option = document.createElement('option');
+        option.value = file;
+        option.textContent = file;
+        targets.appendChild(option);
+    });
+    targets.disabled = targets.options.length === 0;
+});
+
+function selectedValues(id) {
+    return Array.from(document.getElementById(id).selectedOptions).map(option => option.value);
+}
+
+document.getElementById('batch-form').addEventListener('submit', function(event) {
+    event.preventDefault();
+    const message = document.getElementById('batch-message');
+    const body = {
+        name: document.getElementById('batch_name').value || null,
+        task_type: document.getElementById('batch_task_type').value,
+        forks: document.getElementById('batch_forks').value,
+        serial: document.getElementById('batch_serial').checked,
+        matrix: {
+            targets: selectedValues('batch_targets'),
+            inventories: selectedValues('batch_inventories')
+        }
+    };
+    fetch('/api/batches', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    })
+        .then(r => r.json())
+        .then(data => {
+            message.textContent = data.error ? data.error : `Batch ${data.id} queued: ${data.total} jobs`;
+            refreshJobs();
+        })
+        .catch(() => { message.textContent = 'Could not queue the batch'; });
+});
+
+function renderBatches(data) {
+    const list = document.getElementById('batch-list');
+    list.innerHTML = '';
+    data.batches.slice(0, 5).forEach(batch => {
+        const item = document.createElement('div');
+        item.className = 'job-item log-item';
+
+        const desc = document.createElement('div');
+        desc.className = 'job-desc';
+        desc.textContent = batch.name || `Batch ${batch.id}`;
+        const meta = document.createElement('span');
+        meta.className = 'job-meta';
+        const counts = Object.entries(batch.counts).map(([state, n]) => `${n} ${state}`).join(', ');
+        meta.textContent = `#${batch.id} by ${batch.user} at ${batch.submitted_at} - ${batch.finished}/${batch.total} done (${counts})`;
+        desc.appendChild(meta);
+        const bar = document.createElement('div');
+        bar.className = 'batch-progress';
+        const fill = document.createElement('div');
+        fill.style.width = `${Math.round(batch.progress * 100)}%`;
+        bar.appendChild(fill);
+        desc.appendChild(bar);
+
+        const status = document.createElement('span');
+        status.className = `job-status ${batch.status === 'succeeded' ? '' : batch.status}`;
+        status.textContent = batch.status;
+
+        item.appendChild(desc);
+        item.appendChild(status);
+        list.appendChild(item);
+    });
+}
+
+function renderJobs(data) {
+    const list = document.getElementById('job-list');
+    const counts = data.counts || {};
+    const active = (counts.queued || 0) + (counts.running || 0);
+    document.getElementById('job-counts').textContent =
+        active ? `${counts.running || 0} running / ${counts.queued || 0} queued` : 'Idle';
+
+    if (!data.jobs.length) return;
+    list.innerHTML = '';
+    data.jobs.slice(0, 10).forEach(job => {
+        let state = job.status;
+        if (job.status === 'finished' && (job.return_code !== 0 || job.error)) state = 'failed';
+
+        const item = document.createElement('a');
+        item.className = 'job-item log-item';
+        if (job.log_path) {
+            const dir = job.log_path.split('/').slice(0, -1).join('/');
+            item.href = `/logs?path=${encodeURIComponent(dir)}&file=${encodeURIComponent(job.log_path)}`;
+        }
+
+        const desc = document.createElement('div');
+        desc.className = 'job-desc';
+        desc.textContent = `${job.task_type}: ${job.description}`;
+        const meta = document.createElement('span');
+        meta.className = 'job-meta';
+        meta.textContent = `#${job.id} by ${job.user} at ${job.submitted_at}` +
+            (job.duration !== null ? ` - ${job.duration}s` : '') +
+            (job.return_code !== null ? ` - rc ${job.return_code}` : '') +
+            (job.attached ? ` - +${job.attached} attached` : '') +
+            (job.batch_id ? ` - batch ${job.batch_id}` : '') +
+            (job.agent ? ` - on ${job.agent}` : '') +
+            outcomeText(job);
+        desc.appendChild(meta);
+
+        const status = document.createElement('span');
+        status.className = `job-status ${state}`;
+        status.textContent = state;
+
+        item.appendChild(desc);
+        const actions = document.createElement('div');
+        actions.className = 'job-actions';
+        if (job.status !== 'finished') {
+            const cancel = document.createElement('button');
+            cancel.className = 'job-cancel';
+            cancel.type = 'button';
+            cancel.disabled = Boolean(job.cancelled_by);
+            cancel.textContent = job.cancelled_by ? 'Cancelling' : 'Cancel';
+            cancel.addEventListener('click', event => {
+                // The button sits inside the job's log link
+                event.preventDefault();
+                event.stopPropagation();
+                cancelJob(job.id, cancel);
+            });
+            actions.appendChild(cancel);
+        }
+        actions.appendChild(status);
+        item.appendChild(actions);
+        list.appendChild(item);
+    });
+}
+
+function outcomeText(job) {
+    const outcome = job.outcome;
+    if (job.current_task) return ` - ${job.current_task}`;
+    if (!outcome || !outcome.hosts) return '';
+    const bad = outcome.failed_hosts + outcome.unreachable_hosts;
+    return bad ? ` - ${bad}/${outcome.hosts} hosts failed` : ` - ${outcome.hosts} hosts ok`;
+}
+
+function cancelJob(jobId, button) {
+    if (!confirm(`Cancel job ${jobId}?`)) return;
+    button.disabled = true;
+    fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST' })
+        .then(r => r.json())
+        .then(data => {
+            if (data.error) alert(data.error);
+            refreshJobs();
+        })
+        .catch(() => { button.disabled = false; });
+}
+
+function refreshJobs() {
+    fetch('/api/jobs')
+        .then(r => r.json())
+        .then(renderJobs)
+        .catch(() => {});
+    fetch('/api/batches?limit=5')
+        .then(r => r.json())
+        .then(renderBatches)
+        .catch(() => {});
+}
+
+refreshJobs();
+setInterval(refreshJobs, 3000);
@@ -0,0 +1,81 @@
+let currentFile = null;
+let originalContent = '';
+let currentVersion = null;
+
+function loadInventory(filename) {
+    document.querySelectorAll('.file-item').forEach(item => item.classList.remove('active'));
+    document.querySelector(`[data-filename="${filename}"]`).classList.add('active');
+
+    fetch(`/api/inventory/${filename}`)
+        .then(r => r.json())
+        .then(data => {
+            if (data.error) return showAlert('danger', data.error);
+            currentFile = filename;
+            originalContent = data.content;
+            currentVersion = data.version;
+            const ed = document.getElementById('editor');
+            ed.value = data.content;
+            ed.disabled = false;
+            document.getElementById('current-file').textContent = filename;
+            document.getElementById('save-btn').disabled = false;
+        })
+        .catch(() => showAlert('danger', 'Error loading file.'));
+}
+
+// One hunk replacing the changed lines between the unchanged start and end of the file
+function diffLines(before, after) {
+    const a = before.split('\n');
+    const b = after.split('\n');
+    let start = 0;
+    while (start < a.length && start < b.length && a[start] === b[start]) start++;
+    let endA = a.length;
+    let endB = b.length;
+    while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) { endA--; endB--; }
+    return [{ start: start, delete: endA - start, insert: b.slice(start, endB) }];
+}
+
+function saveInventory() {
+    if (!currentFile) return;
+    const content = document.getElementById('editor').value;
+    if (content === originalContent) return showAlert('success', 'No changes to save.');
+    const btn = document.getElementById('save-btn');
+    btn.disabled = true;
+
+    // Send only the changed lines, checked against the version the editor loaded
+    fetch(`/api/inventory/${currentFile}`, {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ version: currentVersion, hunks: diffLines(originalContent, content) })
+    })
+    .then(r => r.json().then(data => ({ status: r.status, data: data })))
+    .then(({ status, data }) => {
+        if (status === 409) showAlert('danger', `${currentFile} was changed by someone else. Copy your edits and reload the file.`);
+        else if (data.error) showAlert('danger', data.error);
+        else {
+            showAlert('success', `${currentFile} saved successfully (${data.hosts ?? '?'} hosts).`);
+            if (data.warning) showAlert('danger', data.warning);
+            originalContent = content;
+            currentVersion = data.version;
+        }
+        btn.disabled = false;
+    })
+    .catch(() => { showAlert('danger', 'Error saving file.'); btn.disabled = false; });
+}
+
+function showAlert(type, msg) {
+    const container = document.getElementById('alert-container');
+    const alert = document.createElement('div');
+    alert.className = `alert alert-${type}`;
+    alert.innerHTML = msg;
+    container.appendChild(alert);
+    setTimeout(() => alert.remove(), 4000);
+}
+
+document.getElementById('editor').addEventListener('keydown', function(e) {
+    if ((e.ctrlKey || e.metaKey) && e.key === 's') {
+        e.preventDefault();
+        if (currentFile && !document.getElementById('save-btn').disabled) {
+            saveInventory();
+        }
+    }
+});
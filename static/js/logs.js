@@ -0,0 +1,210 @@
+const PAGE_LINES = 500;
+let logStream = null;
+let view = null;
+
+function stopFollowing() {
+    if (logStream) {
+        logStream.close();
+        logStream = null;
+    }
+}
+
+function updateControls() {
+    const name = view.path.split('/').pop() || view.path;
+    document.getElementById('log-title').textContent = logStream ? `${name} (live)` : name;
+    document.getElementById('page-info').textContent = view.total
+        ? `Lines ${view.first + 1}-${view.last} of ${view.total}` : '';
+    document.getElementById('btn-head').disabled = view.first === 0;
+    document.getElementById('btn-earlier').disabled = view.first === 0;
+    document.getElementById('btn-later').disabled = view.last >= view.total;
+    document.getElementById('btn-tail').disabled = view.last >= view.total && !logStream;
+}
+
+function fetchPage(query) {
+    return fetch(`/api/logs/lines/${encodeURIComponent(view.path)}?${query}`).then(r => r.json());
+}
+
+function followLog(path, offset) {
+    const contentEl = document.getElementById('log-content');
+    logStream = new EventSource(`/api/logs/stream/${encodeURIComponent(path)}?offset=${offset}`);
+
+    logStream.addEventListener('log', e => {
+        const data = JSON.parse(e.data);
+        contentEl.textContent += data.text;
+        const added = (data.text.match(/\n/g) || []).length;
+        view.last += added;
+        view.total += added;
+        updateControls();
+        const viewer = contentEl.parentElement;
+        viewer.scrollTop = viewer.scrollHeight;
+    });
+
+    logStream.addEventListener('end', () => {
+        stopFollowing();
+        updateControls();
+    });
+}
+
+function showPage(page) {
+    const contentEl = document.getElementById('log-content');
+    view.first = page.start_line;
+    view.last = page.end_line;
+    view.total = page.total_lines;
+    contentEl.textContent = page.content || (page.active ? '' : 'Log file is empty');
+    contentEl.style.opacity = '1';
+}
+
+function markLine(line) {
+    const contentEl = document.getElementById('log-content');
+    const lines = contentEl.textContent.split('\n');
+    const index = line - 1 - view.first;
+    if (index < 0 || index >= lines.length) return;
+    const mark = document.createElement('mark');
+    mark.className = 'log-hit';
+    mark.textContent = lines[index];
+    contentEl.textContent = lines.slice(0, index).map(l => l + '\n').join('');
+    contentEl.appendChild(mark);
+    contentEl.appendChild(document.createTextNode(lines.slice(index + 1).map(l => '\n' + l).join('')));
+    mark.scrollIntoView({ block: 'center' });
+}
+
+function loadLog(path, line) {
+    const contentEl = document.getElementById('log-content');
+    contentEl.textContent = 'Loading...';
+    contentEl.style.opacity = '0.5';
+    stopFollowing();
+    view = { path: path, first: 0, last: 0, total: 0 };
+
+    // A search hit opens a page around its line instead of the tail
+    const query = line ? `start=${Math.max(0, line - 1 - PAGE_LINES / 2)}&count=${PAGE_LINES}` : `tail=${PAGE_LINES}`;
+    fetchPage(query)
+        .then(page => {
+            if (page.error) throw new Error(page.error);
+            showPage(page);
+            if (page.active && page.end_line >= page.total_lines) followLog(path, page.end_offset);
+            updateControls();
+            if (line) {
+                markLine(line);
+            } else {
+                const viewer = contentEl.parentElement;
+                viewer.scrollTop = viewer.scrollHeight;
+            }
+        })
+        .catch(() => {
+            contentEl.textContent = 'Error loading log content. Format may be unsupported or file missing.';
+            contentEl.style.opacity = '1';
+        });
+}
+
+function jumpHead() {
+    stopFollowing();
+    fetchPage(`start=0&count=${PAGE_LINES}`).then(page => {
+        showPage(page);
+        updateControls();
+        document.querySelector('.viewer-wrapper').scrollTop = 0;
+    });
+}
+
+function jumpTail() {
+    loadLog(view.path);
+}
+
+function loadEarlier() {
+    const start = Math.max(0, view.first - PAGE_LINES);
+    fetchPage(`start=${start}&count=${view.first - start}`).then(page => {
+        const contentEl = document.getElementById('log-content');
+        contentEl.textContent = page.content + contentEl.textContent;
+        view.first = page.start_line;
+        view.total = Math.max(view.total, page.total_lines);
+        updateControls();
+    });
+}
+
+function loadLater() {
+    fetchPage(`start=${view.last}&count=${PAGE_LINES}`).then(page => {
+        document.getElementById('log-content').textContent += page.content;
+        view.last = page.end_line;
+        view.total = page.total_lines;
+        updateControls();
+    });
+}
+
+// Log search
+let searchCursor = '';
+
+function highlightText(text, matches) {
+    const el = document.createElement('div');
+    el.className = 'search-hit-text';
+    let position = 0;
+    matches.forEach(([start, end]) => {
+        el.appendChild(document.createTextNode(text.slice(position, start)));
+        const mark = document.createElement('mark');
+        mark.textContent = text.slice(start, end);
+        el.appendChild(mark);
+        position = end;
+    });
+    el.appendChild(document.createTextNode(text.slice(position)));
+    return el;
+}
+
+function renderHit(hit) {
+    const link = document.createElement('a');
+    link.className = 'search-hit';
+    link.href = hit.url;
+    link.addEventListener('click', e => {
+        e.preventDefault();
+        loadLog(hit.log_path, hit.line);
+    });
+    const meta = document.createElement('div');
+    meta.className = 'search-hit-meta';
+    meta.textContent = `${hit.log_path}:${hit.line} · ${hit.task_type || 'log'} · ${hit.run_at}`;
+    link.appendChild(meta);
+    link.appendChild(highlightText(hit.text, hit.matches));
+    return link;
+}
+
+function searchLogs(more) {
+    const hitsEl = document.getElementById('search-hits');
+    const infoEl = document.getElementById('search-info');
+    const moreBtn = document.getElementById('search-more');
+    if (!more) {
+        searchCursor = '';
+        hitsEl.textContent = '';
+    }
+    const params = new URLSearchParams({
+        q: document.getElementById('search-query').value,
+        task_type: document.getElementById('search-type').value,
+        since: document.getElementById('search-since').value,
+        until: document.getElementById('search-until').value,
+        cursor: searchCursor
+    });
+    document.getElementById('search-results').hidden = false;
+    fetch(`/api/logs/search?${params}`)
+        .then(r => r.json())
+        .then(data => {
+            if (data.error) {
+                infoEl.textContent = data.error;
+                moreBtn.hidden = true;
+                return;
+            }
+            data.results.forEach(hit => hitsEl.appendChild(renderHit(hit)));
+            const shown = hitsEl.childElementCount;
+            infoEl.textContent = shown
+                ? `${shown} matching line${shown === 1 ? '' : 's'}${data.next_cursor !== null ? ' so far' : ''} (${data.took_ms} ms)`
+                : 'No matches';
+            searchCursor = data.next_cursor || '';
+            moreBtn.hidden = data.next_cursor === null;
+        })
+        .catch(() => {
+            infoEl.textContent = 'Search failed';
+        });
+}
+
+document.getElementById('search-form').addEventListener('submit', e => {
+    e.preventDefault();
+    searchLogs(false);
+});
+
+const params = new URLSearchParams(window.location.search);
+const requestedFile = params.get('file');
+if (requestedFile) loadLog(requestedFile, parseInt(params.get('line'), 10) || null);
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Local SQLite storage helpers shared by the dashboard's indexes and stores
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+def connect(db_path):
+    """Return this thread's connection to db_path, opening it on first use"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while a writer appends
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        connections[db_path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(conn):
+    """Run a block inside BEGIN IMMEDIATE ... COMMIT, rolling back on error"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
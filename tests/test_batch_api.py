@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch submission API
+Imports the app inside a throwaway workspace (config, playbooks and
+inventory in a temp directory) and drives it through Flask's test client.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+
+USER = 'tester'
+PASSWORD = 'tester-password'
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('workspace')
+    os.makedirs(workdir / 'playbooks')
+    os.makedirs(workdir / 'inventory')
+    (workdir / 'playbooks' / 'site.yml').write_text('- hosts: all\n  tasks: []\n')
+    (workdir / 'inventory' / 'hosts.ini').write_text('[web]\nweb1\n')
+    (workdir / 'config.json').write_text(json.dumps({
+        'secret_key': 'test',
+        'users': {USER: PASSWORD},
+        'data_dir': str(workdir / 'data')
+    }))
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app as app_module
+        test_client = app_module.app.test_client()
+        test_client.post('/login', data={'username': USER, 'password': PASSWORD})
+        yield test_client
+        # Entries are written by a background thread to paths relative to the workspace
+        app_module.activity_logger.flush()
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize('spec', [
+    {'task_type': 'ansible', 'matrix': {'targets': ['../config.json'], 'inventories': ['hosts.ini']}},
+    {'task_type': 'ansible', 'matrix': {'targets': ['site.yml'], 'inventories': ['../config.json']}},
+    {'task_type': 'ansible', 'jobs': [{'target_file': 'site.yml', 'inventory': 'hosts.ini'},
+                                      {'target_file': '../../etc/passwd', 'inventory': 'hosts.ini'}]},
+])
+def test_batch_rejects_paths_outside_their_directory(client, spec):
+    response = client.post('/api/batches', json=spec)
+    assert response.status_code == 400
+    assert 'Invalid' in response.get_json()['error']
+    assert client.get('/api/batches').get_json()['batches'] == []
+
+
+def test_batch_accepts_files_in_their_directory(client):
+    response = client.post('/api/batches', json={
+        'task_type': 'ansible', 'matrix': {'targets': ['site.yml'], 'inventories': ['hosts.ini']}})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('spec', [
+    {'task_type': 'ansible', 'matrix': {'targets': [1], 'inventories': ['hosts.ini']}},
+    {'task_type': 'ansible', 'matrix': {'targets': ['site.yml'], 'inventories': [{'path': 'hosts.ini'}]}},
+    {'task_type': ['ansible'], 'matrix': {'targets': ['site.yml'], 'inventories': ['hosts.ini']}},
+    {'task_type': 'ansible', 'name': 7, 'matrix': {'targets': ['site.yml'], 'inventories': ['hosts.ini']}},
+    {'task_type': 'ansible', 'matrix': ['site.yml']},
+    {'task_type': 'ansible', 'jobs': [{'target_file': None, 'inventory': 'hosts.ini'}]},
+    {'task_type': 'ansible', 'jobs': [{'target_file': ['site.yml'], 'inventory': 'hosts.ini'}]},
+    {'task_type': 'ansible', 'jobs': [{'id': {'a': 1}, 'target_file': 'site.yml', 'inventory': 'hosts.ini'}]},
+    {'task_type': 'ansible', 'jobs': [{'target_file': 'site.yml', 'inventory': 'hosts.ini', 'forks': [2]}]},
+])
+def test_batch_rejects_fields_of_the_wrong_type(client, spec):
+    response = client.post('/api/batches', json=spec)
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_failed_batch_leaves_no_run_directories(client, monkeypatch):
+    import app as app_module
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(app_module.job_manager, 'submit_batch', fail)
+    os.makedirs(app_module.LOGS_DIR, exist_ok=True)
+    before = set(os.listdir(app_module.LOGS_DIR))
+    response = client.post('/api/batches', json={'task_type': 'ansible', 'jobs': [
+        {'id': 'a', 'target_file': 'site.yml', 'inventory': 'hosts.ini'},
+        {'id': 'b', 'target_file': 'site.yml', 'inventory': 'hosts.ini', 'depends_on': 'a'}]})
+    assert response.status_code == 500
+    assert set(os.listdir(app_module.LOGS_DIR)) - before == set()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the task runner
+Runs tasks against a stub ansible-playbook placed first on PATH.
+"""
+
+import io
+import os
+import stat
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+
+from runner import run_sharded  # noqa: E402
+
+# Succeeds, except for the shard whose --limit file lists the host 'doomed', which kills itself
+STUB_PLAYBOOK = """#!/bin/bash
+limit=""
+while [ $# -gt 0 ]; do
+    if [ "$1" = "--limit" ]; then limit="${2#@}"; fi
+    shift
+done
+if grep -qx doomed "$limit"; then
+    kill -9 $$
+fi
+echo "ok"
+"""
+
+
+def install_stub(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    stub = bin_dir / 'ansible-playbook'
+    stub.write_text(STUB_PLAYBOOK)
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+
+
+def test_shard_killed_by_signal_fails_the_run(tmp_path, monkeypatch):
+    install_stub(tmp_path, monkeypatch)
+    log = io.BytesIO()
+    code = run_sharded('site.yml', 'hosts.ini', str(tmp_path), log, [['web1'], ['doomed'], ['web2']], 1, False)
+    assert code == -9
+    assert b'Shard 2 failed with return code -9' in log.getvalue()
+
+
+def test_sharded_run_succeeds_when_every_shard_does(tmp_path, monkeypatch):
+    install_stub(tmp_path, monkeypatch)
+    assert run_sharded('site.yml', 'hosts.ini', str(tmp_path), io.BytesIO(), [['web1'], ['web2']], 1, False) == 0